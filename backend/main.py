@@ -10,6 +10,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Importamos los routers
 from backend.routers import opex
 from backend.routers import finance  # <--- NUEVO IMPORT
+from backend.routers import jobs
+from backend.database import engine
+from backend.services.prediction_cache import ensure_cache_table
 
 app = FastAPI(
     title="EPM Latam Trade Capital API",
@@ -17,6 +20,15 @@ app = FastAPI(
     version="1.1.0"
 )
 
+@app.on_event("startup")
+def ensure_tables():
+    """DDL de arranque: fuera de las rutas de predicción."""
+    try:
+        with engine.begin() as conn:
+            ensure_cache_table(conn)
+    except Exception as e:
+        print(f"⚠️ No se pudo verificar la caché de predicciones: {e}")
+
 # Configurar CORS (Permite que Streamlit hable con FastAPI)
 app.add_middleware(
     CORSMiddleware,
@@ -34,12 +46,15 @@ app.include_router(opex.router, prefix="/api/v1/opex", tags=["Opex"])
 # 2. Rutas de FINANZAS (Gestor de Datos, Parámetros) - NUEVO
 app.include_router(finance.router, prefix="/api/v1/finance", tags=["Finance"])
 
+# 3. Trabajos en segundo plano (clasificación masiva / reentrenamiento)
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["Jobs"])
+
 @app.get("/")
 def read_root():
     return {
         "system": "EPM API", 
         "status": "online", 
-        "modules": ["Opex Control", "Financial Planning"]
+        "modules": ["Opex Control", "Financial Planning", "Jobs"]
     }
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ from sqlalchemy import text
 from pydantic import BaseModel
 from typing import List, Optional
 from backend.database import get_db
+from backend.services.projection_service import run_projection
 
 router = APIRouter()
 
@@ -15,6 +16,25 @@ class ParametroInput(BaseModel):
     valor: float
     descripcion: Optional[str] = ""
 
+class ProyeccionInput(BaseModel):
+    fecha_corte: str
+    pais: str = "Regional"
+    plazo_anos: int = 5
+    # Supuestos operativos (None = valor por defecto del simulador)
+    rev_rate: Optional[float] = None
+    cof_rate: Optional[float] = None
+    provision_rate: Optional[float] = None
+    opex_pct: Optional[float] = None
+    rec_npa_rate: Optional[float] = None
+    tax_rate: Optional[float] = None
+    cogs_amount: Optional[float] = None
+    dep_amort_amount: Optional[float] = None
+    fx_impact: Optional[float] = None
+    non_op_result: Optional[float] = None
+    new_debt_amount: Optional[float] = None
+    new_debt_rate: Optional[float] = None
+    new_debt_type: Optional[str] = None
+
 # 1. OBTENER PARÁMETROS (Filtrados por Fecha y País)
 @router.get("/params")
 def get_financial_params(fecha_corte: str, pais: Optional[str] = None, db: Session = Depends(get_db)):
@@ -68,4 +88,20 @@ def save_financial_params(datos: List[ParametroInput], db: Session = Depends(get
     except Exception as e:
         db.rollback()
         print(f"❌ Error guardando params: {e}")
-        raise HTTPException(500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(500, detail=str(e))
+
+# 3. PROYECCIÓN CON LOS PARÁMETROS GUARDADOS (resultado columnar, en caché por versión de parámetros)
+@router.post("/projection")
+def get_projection(body: ProyeccionInput, db: Session = Depends(get_db)):
+    if not 1 <= body.plazo_anos <= 10:
+        raise HTTPException(422, "plazo_anos debe estar entre 1 y 10")
+    if body.new_debt_type not in (None, "Amortizado", "Bullet"):
+        raise HTTPException(422, "new_debt_type debe ser 'Amortizado' o 'Bullet'")
+    drivers = body.model_dump(exclude={"fecha_corte", "pais", "plazo_anos"}, exclude_none=True)
+    try:
+        return run_projection(db, body.fecha_corte, body.pais, body.plazo_anos, drivers)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    except Exception as e:
+        print(f"❌ Error en proyección: {e}")
+        raise HTTPException(500, str(e))
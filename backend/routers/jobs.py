@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+
+from backend.database import engine
+from backend.services.jobs import start_job, get_job, list_jobs, request_cancel
+
+router = APIRouter()
+
+# --- ESQUEMAS ---
+class NuevoTrabajo(BaseModel):
+    tipo: str  # clasificacion | reentrenamiento
+    parametros: Optional[dict] = None
+
+# --- ENDPOINTS ---
+
+# 1. LANZAR TRABAJO (responde de inmediato; el trabajo corre en otro proceso)
+@router.post("")
+def create_job(body: NuevoTrabajo):
+    try:
+        job_id = start_job(engine, body.tipo, body.parametros)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    print(f"🚀 Trabajo {job_id} ({body.tipo}) lanzado")
+    return {"id": job_id, "estado": "pendiente"}
+
+# 2. LISTA DE TRABAJOS RECIENTES
+@router.get("")
+def get_jobs(limit: int = 20):
+    try:
+        return list_jobs(engine, limit)
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
+# 3. AVANCE (filas hechas, throughput, ETA)
+@router.get("/{job_id}")
+def get_job_status(job_id: int):
+    try:
+        job = get_job(engine, job_id)
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    if not job:
+        raise HTTPException(404, f"Trabajo {job_id} no existe")
+    return job
+
+# 4. CANCELAR
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: int):
+    try:
+        ok = request_cancel(engine, job_id)
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    if not ok:
+        raise HTTPException(409, f"Trabajo {job_id} no está activo")
+    return {"status": "success", "id": job_id, "estado": "cancelando"}
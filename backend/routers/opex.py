@@ -1,28 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 from typing import List, Optional
 import pandas as pd
-import joblib
+import hmac
 import os
 import sys
 
 # Importación absoluta
 from backend.database import get_db
+from backend.services.classification import predict_texts, classify_deduplicated, classify_with_rules
+from backend.services.model_registry import ActiveModel, NormalizationMismatch, list_versions
+from backend.services.prediction_cache import PredictionCache
+from backend.services.rules import get_rule_engine
 
 router = APIRouter()
 
-# --- CARGA MODELOS ---
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-BACKEND_DIR = os.path.dirname(CURRENT_DIR)
-MODEL_DIR = os.path.join(BACKEND_DIR, "ml_models")
+# --- MODELO ACTIVO ---
+# Registro versionado: se carga en la primera predicción (mmap) y se recarga solo cuando
+# cambia la versión activa, sin reiniciar uvicorn.
+active_model = ActiveModel()
+prediction_cache = None
 
-try:
-    model_grupo = joblib.load(os.path.join(MODEL_DIR, "modelo_grupo.pkl"))
-    model_subgrupo = joblib.load(os.path.join(MODEL_DIR, "modelo_subgrupo.pkl"))
-except:
-    model_grupo, model_subgrupo = None, None
+def get_prediction_cache(version):
+    """La caché va atada a la versión: al cambiar de modelo se empieza una nueva."""
+    global prediction_cache
+    cache = prediction_cache
+    if cache is None or cache.model_version != version:
+        cache = prediction_cache = PredictionCache(version)
+    return cache
+
+def check_admin(x_admin_token: Optional[str] = Header(None)):
+    """Las rutas de administración exigen el header X-Admin-Token; sin ADMIN_TOKEN quedan cerradas."""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(503, "Administración deshabilitada: ADMIN_TOKEN no está configurado")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(403, "Token de administración inválido")
 
 # --- ESQUEMAS ---
 class GastoInput(BaseModel):
@@ -39,6 +54,9 @@ class UpdateGestion(BaseModel):
     subgrupo: Optional[str] = None
     status_gestion: Optional[str] = None
 
+class ActivarModelo(BaseModel):
+    version: str
+
 class UpdateProveedor(BaseModel):
     nombre_tercero: str
     status_gestion: Optional[str] = None
@@ -136,23 +154,56 @@ def get_pending(limit: int = 50, db: Session = Depends(get_db)):
 
 # 5. PREDICT
 @router.post("/predict")
-def predict(gastos: List[GastoInput]):
-    if not model_grupo: raise HTTPException(500, "Modelos no cargados")
+def predict(gastos: List[GastoInput], db: Session = Depends(get_db)):
+    try:
+        # Referencia local: un cambio de versión a mitad de la petición no la afecta
+        activo = active_model.get()
+    except Exception as e:
+        print(f"❌ Error cargando modelo: {e}")
+        raise HTTPException(503, f"Modelo no disponible: {e}")
     try:
         data = [g.dict() for g in gastos]
         df = pd.DataFrame(data)
-        df['txt'] = (df['cuenta_contable'].astype(str)+" "+df['id_proveedor'].fillna('').astype(str)+" "+df['descripcion_gasto'].fillna('').astype(str)).str.lower()
-        
-        grupos = model_grupo.predict(df['txt'])
-        probs = model_grupo.predict_proba(df['txt'])
-        subs = model_subgrupo.predict(df['txt'])
-        
+
+        # 1. Reglas (proveedor / prefijo de cuenta); 2. caché (memoria -> Postgres); 3. modelo
+        rules = get_rule_engine(db)
+        cache = get_prediction_cache(activo.version)
+        predict_fn = lambda t: predict_texts(activo.model, t)
+        classify_fn = lambda txt: classify_deduplicated(txt, lambda u: cache.classify(u, predict_fn, conn=db))[0]
+        preds, _ = classify_with_rules(df, rules, classify_fn)
+        db.commit()
+
         resp = []
-        for i, row in df.iterrows():
-            resp.append({**data[i], "grupo_predicho": grupos[i], "subgrupo_predicho": subs[i], "confianza": round(max(probs[i])*100, 1)})
+        for i, p in enumerate(preds.itertuples(index=False)):
+            resp.append({**data[i], "grupo_predicho": p.grupo, "subgrupo_predicho": p.subgrupo,
+                         "confianza": float(p.confianza), "fuente": p.fuente, "version_modelo": activo.version})
         return resp
     except Exception as e: raise HTTPException(500, str(e))
 
+# 5b. MODELO: versión activa y versiones registradas
+@router.get("/model")
+def get_model_info():
+    try:
+        activo = active_model.get()
+        actual = {"version": activo.version, "metadata": activo.metadata}
+    except Exception as e:
+        actual = {"version": None, "error": str(e)}
+    return {"activo": actual, "versiones": list_versions()}
+
+# 5c. ADMIN: cambio atómico de versión (las peticiones en curso terminan con el modelo anterior)
+@router.post("/admin/model/activate", dependencies=[Depends(check_admin)])
+def activate_model(body: ActivarModelo):
+    try:
+        activo = active_model.activate(body.version)
+    except NormalizationMismatch as e:
+        raise HTTPException(409, str(e))
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    print(f"🔁 Modelo activo: {activo.version}")
+    return {"status": "success", "version": activo.version, "metadata": activo.metadata}
+
 # 6. UPDATE BATCH (ID)
 @router.put("/update-batch")
 def update_batch(updates: List[UpdateGestion], db: Session = Depends(get_db)):
@@ -0,0 +1,271 @@
+# backend/services/batch_pipeline.py
+# Pipeline de clasificación masiva en tres etapas conectadas por colas acotadas:
+#   LECTOR (cursor del lado del servidor) -> PREDICTOR(es) -> ESCRITOR (COPY binario + UPDATE)
+# El predictor consulta primero la capa de reglas y luego caché/modelo para el resto.
+# La E/S de base de datos se solapa con la CPU del modelo y la memoria queda acotada
+# a unos (2 * queue_size + workers) lotes en vuelo.
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sqlalchemy import text
+
+from backend.services.classification import (
+    MODEL_DIR, load_models, compute_model_version, resolve_model_dir, predict_texts, classify_deduplicated, classify_with_rules
+)
+from backend.services.model_registry import check_normalization, load_metadata
+from backend.services.prediction_cache import PredictionCache
+from backend.services.staging import StagingTable
+from backend.services.rules import RuleEngine
+
+_FIN = object()  # Marca de fin de flujo entre etapas
+
+SCHEMA = "control_gestion"
+TABLA = "libros_diarios_consolidados"
+
+# Solo los que NO tienen grupo Y NO son manuales
+FILTRO_PENDIENTES = """
+    (grupo IS NULL OR grupo = '')
+    AND (clasificacion_manual IS FALSE OR clasificacion_manual IS NULL)
+"""
+QUERY_PENDIENTES = f"""
+    SELECT id_transaccion, cuenta_contable, id_proveedor, nombre_tercero, descripcion_gasto
+    FROM {SCHEMA}.{TABLA}
+    WHERE {FILTRO_PENDIENTES}
+"""
+
+
+def count_pending(conn):
+    return conn.execute(text(f"SELECT count(*) FROM {SCHEMA}.{TABLA} WHERE {FILTRO_PENDIENTES}")).scalar()
+
+
+# ==============================================================================
+# MODELOS EN PROCESOS WORKER
+# ==============================================================================
+_worker_model = None
+
+
+def _init_worker(model_dir):
+    global _worker_model
+    _worker_model = load_models(model_dir, mmap_mode="r")[0]
+
+
+def _predict_in_worker(texts):
+    return predict_texts(_worker_model, texts)
+
+
+# ==============================================================================
+# PIPELINE
+# ==============================================================================
+def _put(q, item, stop):
+    """put bloqueante que se rinde si otra etapa pidió detener el pipeline."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _FIN
+
+
+class ClassificationPipeline:
+    def __init__(self, engine, model_dir=MODEL_DIR, chunk_size=50000, workers=0, queue_size=2,
+                 progress_cb=None, stop_event=None, run_id=None):
+        self.engine = engine
+        self.run_id = run_id
+        self.model_dir = model_dir
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.progress_cb = progress_cb
+        self.stop = stop_event or threading.Event()
+        self.errors = []
+        self.stats = self._empty_stats()
+        self._lock = threading.Lock()
+        self._recursos = None
+
+    @staticmethod
+    def _empty_stats():
+        return {"leidas": 0, "escritas": 0, "unicos": 0, "reglas": 0, "errores_lote": 0,
+                "t_prediccion": 0.0, "t_escritura": 0.0}
+
+    def _fail(self, etapa, e):
+        self.errors.append(f"{etapa}: {e}")
+        self.stop.set()
+
+    # --- Etapa 1: lector sobre cursor del lado del servidor ---
+    def _reader(self, query, out_q, n_predictores):
+        try:
+            with self.engine.connect().execution_options(stream_results=True, max_row_buffer=self.chunk_size) as conn:
+                for chunk in pd.read_sql(text(query), conn, chunksize=self.chunk_size):
+                    with self._lock:
+                        self.stats["leidas"] += len(chunk)
+                    if not _put(out_q, chunk, self.stop):
+                        return
+        except Exception as e:
+            self._fail("lectura", e)
+        finally:
+            for _ in range(n_predictores):
+                _put(out_q, _FIN, self.stop)
+
+    # --- Etapa 2: predictor (reglas + caché + dedup + modelo local o en pool de procesos) ---
+    def _predictor(self, in_q, out_q, cache, predict_fn, rules):
+        try:
+            while True:
+                chunk = _get(in_q, self.stop)
+                if chunk is _FIN:
+                    break
+                t0 = time.time()
+                n_unicos = 0
+                with self.engine.begin() as conn:
+                    def classify_fn(textos):
+                        nonlocal n_unicos
+                        preds, n_unicos = classify_deduplicated(textos, lambda u: cache.classify(u, predict_fn, conn=conn))
+                        return preds
+                    preds, n_reglas = classify_with_rules(chunk, rules, classify_fn)
+                df_up = pd.DataFrame({
+                    "id_transaccion": chunk["id_transaccion"].values,
+                    "grupo": preds["grupo"].values,
+                    "subgrupo": preds["subgrupo"].values,
+                    "fuente_clasificacion": preds["fuente"].values,
+                })
+                with self._lock:
+                    self.stats["unicos"] += n_unicos
+                    self.stats["reglas"] += n_reglas
+                    self.stats["t_prediccion"] += time.time() - t0
+                if not _put(out_q, df_up, self.stop):
+                    return
+        except Exception as e:
+            self._fail("predicción", e)
+        finally:
+            _put(out_q, _FIN, self.stop)
+
+    # --- Etapa 3: escritor (COPY binario al staging + UPDATE) ---
+    def _writer(self, in_q, n_predictores, staging):
+        terminados = 0
+        while terminados < n_predictores:
+            df_up = _get(in_q, self.stop)
+            if df_up is _FIN:
+                if self.stop.is_set():
+                    return
+                terminados += 1
+                continue
+            t0 = time.time()
+            try:
+                staging.apply(df_up)
+                with self._lock:
+                    self.stats["escritas"] += len(df_up)
+            except Exception as e:
+                # Igual que antes: un lote fallido no detiene el proceso completo
+                print(f"\n❌ Error en lote: {e}")
+                with self._lock:
+                    self.stats["errores_lote"] += 1
+            with self._lock:
+                self.stats["t_escritura"] += time.time() - t0
+            if self.progress_cb:
+                self.progress_cb(dict(self.stats))
+
+    def open(self):
+        """
+        Prepara lo costoso una sola vez: versión del modelo, reglas, caché y modelo o pool de
+        procesos. Con el pipeline abierto, varias llamadas a run() (ej. un worker que toma
+        rangos de la cola) reutilizan todo; sin abrir, run() lo hace y lo libera al terminar.
+        """
+        if self._recursos is not None:
+            return self
+        # Se fija la versión activa al abrir: un cambio de versión durante la corrida no la mezcla
+        artifact_dir, version = resolve_model_dir(self.model_dir)
+        if version is not None:
+            check_normalization(load_metadata(version, self.model_dir))
+        version = version or compute_model_version(artifact_dir)
+        cache = PredictionCache(version)
+        try:
+            with self.engine.begin() as conn:
+                rules = RuleEngine.load(conn)
+        except Exception as e:
+            print(f"⚠️ Reglas no disponibles, se usa solo el modelo: {e}")
+            rules = None
+
+        pool = None
+        if self.workers > 0:
+            # 'spawn' evita heredar hilos y conexiones abiertas del proceso padre
+            pool = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(artifact_dir,))
+            predict_fn = lambda t: pool.submit(_predict_in_worker, t).result()
+        else:
+            model, _ = load_models(artifact_dir, mmap_mode="r")
+            predict_fn = lambda t: predict_texts(model, t)
+        self._recursos = {"version": version, "cache": cache, "rules": rules, "pool": pool, "predict_fn": predict_fn}
+        return self
+
+    def close(self):
+        if self._recursos is not None and self._recursos["pool"]:
+            self._recursos["pool"].shutdown(cancel_futures=True)
+        self._recursos = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, query, run_id=None, stop_event=None):
+        """
+        Ejecuta el pipeline sobre `query` y devuelve las estadísticas de esta corrida (incluye
+        las de la caché). `run_id` / `stop_event` reemplazan los del constructor para esta corrida.
+        """
+        propio = self._recursos is None
+        self.open()
+        try:
+            return self._run(query, run_id or self.run_id, stop_event)
+        finally:
+            if propio:
+                self.close()
+
+    def _run(self, query, run_id, stop_event):
+        if stop_event is not None:
+            self.stop = stop_event
+        self.errors = []
+        self.stats = self._empty_stats()
+        rec = self._recursos
+        cache, rules, predict_fn = rec["cache"], rec["rules"], rec["predict_fn"]
+        self.stats["version_modelo"] = rec["version"]
+        cache_inicio = dict(cache.stats)
+        n_predictores = max(1, self.workers)
+        read_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+
+        start = time.time()
+        threads = [threading.Thread(target=self._reader, args=(query, read_q, n_predictores), daemon=True)]
+        threads += [threading.Thread(target=self._predictor, args=(read_q, write_q, cache, predict_fn, rules), daemon=True)
+                    for _ in range(n_predictores)]
+        staging = StagingTable(self.engine, run_id)
+        threads.append(threading.Thread(target=self._writer, args=(write_q, n_predictores, staging), daemon=True))
+        try:
+            staging.create()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            staging.drop()
+
+        stats = dict(self.stats)
+        stats["segundos"] = time.time() - start
+        stats["cache"] = {k: v - cache_inicio.get(k, 0) for k, v in cache.stats.items()}
+        stats["n_reglas_compiladas"] = len(rules) if rules else 0
+        stats["errores"] = list(self.errors)
+        return stats
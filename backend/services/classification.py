@@ -0,0 +1,155 @@
+# backend/services/classification.py
+# Lógica de clasificación compartida entre la API (/predict) y el proceso batch.
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from backend.services.text_normalization import build_text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(CURRENT_DIR)
+MODEL_DIR = os.path.join(BACKEND_DIR, "ml_models")
+# Formato jerárquico (un artefacto) o histórico (dos pipelines independientes)
+HIERARCHICAL_FILE = "modelo_jerarquico.pkl"
+MODEL_FILES = ("modelo_grupo.pkl", "modelo_subgrupo.pkl")
+# Registro de versiones (ver model_registry.py): registry/<version>/ + puntero ACTIVE
+REGISTRY_SUBDIR = "registry"
+ACTIVE_FILE = "ACTIVE"
+
+
+class PairedModel:
+    """Par de pipelines independientes (formato histórico) con la misma interfaz que HierarchicalClassifier."""
+
+    def __init__(self, model_grupo, model_subgrupo):
+        self.model_grupo = model_grupo
+        self.model_subgrupo = model_subgrupo
+
+    @property
+    def classes_(self):
+        return self.model_grupo.classes_
+
+    @property
+    def supports_partial_fit(self):
+        return all(hasattr(pipe[-1], "partial_fit") for pipe in (self.model_grupo, self.model_subgrupo))
+
+    def partial_fit(self, texts, grupos, subgrupos, epochs=5):
+        """Igual que HierarchicalClassifier.partial_fit, aplicado a cada pipeline por separado."""
+        ok = None
+        for pipe, y in ((self.model_grupo, grupos), (self.model_subgrupo, subgrupos)):
+            clf = pipe[-1]
+            if not hasattr(clf, "partial_fit"):
+                raise ValueError("El modelo actual no soporta aprendizaje incremental (use sgd_tfidf o sgd_hashing)")
+            known = np.isin(np.asarray(y, dtype=object), clf.classes_)
+            ok = known if ok is None else ok & known
+        if not ok.any():
+            return 0
+        texts = pd.Series(texts)[ok]
+        for pipe, y in ((self.model_grupo, grupos), (self.model_subgrupo, subgrupos)):
+            X = pipe[:-1].transform(texts)
+            for _ in range(epochs):
+                pipe[-1].partial_fit(X, np.asarray(y, dtype=object)[ok])
+        return int(ok.sum())
+
+    def predict_frame(self, texts):
+        probs = self.model_grupo.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return pd.DataFrame({
+            "grupo": self.model_grupo.classes_[best],
+            "subgrupo": self.model_subgrupo.predict(texts),
+            "confianza": np.round(probs[np.arange(len(best)), best] * 100, 1),
+        }, index=texts.index)
+
+
+def build_input_text(df):
+    """Cuenta + Proveedor + Glosa del libro, con la misma normalización del entrenamiento."""
+    return build_text(df['cuenta_contable'], df['id_proveedor'], df['descripcion_gasto'])
+
+
+def resolve_model_dir(model_dir=MODEL_DIR):
+    """
+    Directorio con los artefactos del modelo activo y su versión registrada.
+    Sin registro (o sin versión activa) se usa el formato plano histórico: (model_dir, None).
+    """
+    active = os.path.join(model_dir, REGISTRY_SUBDIR, ACTIVE_FILE)
+    if os.path.exists(active):
+        with open(active) as f:
+            version = f.read().strip()
+        if version:
+            return os.path.join(model_dir, REGISTRY_SUBDIR, version), version
+    return model_dir, None
+
+
+def model_files(model_dir=MODEL_DIR):
+    """Archivos del modelo activo (el jerárquico tiene prioridad si existe)."""
+    if os.path.exists(os.path.join(model_dir, HIERARCHICAL_FILE)):
+        return [HIERARCHICAL_FILE]
+    return list(MODEL_FILES)
+
+
+def compute_model_version(model_dir=MODEL_DIR):
+    """Huella corta de los pickles: cambia cada vez que se reentrena el modelo."""
+    model_dir, version = resolve_model_dir(model_dir)
+    if version:
+        return version
+    h = hashlib.md5()
+    for name in model_files(model_dir):
+        with open(os.path.join(model_dir, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
+
+
+def load_models(model_dir=MODEL_DIR, mmap_mode=None):
+    """
+    Devuelve (modelo, version); el modelo expone predict_frame(textos).
+    mmap_mode='r' mapea los arrays del artefacto en vez de copiarlos (carga rápida y páginas
+    compartidas entre procesos); no usar si el modelo se va a modificar con partial_fit.
+    """
+    model_dir, version = resolve_model_dir(model_dir)
+    files = model_files(model_dir)
+    if files == [HIERARCHICAL_FILE]:
+        model = joblib.load(os.path.join(model_dir, HIERARCHICAL_FILE), mmap_mode=mmap_mode)
+    else:
+        model = PairedModel(joblib.load(os.path.join(model_dir, MODEL_FILES[0]), mmap_mode=mmap_mode),
+                            joblib.load(os.path.join(model_dir, MODEL_FILES[1]), mmap_mode=mmap_mode))
+    return model, version or compute_model_version(model_dir)
+
+
+def predict_texts(model, texts):
+    """Predice grupo, subgrupo y confianza (%) para una serie de textos ya preparados."""
+    return model.predict_frame(texts)
+
+
+def classify_deduplicated(texts, classify_fn):
+    """
+    Factoriza los textos, clasifica solo los valores únicos y difunde las etiquetas
+    de vuelta por índice. Devuelve (predicciones alineadas con `texts`, n_unicos).
+    """
+    codes, uniques = pd.factorize(texts)
+    preds_unique = classify_fn(pd.Series(uniques, dtype=object))
+    preds = preds_unique.iloc[codes]
+    preds.index = texts.index
+    return preds, len(uniques)
+
+
+def classify_with_rules(df, rules, classify_fn):
+    """
+    Aplica primero la capa de reglas; solo las filas sin regla se envían a
+    `classify_fn(textos) -> DataFrame(grupo, subgrupo, confianza)`.
+    Devuelve (DataFrame con grupo, subgrupo, confianza, fuente; n_filas_por_regla).
+    """
+    if rules is not None and len(rules):
+        out = rules.apply(df)
+    else:
+        out = pd.DataFrame({"grupo": None, "subgrupo": None, "confianza": np.nan, "fuente": None},
+                           index=df.index, dtype=object)
+    resto = out["fuente"].isna()
+    if resto.any():
+        preds = classify_fn(build_input_text(df[resto]))
+        for col in ("grupo", "subgrupo", "confianza"):
+            out.loc[resto, col] = preds[col].values
+        out.loc[resto, "fuente"] = "modelo"
+    return out, int((~resto).sum())
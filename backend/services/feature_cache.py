@@ -0,0 +1,89 @@
+# backend/services/feature_cache.py
+# Caché en disco de matrices de features (.npz dispersas) para entrenamiento.
+# La clave combina el hash de los textos y la configuración del vectorizador, así
+# reentrenos y experimentos de hiperparámetros reutilizan la tokenización.
+import hashlib
+import os
+import uuid
+
+import joblib
+import pandas as pd
+import scipy.sparse as sp
+
+from backend.services.model_backends import DEFAULT_BACKEND, build_vectorizer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FEATURE_CACHE_DIR = os.path.join(BASE_DIR, "data", "feature_cache")
+
+
+def data_hash(texts):
+    """Hash estable del contenido (y orden) de los textos."""
+    hashed = pd.util.hash_pandas_object(pd.Series(texts, dtype=object).reset_index(drop=True), index=False)
+    return hashlib.md5(hashed.values.tobytes()).hexdigest()[:16]
+
+
+def vectorizer_hash(vectorizer):
+    params = sorted((k, repr(v)) for k, v in vectorizer.get_params(deep=True).items())
+    raw = f"{type(vectorizer).__name__}|{params}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()[:12]
+
+
+class FeatureCache:
+    def __init__(self, cache_dir=FEATURE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def fit_path(self, fit_key):
+        """Ruta .npz de la matriz de ajuste (para cargarla desde otro proceso)."""
+        return self._path(f"{fit_key}.fit.npz")
+
+    def transform_path(self, fit_key, texts):
+        return self._path(f"{fit_key}__{data_hash(texts)}.npz")
+
+    def fit_transform(self, texts, backend=DEFAULT_BACKEND, vectorizer=None):
+        """
+        Devuelve (X, vectorizador ajustado, fit_key). Si ya existe una matriz para los
+        mismos textos y configuración, se carga del disco en vez de re-tokenizar.
+        """
+        vectorizer = vectorizer if vectorizer is not None else build_vectorizer(backend)
+        fit_key = f"{vectorizer_hash(vectorizer)}_{data_hash(texts)}"
+        x_path, vec_path = self.fit_path(fit_key), self._path(f"{fit_key}.vec.joblib")
+
+        if os.path.exists(x_path) and os.path.exists(vec_path):
+            self.hits += 1
+            return sp.load_npz(x_path), joblib.load(vec_path), fit_key
+
+        self.misses += 1
+        X = sp.csr_matrix(vectorizer.fit_transform(texts))
+        self._save(x_path, X)
+        tmp = _tmp_path(vec_path)
+        joblib.dump(vectorizer, tmp)
+        os.replace(tmp, vec_path)
+        return X, vectorizer, fit_key
+
+    def transform(self, vectorizer, fit_key, texts):
+        """Transforma `texts` con un vectorizador ya ajustado (clave = ajuste + textos)."""
+        path = self.transform_path(fit_key, texts)
+        if os.path.exists(path):
+            self.hits += 1
+            return sp.load_npz(path)
+        self.misses += 1
+        X = sp.csr_matrix(vectorizer.transform(texts))
+        self._save(path, X)
+        return X
+
+    @staticmethod
+    def _save(path, X):
+        tmp = _tmp_path(path) + ".npz"  # save_npz agrega .npz si falta
+        sp.save_npz(tmp, X)
+        os.replace(tmp, path)
+
+
+def _tmp_path(path):
+    """Temporal único por escritura: dos procesos con la misma clave no se pisan (gana el último rename)."""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
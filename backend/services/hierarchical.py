@@ -0,0 +1,123 @@
+# backend/services/hierarchical.py
+# Clasificador jerárquico grupo -> subgrupo en un solo artefacto:
+#   - Un vectorizador compartido (el texto se vectoriza UNA vez por predicción).
+#   - Un modelo de grupo.
+#   - Un modelo de subgrupo por grupo, entrenado solo con sus hijos válidos,
+#     por lo que el par (grupo, subgrupo) predicho siempre es consistente.
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from backend.services.model_backends import DEFAULT_BACKEND, build_classifier, build_vectorizer
+
+
+class HierarchicalClassifier:
+    def __init__(self, backend=DEFAULT_BACKEND, params=None):
+        self.backend = backend
+        self.params = dict(params or {})
+        self.vectorizer = None
+        self.model_grupo = None
+        # grupo -> clasificador, o etiqueta fija (str) si el grupo tiene un único subgrupo
+        self.sub_models = {}
+
+    @property
+    def classes_(self):
+        return self.model_grupo.classes_
+
+    @property
+    def supports_partial_fit(self):
+        return hasattr(self.model_grupo, "partial_fit")
+
+    @property
+    def children(self):
+        """Subgrupos válidos por grupo (según el entrenamiento)."""
+        return {g: ([m] if isinstance(m, str) else [str(c) for c in m.classes_]) for g, m in self.sub_models.items()}
+
+    def fit(self, texts, grupos, subgrupos, features=None):
+        """
+        `features` = (X, vectorizador ya ajustado sobre `texts`) permite reutilizar una
+        matriz precalculada (ver feature_cache.py) en lugar de vectorizar de nuevo.
+        """
+        grupos = np.asarray(grupos, dtype=object)
+        subgrupos = np.asarray(subgrupos, dtype=object)
+
+        if features is not None:
+            X, self.vectorizer = features
+        else:
+            self.vectorizer = build_vectorizer(self.backend, self.params)
+            X = self.vectorizer.fit_transform(texts)
+
+        self.model_grupo = build_classifier(self.backend, self.params)
+        self.model_grupo.fit(X, grupos)
+
+        base_sub = build_classifier(self.backend, self.params)
+        self.sub_models = {}
+        for g in np.unique(grupos):
+            idx = np.flatnonzero(grupos == g)
+            hijos = np.unique(subgrupos[idx])
+            if len(hijos) == 1:
+                self.sub_models[g] = str(hijos[0])
+            else:
+                self.sub_models[g] = clone(base_sub).fit(X[idx], subgrupos[idx])
+        return self
+
+    def partial_fit(self, texts, grupos, subgrupos, epochs=5):
+        """
+        Actualización incremental (solo backends con partial_fit, ej. SGD) con etiquetas nuevas.
+        Las filas con un grupo/subgrupo que el modelo no conoce se omiten: requieren reentrenamiento
+        completo. Devuelve el número de filas aprendidas.
+        """
+        if not hasattr(self.model_grupo, "partial_fit"):
+            raise ValueError(f"El backend '{self.backend}' no soporta aprendizaje incremental (use sgd_tfidf o sgd_hashing)")
+        grupos = np.asarray(grupos, dtype=object)
+        subgrupos = np.asarray(subgrupos, dtype=object)
+        X = self.vectorizer.transform(texts)
+
+        ok = np.isin(grupos, self.model_grupo.classes_)
+        for g in np.unique(grupos[ok]):
+            model = self.sub_models.get(g)
+            idx = np.flatnonzero(ok & (grupos == g))
+            if isinstance(model, str):
+                ok[idx[subgrupos[idx] != model]] = False
+            elif model is not None:
+                ok[idx[~np.isin(subgrupos[idx], model.classes_)]] = False
+        if not ok.any():
+            return 0
+
+        idx_ok = np.flatnonzero(ok)
+        for _ in range(epochs):
+            self.model_grupo.partial_fit(X[idx_ok], grupos[idx_ok])
+            for g in np.unique(grupos[idx_ok]):
+                model = self.sub_models.get(g)
+                if model is not None and not isinstance(model, str):
+                    idx = np.flatnonzero(ok & (grupos == g))
+                    model.partial_fit(X[idx], subgrupos[idx])
+        return int(ok.sum())
+
+    def _predict_sub(self, X, grupos_pred):
+        subs = np.empty(len(grupos_pred), dtype=object)
+        for g in np.unique(grupos_pred):
+            idx = np.flatnonzero(grupos_pred == g)
+            model = self.sub_models.get(g)
+            if model is None:
+                subs[idx] = "General"
+            elif isinstance(model, str):
+                subs[idx] = model
+            else:
+                subs[idx] = model.predict(X[idx])
+        return subs
+
+    def predict_frame(self, texts):
+        """Predice grupo, subgrupo y confianza (%) con una sola vectorización."""
+        X = self.vectorizer.transform(texts)
+        probs = self.model_grupo.predict_proba(X)
+        best = probs.argmax(axis=1)
+        grupos_pred = self.model_grupo.classes_[best]
+        return pd.DataFrame({
+            "grupo": grupos_pred,
+            "subgrupo": self._predict_sub(X, grupos_pred),
+            "confianza": np.round(probs[np.arange(len(best)), best] * 100, 1),
+        }, index=getattr(texts, "index", None))
+
+    def predict(self, texts):
+        return self.predict_frame(texts)["grupo"].values
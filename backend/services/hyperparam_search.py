@@ -0,0 +1,160 @@
+# backend/services/hyperparam_search.py
+# Búsqueda de hiperparámetros con validación cruzada estratificada (k-fold) en paralelo.
+#   Fase 1: features por (configuración del vectorizador, fold) -> .npz en la caché de features.
+#   Fase 2: un clasificador por (configuración, fold), cargando las matrices desde disco.
+# Ambas fases corren en un pool de procesos; las configuraciones que solo cambian el
+# clasificador reutilizan las mismas matrices.
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+from backend.services.feature_cache import FEATURE_CACHE_DIR, FeatureCache, vectorizer_hash
+from backend.services.model_backends import PARAM_GRID, build_classifier, build_vectorizer, split_params
+
+# Estado por proceso del pool (se envía una vez en el initializer, no en cada tarea)
+_TEXTS = None
+_LABELS = None
+_CACHE_DIR = None
+
+
+def expand_grid(backends, grid=PARAM_GRID):
+    """Lista de (backend, params) con todas las combinaciones de la grilla."""
+    configs = []
+    for backend in backends:
+        space = grid.get(backend, {})
+        keys = sorted(space)
+        for values in itertools.product(*(space[k] for k in keys)):
+            configs.append((backend, dict(zip(keys, values))))
+    return configs
+
+
+def _vec_key(backend, params):
+    """
+    Clave de la configuración del vectorizador (sin el backend: sgd_tfidf y logreg_tfidf con el
+    mismo max_features comparten features) y (backend, items) para reconstruirlo en el worker.
+    """
+    vec_params, _ = split_params(params)
+    return vectorizer_hash(build_vectorizer(backend, params)), (backend, tuple(sorted(vec_params.items())))
+
+
+def _init_worker(texts, labels, cache_dir):
+    global _TEXTS, _LABELS, _CACHE_DIR
+    _TEXTS, _LABELS, _CACHE_DIR = texts, labels, cache_dir
+
+
+def _build_features(task):
+    """Fase 1: ajusta el vectorizador en el fold de entrenamiento y guarda ambas matrices."""
+    vkey, backend, vec_items, fold, train_idx, test_idx = task
+    cache = FeatureCache(_CACHE_DIR)
+    params = {f"vec__{k}": v for k, v in vec_items}
+    X_train, X_test = _TEXTS.iloc[train_idx], _TEXTS.iloc[test_idx]
+
+    t0 = time.perf_counter()
+    _, vec, fit_key = cache.fit_transform(X_train, vectorizer=build_vectorizer(backend, params))
+    cache.transform(vec, fit_key, X_test)
+    return (vkey, fold), {
+        "train": cache.fit_path(fit_key),
+        "test": cache.transform_path(fit_key, X_test),
+        "vec_s": time.perf_counter() - t0,
+        "hit": cache.hits > 0,
+    }
+
+
+def _evaluate(task):
+    """Fase 2: entrena y evalúa un clasificador sobre matrices ya vectorizadas."""
+    config_id, backend, params, fold, paths, train_idx, test_idx = task
+    X_train, X_test = sp.load_npz(paths["train"]), sp.load_npz(paths["test"])
+    y_train, y_test = _LABELS[train_idx], _LABELS[test_idx]
+
+    clf = build_classifier(backend, params)
+    # El paralelismo lo pone el pool: evitar que cada proceso lance todos los núcleos
+    if "n_jobs" in clf.get_params():
+        clf.set_params(n_jobs=1)
+
+    t0 = time.perf_counter()
+    clf.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+
+    # Mejor de 3 repeticiones (igual que benchmark_models.py) para no medir ruido
+    predict_s = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        y_pred = clf.predict(X_test)
+        predict_s = min(predict_s, time.perf_counter() - t0)
+
+    return {
+        "config_id": config_id,
+        "fold": fold,
+        "accuracy": accuracy_score(y_test, y_pred),
+        "macro_f1": f1_score(y_test, y_pred, average="macro"),
+        "fit_s": fit_s,
+        "predict_ms_1k": predict_s / max(len(test_idx), 1) * 1e6,
+    }
+
+
+def run_search(texts, labels, backends, folds=5, workers=4, cache_dir=FEATURE_CACHE_DIR,
+               grid=PARAM_GRID, progress_cb=None):
+    """
+    Evalúa cada configuración de la grilla con StratifiedKFold.
+    Devuelve (resumen por configuración, detalle por fold) como DataFrames.
+    """
+    texts = pd.Series(texts).reset_index(drop=True)
+    labels = np.asarray(labels, dtype=object)
+    configs = expand_grid(backends, grid)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(texts, labels))
+
+    # Una tarea por vectorizador distinto y fold: cada set de features se ajusta una sola vez
+    vec_keys = dict(sorted(_vec_key(b, p) for b, p in configs))
+    feature_tasks = [(vkey, b, items, f, tr, te) for vkey, (b, items) in vec_keys.items()
+                     for f, (tr, te) in enumerate(splits)]
+
+    # 'spawn' por consistencia con batch_pipeline (no hereda hilos ni conexiones del padre)
+    pool = ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(texts, labels, cache_dir))
+    try:
+        features = dict(pool.map(_build_features, feature_tasks))
+        if progress_cb:
+            reused = sum(v["hit"] for v in features.values())
+            progress_cb(f"features listas: {len(features)} matrices ({reused} desde caché)")
+
+        eval_tasks = []
+        for config_id, (backend, params) in enumerate(configs):
+            vkey, _ = _vec_key(backend, params)
+            for f, (tr, te) in enumerate(splits):
+                eval_tasks.append((config_id, backend, params, f, features[(vkey, f)], tr, te))
+        detalle = []
+        for i, res in enumerate(pool.map(_evaluate, eval_tasks), 1):
+            detalle.append(res)
+            if progress_cb and i % folds == 0:
+                progress_cb(f"{i // folds}/{len(configs)} configuraciones evaluadas")
+    finally:
+        pool.shutdown()
+
+    detalle = pd.DataFrame(detalle)
+    resumen = detalle.groupby("config_id").agg(
+        accuracy=("accuracy", "mean"),
+        macro_f1=("macro_f1", "mean"),
+        macro_f1_std=("macro_f1", "std"),
+        fit_s=("fit_s", "mean"),
+        predict_ms_1k=("predict_ms_1k", "mean"),
+    ).reset_index()
+    resumen.insert(1, "backend", [configs[i][0] for i in resumen["config_id"]])
+    resumen.insert(2, "params", [configs[i][1] for i in resumen["config_id"]])
+    return resumen, detalle
+
+
+def select_config(resumen, metric="macro_f1", tolerance=0.01):
+    """
+    Entre las configuraciones a menos de `tolerance` del mejor `metric`, elige la de menor
+    tiempo de predicción (desempate: tiempo de entrenamiento). Devuelve la fila elegida.
+    """
+    mejor = resumen[metric].max()
+    candidatas = resumen[resumen[metric] >= mejor - tolerance]
+    return candidatas.sort_values(["predict_ms_1k", "fit_s"]).iloc[0]
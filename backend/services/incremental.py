@@ -0,0 +1,194 @@
+# backend/services/incremental.py
+# Aprendizaje incremental desde las correcciones manuales del corrector UI.
+# - Un trigger registra en correcciones_manuales cada fila que pasa a clasificacion_manual = TRUE
+#   (o cuya etiqueta manual cambia), con un id creciente que sirve de marca de agua.
+# - El entrenamiento incremental toma solo las correcciones posteriores a la última marca,
+#   actualiza el modelo con partial_fit y publica el nuevo artefacto de forma atómica.
+import json
+import os
+import time
+
+import joblib
+import pandas as pd
+from sqlalchemy import text
+
+from backend.services.classification import (
+    MODEL_DIR, HIERARCHICAL_FILE, MODEL_FILES, build_input_text, load_models, model_files, compute_model_version,
+    resolve_model_dir
+)
+from backend.services.model_registry import get_metadata, register_model
+
+SCHEMA = "control_gestion"
+TABLA = "libros_diarios_consolidados"
+T_CORRECCIONES = f"{SCHEMA}.correcciones_manuales"
+STATE_FILE = "incremental_state.json"
+
+
+class IncrementalNotSupported(ValueError):
+    """El modelo activo no admite partial_fit (ej. random_forest): corresponde un reentrenamiento completo."""
+
+
+def ensure_corrections_log(conn):
+    """Crea la tabla de log y su trigger (idempotente; el trigger solo se crea si no existe)."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_CORRECCIONES} (
+            id BIGSERIAL PRIMARY KEY,
+            id_transaccion BIGINT NOT NULL,
+            grupo TEXT,
+            subgrupo TEXT,
+            creado_en TIMESTAMP DEFAULT now()
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {SCHEMA}.fn_registrar_correcciones() RETURNS trigger
+        LANGUAGE plpgsql AS $fn$
+        BEGIN
+            INSERT INTO {T_CORRECCIONES} (id_transaccion, grupo, subgrupo)
+            SELECT n.id_transaccion, n.grupo, n.subgrupo
+            FROM new_rows n JOIN old_rows o USING (id_transaccion)
+            WHERE n.clasificacion_manual IS TRUE AND n.grupo IS NOT NULL
+            AND (o.grupo, o.subgrupo, o.clasificacion_manual) IS DISTINCT FROM (n.grupo, n.subgrupo, n.clasificacion_manual);
+            RETURN NULL;
+        END;
+        $fn$
+    """))
+    existe = conn.execute(text("""
+        SELECT 1 FROM pg_trigger
+        WHERE tgrelid = CAST(:tabla AS regclass) AND tgname = 'trg_registrar_correcciones' AND NOT tgisinternal
+    """), {"tabla": f"{SCHEMA}.{TABLA}"}).scalar()
+    if existe:
+        return
+    conn.execute(text(f"""
+        CREATE TRIGGER trg_registrar_correcciones
+        AFTER UPDATE ON {SCHEMA}.{TABLA}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {SCHEMA}.fn_registrar_correcciones()
+    """))
+
+
+def load_state(model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def version_watermark(state, version, model_dir=MODEL_DIR):
+    """
+    Marca de agua que corresponde a `version`: la del estado si es de esa versión, si no la
+    registrada en sus metadatos (así activar una versión anterior no arrastra una marca ajena).
+    None = aplicar todas las correcciones manuales.
+    """
+    if state.get("version") == version:
+        return state.get("ultimo_id_correccion")
+    if resolve_model_dir(model_dir)[1] is not None:
+        return get_metadata(version, model_dir).get("marca_correcciones")
+    return None
+
+
+def fetch_new_labels(conn, desde_id=None):
+    """
+    Devuelve (DataFrame texto/grupo/subgrupo, nueva marca de agua).
+    Sin marca previa se toman todas las filas manuales del libro (arranque).
+    """
+    marca = conn.execute(text(f"SELECT COALESCE(max(id), 0) FROM {T_CORRECCIONES}")).scalar()
+    if desde_id is None:
+        sql = f"""
+            SELECT cuenta_contable, id_proveedor, descripcion_gasto, grupo, subgrupo
+            FROM {SCHEMA}.{TABLA}
+            WHERE clasificacion_manual IS TRUE AND grupo IS NOT NULL AND grupo <> ''
+        """
+        params = {}
+    else:
+        # Etiqueta vigente en el libro (si una fila se corrigió dos veces, cuenta la última)
+        sql = f"""
+            SELECT t.cuenta_contable, t.id_proveedor, t.descripcion_gasto, t.grupo, t.subgrupo
+            FROM {SCHEMA}.{TABLA} t
+            JOIN (SELECT DISTINCT id_transaccion FROM {T_CORRECCIONES}
+                  WHERE id > :desde AND id <= :hasta) c USING (id_transaccion)
+            WHERE t.clasificacion_manual IS TRUE AND t.grupo IS NOT NULL AND t.grupo <> ''
+        """
+        params = {"desde": desde_id, "hasta": marca}
+    df = pd.read_sql(text(sql), conn, params=params)
+    df["subgrupo"] = df["subgrupo"].fillna("General")
+    return pd.DataFrame({
+        "texto": build_input_text(df).values,
+        "grupo": df["grupo"].values,
+        "subgrupo": df["subgrupo"].values,
+    }), int(marca)
+
+
+def publish_model(model, model_dir=MODEL_DIR, base_version=None, n_filas=0, marca=None):
+    """
+    Publica el modelo actualizado y devuelve la nueva versión. Con registro de versiones se
+    registra y activa una versión nueva (la base queda disponible para volver atrás); en el
+    formato plano se escribe en un temporal y se reemplaza atómicamente.
+    """
+    if resolve_model_dir(model_dir)[1] is not None:
+        base = get_metadata(base_version, model_dir)
+        return register_model(model, {
+            "origen": "incremental",
+            "version_base": base_version,
+            "filas_incrementales": n_filas,
+            "marca_correcciones": marca,
+            # Mismo vectorizador y mismo texto de entrada que la base
+            "normalizacion": base.get("normalizacion"),
+            "backend": base.get("backend"),
+            "params": base.get("params"),
+            # Las métricas de la base ya no aplican tras partial_fit
+            "metricas": None,
+        }, model_dir)
+
+    files = model_files(model_dir)
+    if files == [HIERARCHICAL_FILE]:
+        destino = os.path.join(model_dir, HIERARCHICAL_FILE)
+        tmp = destino + ".tmp"
+        joblib.dump(model, tmp)
+        os.replace(tmp, destino)
+    else:
+        for name, pipe in zip(MODEL_FILES, (model.model_grupo, model.model_subgrupo)):
+            destino = os.path.join(model_dir, name)
+            joblib.dump(pipe, destino + ".tmp")
+            os.replace(destino + ".tmp", destino)
+    return compute_model_version(model_dir)
+
+
+def run_incremental_update(engine, model_dir=MODEL_DIR, epochs=5):
+    """Aplica las correcciones nuevas al modelo activo. Devuelve un dict con el resumen."""
+    t0 = time.time()
+    state = load_state(model_dir)
+    model, version = load_models(model_dir)
+
+    with engine.begin() as conn:
+        ensure_corrections_log(conn)
+        df, marca = fetch_new_labels(conn, version_watermark(state, version, model_dir))
+
+    if len(df) and not getattr(model, "supports_partial_fit", False):
+        raise IncrementalNotSupported(
+            f"El modelo {version} no soporta aprendizaje incremental (backend sin partial_fit): "
+            "se requiere reentrenamiento completo")
+
+    resumen = {"version_base": version, "filas_nuevas": len(df), "filas_aprendidas": 0,
+               "version_nueva": version, "marca": marca}
+    if len(df):
+        aprendidas = model.partial_fit(df["texto"], df["grupo"].values, df["subgrupo"].values, epochs=epochs)
+        resumen["filas_aprendidas"] = aprendidas
+        if aprendidas:
+            resumen["version_nueva"] = publish_model(model, model_dir, version, aprendidas, marca)
+
+    save_state({
+        "ultimo_id_correccion": marca,
+        "version": resumen["version_nueva"],
+        "actualizado_en": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }, model_dir)
+    resumen["segundos"] = time.time() - t0
+    return resumen
@@ -0,0 +1,299 @@
+# backend/services/jobs.py
+# Trabajos en segundo plano (clasificación del libro completo / reentrenamiento) lanzados
+# desde la API. Cada trabajo corre en un proceso aparte ('spawn') y reporta su avance en
+# la tabla control_gestion.trabajos_ia, así cualquier worker de uvicorn puede consultarlo
+# o cancelarlo y la petición HTTP nunca queda bloqueada.
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+from collections import deque
+
+from sqlalchemy import create_engine, text
+
+from backend.services.batch_pipeline import QUERY_PENDIENTES, ClassificationPipeline, count_pending
+from backend.services.classification import MODEL_DIR
+from backend.services.incremental import IncrementalNotSupported, run_incremental_update
+from backend.services.provider_consistency import unify_pending_providers
+
+SCHEMA = "control_gestion"
+T_TRABAJOS = f"{SCHEMA}.trabajos_ia"
+TIPOS = ("clasificacion", "reentrenamiento")
+ACTIVOS = ("pendiente", "en_curso")
+INTERVALO_MONITOR = 2.0
+# Sin latido del monitor durante este tiempo el trabajo se da por muerto (reinicio de uvicorn,
+# otro worker de la API, proceso matado): ningún proceso vivo lo va a cerrar
+TRABAJO_HUERFANO_SEG = 60
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TRAIN_SCRIPT = os.path.join(BASE_DIR, "ml", "train_model.py")
+
+# Procesos lanzados por ESTE proceso de la API (para recogerlos y detectar caídas)
+_procesos = {}
+
+
+def ensure_jobs_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_TRABAJOS} (
+            id BIGSERIAL PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            parametros JSONB DEFAULT '{{}}'::jsonb,
+            total BIGINT,
+            procesadas BIGINT DEFAULT 0,
+            cancelar BOOLEAN DEFAULT FALSE,
+            resultado JSONB,
+            error TEXT,
+            pid INTEGER,
+            creado_en TIMESTAMP DEFAULT now(),
+            iniciado_en TIMESTAMP,
+            actualizado_en TIMESTAMP,
+            terminado_en TIMESTAMP
+        )
+    """))
+
+
+# ==============================================================================
+# LADO API: crear, consultar, cancelar
+# ==============================================================================
+def start_job(engine, tipo, parametros=None):
+    """Registra el trabajo y lanza su proceso. ValueError si el tipo no existe o ya hay uno activo."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}. Opciones: {', '.join(TIPOS)}")
+    parametros = parametros or {}
+    with engine.begin() as conn:
+        ensure_jobs_table(conn)
+        # Un solo trabajo activo por tipo: dos clasificaciones simultáneas pisarían las mismas filas
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:t))"), {"t": T_TRABAJOS + tipo})
+        _expire_orphans(conn, tipo)
+        activo = conn.execute(text(f"SELECT id FROM {T_TRABAJOS} WHERE tipo = :t AND estado = ANY(:e)"),
+                              {"t": tipo, "e": list(ACTIVOS)}).scalar()
+        if activo:
+            raise ValueError(f"Ya hay un trabajo de {tipo} activo (id {activo})")
+        job_id = conn.execute(text(f"""
+            INSERT INTO {T_TRABAJOS} (tipo, parametros) VALUES (:t, CAST(:p AS JSONB)) RETURNING id
+        """), {"t": tipo, "p": json.dumps(parametros)}).scalar()
+
+    url = engine.url.render_as_string(hide_password=False)
+    proc = multiprocessing.get_context("spawn").Process(target=run_job, args=(job_id, url), name=f"trabajo-{job_id}")
+    proc.start()
+    _procesos[job_id] = proc
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {T_TRABAJOS} SET pid = :pid, actualizado_en = now() WHERE id = :id"), {"pid": proc.pid, "id": job_id})
+    return job_id
+
+
+def _expire_orphans(conn, tipo=None):
+    """
+    Marca como error los trabajos activos sin latido reciente (o sin pid pasado el plazo),
+    lanzados por cualquier proceso de la API. Devuelve los ids marcados.
+    """
+    rows = conn.execute(text(f"""
+        UPDATE {T_TRABAJOS} SET estado = 'error', terminado_en = now(),
+               error = COALESCE(error, 'Sin señal del proceso por más de ' || :seg || ' s (reinicio de la API o proceso caído)')
+        WHERE estado = ANY(:e) AND (CAST(:t AS TEXT) IS NULL OR tipo = :t)
+        AND COALESCE(actualizado_en, creado_en) < now() - make_interval(secs => :seg)
+        RETURNING id
+    """), {"e": list(ACTIVOS), "t": tipo, "seg": TRABAJO_HUERFANO_SEG}).fetchall()
+    return [r[0] for r in rows]
+
+
+def _reap(conn):
+    """Recoge procesos terminados; si murieron sin cerrar su trabajo, se marca como error."""
+    for job_id, proc in list(_procesos.items()):
+        if proc.is_alive():
+            continue
+        proc.join()
+        del _procesos[job_id]
+        conn.execute(text(f"""
+            UPDATE {T_TRABAJOS} SET estado = 'error', terminado_en = now(),
+                   error = COALESCE(error, 'El proceso terminó inesperadamente (código ' || :code || ')')
+            WHERE id = :id AND estado = ANY(:e)
+        """), {"id": job_id, "code": str(proc.exitcode), "e": list(ACTIVOS)})
+    # Trabajos de otros procesos de la API (o de antes de un reinicio) que ya no dan señal
+    _expire_orphans(conn)
+
+
+_SELECT = f"""
+    SELECT id, tipo, estado, parametros, total, procesadas, cancelar, resultado, error,
+           creado_en, iniciado_en, terminado_en,
+           EXTRACT(EPOCH FROM (COALESCE(terminado_en, now()) - iniciado_en)) AS segundos
+    FROM {T_TRABAJOS}
+"""
+
+
+def _with_rates(row):
+    job = dict(row._mapping)
+    seg = float(job.pop("segundos") or 0)
+    hechas, total = job["procesadas"] or 0, job["total"]
+    job["segundos"] = round(seg, 1)
+    job["filas_por_seg"] = round(hechas / seg, 1) if seg > 0 else None
+    job["eta_seg"] = None
+    if job["estado"] == "en_curso" and total and job["filas_por_seg"]:
+        job["eta_seg"] = round(max(total - hechas, 0) / job["filas_por_seg"], 1)
+    job["avance"] = round(hechas / total, 4) if total else None
+    return job
+
+
+def get_job(engine, job_id):
+    with engine.begin() as conn:
+        ensure_jobs_table(conn)
+        _reap(conn)
+        row = conn.execute(text(_SELECT + " WHERE id = :id"), {"id": job_id}).fetchone()
+    return _with_rates(row) if row else None
+
+
+def list_jobs(engine, limit=20):
+    with engine.begin() as conn:
+        ensure_jobs_table(conn)
+        _reap(conn)
+        rows = conn.execute(text(_SELECT + " ORDER BY id DESC LIMIT :n"), {"n": limit}).fetchall()
+    return [_with_rates(r) for r in rows]
+
+
+def request_cancel(engine, job_id):
+    """Marca el trabajo para cancelar; el proceso lo detecta en su próximo chequeo. True si estaba activo."""
+    with engine.begin() as conn:
+        res = conn.execute(text(f"UPDATE {T_TRABAJOS} SET cancelar = TRUE WHERE id = :id AND estado = ANY(:e)"),
+                           {"id": job_id, "e": list(ACTIVOS)})
+    return res.rowcount > 0
+
+
+# ==============================================================================
+# LADO PROCESO: ejecución del trabajo
+# ==============================================================================
+class _Monitor(threading.Thread):
+    """Publica el avance cada INTERVALO_MONITOR s y activa `stop` si se pidió cancelar."""
+
+    def __init__(self, engine, job_id, stop):
+        super().__init__(daemon=True)
+        self.engine, self.job_id, self.stop = engine, job_id, stop
+        self.procesadas = 0
+        self.cancelado = False
+        self._fin = threading.Event()
+
+    def run(self):
+        while not self._fin.wait(INTERVALO_MONITOR):
+            self.flush()
+
+    def flush(self):
+        try:
+            with self.engine.begin() as conn:
+                cancelar = conn.execute(text(f"""
+                    UPDATE {T_TRABAJOS} SET procesadas = :n, actualizado_en = now()
+                    WHERE id = :id RETURNING cancelar
+                """), {"n": self.procesadas, "id": self.job_id}).scalar()
+            if cancelar and not self.stop.is_set():
+                self.cancelado = True
+                self.stop.set()
+        except Exception as e:
+            print(f"⚠️ Trabajo {self.job_id}: no se pudo publicar el avance: {e}")
+
+    def close(self):
+        self._fin.set()
+        self.join()
+        self.flush()
+
+
+def _set(engine, job_id, now=(), **cols):
+    """UPDATE del trabajo; las columnas en `now` toman la hora del servidor de base de datos."""
+    sets = ", ".join([f"{k} = :{k}" for k in cols] + [f"{k} = now()" for k in now])
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {T_TRABAJOS} SET {sets}, actualizado_en = now() WHERE id = :id"),
+                     {**cols, "id": job_id})
+
+
+def _run_classification(engine, job_id, params, monitor):
+    with engine.connect() as conn:
+        total = count_pending(conn)
+    _set(engine, job_id, total=total)
+    if total == 0:
+        return {"mensaje": "Nada pendiente de clasificar"}
+
+    def progress(stats):
+        monitor.procesadas = stats["escritas"]
+
+    pipeline = ClassificationPipeline(engine, MODEL_DIR,
+                                      chunk_size=int(params.get("chunk_size", 50000)),
+                                      workers=int(params.get("workers", 0)),
+                                      progress_cb=progress, stop_event=monitor.stop, run_id=f"job{job_id}")
+    stats = pipeline.run(QUERY_PENDIENTES)
+    monitor.procesadas = stats["escritas"]
+    # Con una etapa caída (lector / predictor / escritor) la corrida quedó a medias: no se unifica
+    if not monitor.cancelado and not stats["errores"] and params.get("unificar", True):
+        with engine.begin() as conn:
+            n_prov, n_cambio, n_filas = unify_pending_providers(conn)
+        stats["unificacion"] = {"proveedores": n_prov, "moda_cambiada": n_cambio, "filas": n_filas}
+    return stats
+
+
+def _run_retrain(engine, job_id, params, monitor):
+    if params.get("modo", "incremental") == "incremental":
+        try:
+            return run_incremental_update(engine, MODEL_DIR, epochs=int(params.get("epochs", 5)))
+        except IncrementalNotSupported as e:
+            # Backend sin partial_fit (ej. random_forest): se reentrena desde cero
+            return {"modo": "completo", "motivo": str(e), **_run_full_retrain(params, monitor)}
+    return _run_full_retrain(params, monitor)
+
+
+def _run_full_retrain(params, monitor):
+    # Reentrenamiento completo: el mismo script de la terminal, en un subproceso cancelable
+    cmd = [sys.executable, TRAIN_SCRIPT, "--fuente", params.get("fuente", "ambas")]
+    if params.get("backend"):
+        cmd += ["--backend", params["backend"]]
+    log = deque(maxlen=30)
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    lector = threading.Thread(target=lambda: log.extend(proc.stdout), daemon=True)
+    lector.start()
+    while proc.poll() is None:
+        if monitor.stop.wait(1.0):
+            proc.terminate()
+            proc.wait()
+            break
+    lector.join(timeout=5)
+    if proc.returncode and not monitor.cancelado:
+        raise RuntimeError(f"train_model.py terminó con código {proc.returncode}: {''.join(log)[-1000:]}")
+    return {"codigo_salida": proc.returncode, "log": [l.rstrip() for l in log]}
+
+
+def run_job(job_id, db_url):
+    """Punto de entrada del proceso del trabajo."""
+    engine = create_engine(db_url, pool_pre_ping=True)
+    stop = threading.Event()
+    monitor = _Monitor(engine, job_id, stop)
+    try:
+        with engine.connect() as conn:
+            tipo, params, cancelar = conn.execute(text(f"""
+                SELECT tipo, parametros, cancelar FROM {T_TRABAJOS} WHERE id = :id
+            """), {"id": job_id}).fetchone()
+        if cancelar:
+            _set(engine, job_id, estado="cancelado", now=("iniciado_en", "terminado_en"))
+            return
+        _set(engine, job_id, estado="en_curso", now=("iniciado_en",))
+        monitor.start()
+        runner = _run_classification if tipo == "clasificacion" else _run_retrain
+        resultado = runner(engine, job_id, params or {}, monitor)
+        monitor.close()
+        # El pipeline no lanza excepción si falla una etapa: la reporta en stats["errores"]
+        errores = resultado.get("errores") if isinstance(resultado, dict) else None
+        if monitor.cancelado:
+            estado = "cancelado"
+        else:
+            estado = "error" if errores else "completado"
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE {T_TRABAJOS} SET estado = :e, resultado = CAST(:r AS JSONB), error = :err,
+                       terminado_en = now(), actualizado_en = now()
+                WHERE id = :id
+            """), {"e": estado, "r": json.dumps(resultado, default=str),
+                   "err": "; ".join(map(str, errores))[:2000] if errores else None, "id": job_id})
+    except Exception as e:
+        if monitor.is_alive():
+            monitor.close()
+        _set(engine, job_id, estado="error", error=str(e)[:2000], now=("terminado_en",))
+        raise
+    finally:
+        engine.dispose()
@@ -0,0 +1,81 @@
+# backend/services/model_backends.py
+# Backends de modelo intercambiables para el clasificador de gastos.
+# Todos son Pipelines de sklearn con predict / predict_proba / classes_, por lo que
+# la API y el batch los usan sin cambios.
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+
+DEFAULT_BACKEND = "random_forest"
+
+
+def _tfidf(max_features=6000):
+    return TfidfVectorizer(max_features=max_features, stop_words='english', ngram_range=(1, 2))
+
+
+def _hashing(n_features=2 ** 18):
+    # alternate_sign=False para que TF-IDF y las probabilidades sean consistentes
+    return HashingVectorizer(n_features=n_features, stop_words='english', ngram_range=(1, 2), alternate_sign=False)
+
+
+# Cada backend = (fábrica de vectorizador, fábrica de clasificador); el vectorizador
+# puede compartirse entre niveles (ver hierarchical.py).
+def _hashing_tfidf():
+    # Sin vocabulario que ajustar: admite partial_fit con textos nunca vistos
+    return Pipeline([('hash', _hashing()), ('tfidf', TfidfTransformer())])
+
+
+BACKENDS = {
+    # Configuración histórica (150 árboles, 6000 features)
+    "random_forest": (_tfidf, lambda: RandomForestClassifier(n_estimators=150, n_jobs=-1, random_state=42)),
+    "sgd_tfidf": (lambda: _tfidf(max_features=50000),
+                  lambda: SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=50, tol=1e-4, random_state=42)),
+    "logreg_tfidf": (lambda: _tfidf(max_features=50000), lambda: LogisticRegression(C=10.0, max_iter=1000)),
+    "sgd_hashing": (_hashing_tfidf,
+                    lambda: SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=50, tol=1e-4, random_state=42)),
+}
+
+
+# Espacio de búsqueda de hiperparámetros por backend (ver ml/search_hyperparams.py).
+# Claves con prefijo vec__ (vectorizador) o clf__ (clasificador).
+PARAM_GRID = {
+    "random_forest": {"vec__max_features": [3000, 6000, 20000], "clf__n_estimators": [50, 150, 300]},
+    "sgd_tfidf": {"vec__max_features": [20000, 50000], "clf__alpha": [1e-6, 1e-5, 1e-4]},
+    "logreg_tfidf": {"vec__max_features": [20000, 50000], "clf__C": [1.0, 10.0, 30.0]},
+    "sgd_hashing": {"vec__hash__n_features": [2 ** 16, 2 ** 18], "clf__alpha": [1e-6, 1e-5, 1e-4]},
+}
+
+
+def _check(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend}. Opciones: {', '.join(BACKENDS)}")
+
+
+def split_params(params):
+    """Separa {'vec__x': .., 'clf__y': ..} en (params del vectorizador, params del clasificador)."""
+    vec, clf = {}, {}
+    for k, v in (params or {}).items():
+        prefijo, _, nombre = k.partition("__")
+        if prefijo == "vec":
+            vec[nombre] = v
+        elif prefijo == "clf":
+            clf[nombre] = v
+        else:
+            raise ValueError(f"Parámetro sin prefijo vec__/clf__: {k}")
+    return vec, clf
+
+
+def build_vectorizer(backend=DEFAULT_BACKEND, params=None):
+    _check(backend)
+    return BACKENDS[backend][0]().set_params(**split_params(params)[0])
+
+
+def build_classifier(backend=DEFAULT_BACKEND, params=None):
+    _check(backend)
+    return BACKENDS[backend][1]().set_params(**split_params(params)[1])
+
+
+def build_pipeline(backend=DEFAULT_BACKEND, params=None):
+    """Pipeline completo texto -> etiqueta (formato de modelos independientes)."""
+    return Pipeline([('vec', build_vectorizer(backend, params)), ('clf', build_classifier(backend, params))])
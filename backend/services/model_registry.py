@@ -0,0 +1,234 @@
+# backend/services/model_registry.py
+# Registro de modelos versionados:
+#   ml_models/registry/<version>/   artefactos (jerárquico o par de pipelines) + metadata.json
+#   ml_models/registry/ACTIVE       versión activa (se reemplaza atómicamente)
+# La versión es la huella de los artefactos, igual que en el formato plano histórico,
+# así la caché de predicciones sigue invalidándose sola al cambiar de modelo.
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+
+import joblib
+
+from backend.services.classification import (
+    ACTIVE_FILE, HIERARCHICAL_FILE, MODEL_DIR, MODEL_FILES, REGISTRY_SUBDIR, PairedModel,
+    compute_model_version, load_models, model_files, resolve_model_dir
+)
+from backend.services.text_normalization import NORMALIZATION_VERSION
+
+METADATA_FILE = "metadata.json"
+
+
+def registry_dir(model_dir=MODEL_DIR):
+    return os.path.join(model_dir, REGISTRY_SUBDIR)
+
+
+def label_set(model):
+    """Etiquetas que el modelo sabe predecir: grupos y subgrupos (por grupo si es jerárquico)."""
+    grupos = [str(c) for c in model.classes_]
+    if isinstance(model, PairedModel):
+        return {"grupos": grupos, "subgrupos": [str(c) for c in model.model_subgrupo.classes_]}
+    return {"grupos": grupos, "subgrupos": model.children}
+
+
+def _dump_artifacts(model, dest):
+    if isinstance(model, PairedModel):
+        joblib.dump(model.model_grupo, os.path.join(dest, MODEL_FILES[0]))
+        joblib.dump(model.model_subgrupo, os.path.join(dest, MODEL_FILES[1]))
+    else:
+        joblib.dump(model, os.path.join(dest, HIERARCHICAL_FILE))
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+
+def active_version(model_dir=MODEL_DIR):
+    return resolve_model_dir(model_dir)[1]
+
+
+def version_dir(version, model_dir=MODEL_DIR):
+    """Directorio de una versión registrada (ValueError si no existe o el nombre no es válido)."""
+    path = os.path.join(registry_dir(model_dir), str(version))
+    if os.path.basename(str(version)) != version or version.startswith(".") \
+            or not os.path.exists(os.path.join(path, METADATA_FILE)):
+        raise ValueError(f"Versión no registrada: {version}")
+    return path
+
+
+def activate_version(version, model_dir=MODEL_DIR):
+    """Apunta ACTIVE a `version` (os.replace: los lectores ven la versión anterior o la nueva)."""
+    version_dir(version, model_dir)
+    path = os.path.join(registry_dir(model_dir), ACTIVE_FILE)
+    with open(path + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(path + ".tmp", path)
+
+
+def import_legacy(model_dir=MODEL_DIR):
+    """Registra los pickles del formato plano (si existen) para poder volver a ellos."""
+    if active_version(model_dir) is not None:
+        return None
+    if not all(os.path.exists(os.path.join(model_dir, n)) for n in model_files(model_dir)):
+        return None
+    try:
+        model, _ = load_models(model_dir)
+    except Exception as e:
+        print(f"⚠️ No se pudo importar el modelo en formato plano: {e}")
+        return None
+    return register_model(model, {"origen": "formato_plano"}, model_dir, activate=False)
+
+
+def register_model(model, metadata, model_dir=MODEL_DIR, activate=True):
+    """
+    Guarda el modelo como nueva versión (escritura en temporal + rename) y opcionalmente la
+    activa. `metadata` debería incluir hash de datos, métricas y origen; el set de etiquetas
+    se agrega aquí. Devuelve la versión.
+    """
+    reg = registry_dir(model_dir)
+    os.makedirs(reg, exist_ok=True)
+    if activate and not list_versions(model_dir):
+        import_legacy(model_dir)
+
+    tmp = os.path.join(reg, f".tmp-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(tmp)
+    try:
+        _dump_artifacts(model, tmp)
+        version = compute_model_version(tmp)
+        dest = os.path.join(reg, version)
+        _write_json(os.path.join(tmp, METADATA_FILE), {
+            **metadata,
+            "version": version,
+            "formato": "independiente" if isinstance(model, PairedModel) else "jerarquico",
+            "etiquetas": label_set(model),
+            "creado_en": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        if os.path.exists(dest):
+            # Mismo contenido ya registrado (la versión es la huella de los artefactos)
+            shutil.rmtree(tmp)
+        else:
+            os.rename(tmp, dest)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if activate:
+        activate_version(version, model_dir)
+    return version
+
+
+def get_metadata(version, model_dir=MODEL_DIR):
+    with open(os.path.join(version_dir(version, model_dir), METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def load_metadata(version, model_dir=MODEL_DIR):
+    """Metadatos de la versión; los modelos del formato plano no tienen registro."""
+    try:
+        return get_metadata(version, model_dir)
+    except ValueError:
+        return {"version": version, "origen": "formato_plano"}
+
+
+class NormalizationMismatch(ValueError):
+    """El modelo se entrenó con otra versión de la normalización del texto."""
+
+
+def check_normalization(metadata):
+    """
+    El texto de entrada se normaliza con NORMALIZATION_VERSION: un modelo entrenado con otra
+    versión recibiría texto distinto al de su entrenamiento (ValueError). Si no la registra
+    (formato plano o anterior a la normalización) solo se avisa: conviene reentrenar.
+    """
+    usada = metadata.get("normalizacion")
+    if usada is None:
+        print(f"⚠️ Modelo {metadata.get('version')} sin versión de normalización registrada (entrenado con "
+              f"texto sin normalizar): reentrenar con ml/train_model.py")
+    elif int(usada) != NORMALIZATION_VERSION:
+        raise NormalizationMismatch(f"El modelo {metadata.get('version')} usa la normalización v{usada} y la actual es "
+                         f"v{NORMALIZATION_VERSION}: reentrenar con ml/train_model.py")
+
+
+def list_versions(model_dir=MODEL_DIR):
+    """Metadatos de todas las versiones, de la más reciente a la más antigua."""
+    reg = registry_dir(model_dir)
+    if not os.path.isdir(reg):
+        return []
+    activa = active_version(model_dir)
+    out = []
+    for name in os.listdir(reg):
+        if os.path.exists(os.path.join(reg, name, METADATA_FILE)):
+            meta = get_metadata(name, model_dir)
+            meta["activa"] = name == activa
+            out.append(meta)
+    return sorted(out, key=lambda m: m.get("creado_en", ""), reverse=True)
+
+
+# ==============================================================================
+# MODELO ACTIVO EN PROCESO (API)
+# ==============================================================================
+LoadedModel = namedtuple("LoadedModel", ["model", "version", "metadata", "marker"])
+
+
+class ActiveModel:
+    """
+    Modelo activo con carga perezosa (primer uso) y recarga en caliente.
+    Cada get() compara el puntero ACTIVE en disco; si cambió (admin, reentrenamiento u otro
+    worker de uvicorn) se carga la nueva versión mientras las peticiones siguen usando la
+    anterior, y luego se reemplaza la referencia. Las peticiones en curso conservan su modelo.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode="r"):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _marker(self):
+        try:
+            return os.stat(os.path.join(registry_dir(self.model_dir), ACTIVE_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, marker):
+        model, version = load_models(self.model_dir, mmap_mode=self.mmap_mode)
+        metadata = load_metadata(version, self.model_dir)
+        check_normalization(metadata)
+        return LoadedModel(model, version, metadata, marker)
+
+    def get(self):
+        """Devuelve LoadedModel; lanza la excepción de carga si no hay ningún modelo disponible."""
+        state, marker = self._state, self._marker()
+        if state is not None and state.marker == marker:
+            return state
+        # Sin modelo cargado se espera la carga; con uno vigente, solo un hilo recarga
+        if not self._lock.acquire(blocking=state is None):
+            return state
+        try:
+            if self._state is None or self._state.marker != marker:
+                try:
+                    self._state = self._load(marker)
+                except Exception as e:
+                    if self._state is None:
+                        raise
+                    print(f"⚠️ No se pudo recargar el modelo, se mantiene {self._state.version}: {e}")
+                    # No reintentar en cada petición hasta que el puntero vuelva a cambiar
+                    self._state = self._state._replace(marker=marker)
+            return self._state
+        finally:
+            self._lock.release()
+
+    def activate(self, version):
+        """Activa una versión registrada: se carga completa ANTES de publicar el puntero."""
+        metadata = get_metadata(version, self.model_dir)
+        check_normalization(metadata)
+        model, _ = load_models(version_dir(version, self.model_dir), mmap_mode=self.mmap_mode)
+        with self._lock:
+            activate_version(version, self.model_dir)
+            self._state = LoadedModel(model, version, metadata, self._marker())
+        return self._state
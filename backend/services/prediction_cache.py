@@ -0,0 +1,144 @@
+# backend/services/prediction_cache.py
+# Caché de predicciones en dos niveles: LRU en memoria + tabla persistente en Postgres.
+# La clave es un hash del texto normalizado + versión del modelo, así un reentrenamiento
+# invalida automáticamente las entradas antiguas.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from sqlalchemy import text
+
+SCHEMA = "control_gestion"
+TABLA_CACHE = "cache_predicciones"
+LABEL_COLS = ["grupo", "subgrupo", "confianza"]
+# Tras un fallo del nivel Postgres se vuelve a intentar pasado este tiempo (no se apaga para siempre)
+REINTENTO_DB_SEG = 60
+
+
+def ensure_cache_table(conn):
+    """Crea la tabla de caché si no existe (idempotente)."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.{TABLA_CACHE} (
+            clave TEXT PRIMARY KEY,
+            version_modelo TEXT NOT NULL,
+            grupo TEXT,
+            subgrupo TEXT,
+            confianza REAL,
+            creado_en TIMESTAMP DEFAULT now()
+        )
+    """))
+
+
+class PredictionCache:
+    def __init__(self, model_version, max_items=200_000):
+        self.model_version = model_version
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # La tabla la crea el arranque (API) o ensure_structure (scripts); si falla se suspende el nivel
+        # durante REINTENTO_DB_SEG y luego se reintenta
+        self._db_reintento = 0.0
+        self.stats = {"memoria": 0, "postgres": 0, "modelo": 0}
+
+    def make_key(self, texto):
+        return hashlib.sha1(f"{self.model_version}|{texto}".encode("utf-8")).hexdigest()
+
+    def _count(self, nivel, n):
+        with self._lock:
+            self.stats[nivel] += n
+
+    # --- Nivel 1: memoria ---
+    def _get_memory(self, keys):
+        found = {}
+        with self._lock:
+            for k in keys:
+                val = self._lru.get(k)
+                if val is not None:
+                    self._lru.move_to_end(k)
+                    found[k] = val
+        return found
+
+    def _put_memory(self, entries):
+        with self._lock:
+            for k, val in entries.items():
+                self._lru[k] = val
+                self._lru.move_to_end(k)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    # --- Nivel 2: Postgres ---
+    # Cada sentencia va en un SAVEPOINT (begin_nested): si falla, solo se deshace el savepoint y la
+    # transacción del llamador (lote del pipeline / petición de la API) sigue siendo utilizable.
+    def _db_disponible(self, conn):
+        return conn is not None and time.monotonic() >= self._db_reintento
+
+    def _db_fallo(self):
+        self._db_reintento = time.monotonic() + REINTENTO_DB_SEG
+
+    def _get_db(self, conn, keys):
+        if not keys or not self._db_disponible(conn):
+            return {}
+        try:
+            with conn.begin_nested():
+                rows = conn.execute(text(f"""
+                    SELECT clave, grupo, subgrupo, confianza FROM {SCHEMA}.{TABLA_CACHE}
+                    WHERE clave = ANY(:claves)
+                """), {"claves": list(keys)}).fetchall()
+            return {r[0]: (r[1], r[2], r[3]) for r in rows}
+        except Exception as e:
+            print(f"⚠️ Caché Postgres no disponible (reintento en {REINTENTO_DB_SEG}s): {e}")
+            self._db_fallo()
+            return {}
+
+    def _put_db(self, conn, entries):
+        if not entries or not self._db_disponible(conn):
+            return
+        try:
+            keys = list(entries)
+            with conn.begin_nested():
+                conn.execute(text(f"""
+                    INSERT INTO {SCHEMA}.{TABLA_CACHE} (clave, version_modelo, grupo, subgrupo, confianza)
+                    SELECT k, :version, g, s, c
+                    FROM unnest(CAST(:claves AS TEXT[]), CAST(:grupos AS TEXT[]),
+                                CAST(:subgrupos AS TEXT[]), CAST(:confianzas AS REAL[])) AS u(k, g, s, c)
+                    ON CONFLICT (clave) DO NOTHING
+                """), {
+                    "version": self.model_version,
+                    "claves": keys,
+                    "grupos": [entries[k][0] for k in keys],
+                    "subgrupos": [entries[k][1] for k in keys],
+                    "confianzas": [float(entries[k][2]) for k in keys],
+                })
+        except Exception as e:
+            print(f"⚠️ No se pudo persistir la caché (reintento en {REINTENTO_DB_SEG}s): {e}")
+            self._db_fallo()
+
+    def classify(self, texts, predict_fn, conn=None):
+        """
+        Devuelve un DataFrame (grupo, subgrupo, confianza) alineado con `texts`.
+        Solo las filas sin entrada en caché se envían a `predict_fn(texts) -> DataFrame`.
+        """
+        keys = texts.map(self.make_key)
+        unique_keys = set(keys)
+
+        found = self._get_memory(unique_keys)
+        pending = unique_keys - found.keys()
+        from_db = self._get_db(conn, pending)
+        self._count("memoria", len(found))
+        self._count("postgres", len(from_db))
+        found.update(from_db)
+        self._put_memory(from_db)
+
+        miss_mask = ~keys.isin(found.keys()) & ~keys.duplicated()
+        if miss_mask.any():
+            preds = predict_fn(texts[miss_mask])
+            new_entries = dict(zip(keys[miss_mask], preds[LABEL_COLS].itertuples(index=False, name=None)))
+            # Claves únicas, igual que los aciertos de memoria/postgres (ratios comparables)
+            self._count("modelo", len(new_entries))
+            self._put_memory(new_entries)
+            self._put_db(conn, new_entries)
+            found.update(new_entries)
+
+        return pd.DataFrame([found[k] for k in keys], columns=LABEL_COLS, index=texts.index)
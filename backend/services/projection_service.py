@@ -0,0 +1,131 @@
+# backend/services/projection_service.py
+# Proyección financiera del lado servidor, alimentada por los parámetros que se guardan en el
+# Gestor de Datos (control_gestion.parametros_financieros):
+#   1. Una sola consulta trae FIU, deuda y tipos de cambio de la fecha de corte / país.
+#   2. La versión de parámetros es la huella de esas filas: si alguien edita un valor, cambia.
+#   3. El motor (frontend/utils/financial_logic.py, sin dependencias de Streamlit) corre en un
+#      pool de procesos, así el cálculo no bloquea los hilos de la API.
+#   4. Resultados en caché LRU por (fecha de corte, versión de parámetros, drivers, fecha de inicio
+#      de la proyección) y en formato columnar.
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sqlalchemy import text
+
+from frontend.utils.financial_logic import run_financial_model
+from frontend.utils.portfolio_data import COUNTRIES, DEFAULT_DRIVERS, debt_terms
+from frontend.utils.projection_cache import LRUCache
+
+SCHEMA = "control_gestion"
+T_PARAMS = f"{SCHEMA}.parametros_financieros"
+PAISES = ["Regional"] + COUNTRIES
+PROJECTION_WORKERS = int(os.getenv("PROJECTION_WORKERS", "2"))
+PROJECTION_TIMEOUT = 60
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = LRUCache(maxsize=128)
+
+
+def load_parameters(conn, fecha_corte, pais="Regional"):
+    """FIU y deuda del país (todos los países si es Regional) y tipos de cambio, en una consulta."""
+    paises = COUNTRIES if pais == "Regional" else [pais]
+    rows = conn.execute(text(f"""
+        SELECT pais, categoria, concepto, valor FROM {T_PARAMS}
+        WHERE fecha_corte = :fecha AND (pais = ANY(:paises) OR categoria = 'Macro')
+        ORDER BY pais, categoria, concepto
+    """), {"fecha": fecha_corte, "paises": paises}).fetchall()
+    return pd.DataFrame(rows, columns=["pais", "categoria", "concepto", "valor"])
+
+
+def parameters_version(df_params):
+    """Huella de las filas de parámetros (cambia si se edita cualquier valor)."""
+    data = df_params.astype({"valor": float}).to_dict(orient="split")["data"]
+    return hashlib.sha256(json.dumps(data, default=str).encode()).hexdigest()[:16]
+
+
+def build_inputs(df_params):
+    """FIU inicial, tabla de deuda (con tasa y plazo de referencia) y tipos de cambio."""
+    fiu = df_params[df_params["categoria"] == "FIU"].groupby("concepto")["valor"].sum()
+    deuda = df_params[(df_params["categoria"] == "Deuda") & (df_params["valor"] > 0)]
+    terminos = [debt_terms(p, t) for p, t in zip(deuda["pais"], deuda["concepto"])]
+    df_debt = pd.DataFrame({
+        "Country": deuda["pais"].to_numpy(),
+        "Type": deuda["concepto"].to_numpy(),
+        "USD Balance Equiv": deuda["valor"].astype(float).to_numpy(),
+        "Weighted average annual rate": [t[0] for t in terminos],
+        "Plazo": [t[1] for t in terminos],
+    })
+    macro = df_params[df_params["categoria"] == "Macro"]
+    return {
+        "fiu_perf": float(fiu.get("FIU Performing", 0.0)),
+        "fiu_npa": float(fiu.get("FIU NPA", 0.0)),
+        "deuda": df_debt,
+        "tipos_cambio": dict(zip(macro["concepto"], macro["valor"].astype(float))),
+    }
+
+
+def _columnar(df):
+    return {"periodo": df.index.strftime("%Y-%m-%d").tolist(),
+            **{c: df[c].round(6).tolist() for c in df.columns}}
+
+
+def _run(params):
+    """Corre en el pool: proyección y conversión a columnas (lo que viaja de vuelta es liviano)."""
+    df_m, df_a = run_financial_model(**params)
+    return {"mensual": _columnar(df_m), "anual": _columnar(df_a)}
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' por consistencia con el resto del backend (no hereda conexiones ni hilos)
+            _pool = ProcessPoolExecutor(max_workers=PROJECTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def run_projection(conn, fecha_corte, pais="Regional", plazo_anos=5, drivers=None):
+    """
+    Proyección de un país (o Regional) con los parámetros guardados a la fecha de corte.
+    `drivers` sobreescribe los supuestos operativos por defecto. ValueError si no hay datos.
+    """
+    if pais not in PAISES:
+        raise ValueError(f"País desconocido: {pais}. Opciones: {', '.join(PAISES)}")
+    df_params = load_parameters(conn, fecha_corte, pais)
+    if df_params[df_params["categoria"] == "FIU"].empty:
+        raise ValueError(f"No hay parámetros de FIU para {pais} al {fecha_corte}")
+
+    version = parameters_version(df_params)
+    drivers = {**DEFAULT_DRIVERS, **(drivers or {})}
+    # Los periodos de la proyección parten de hoy (monthly_index): un resultado de ayer no sirve
+    inicio = str(pd.Timestamp.now().date())
+    key = json.dumps([str(fecha_corte), version, pais, plazo_anos, drivers, inicio], sort_keys=True)
+    hits = _cache.hits
+
+    def compute():
+        inputs = build_inputs(df_params)
+        params = dict(plazo_anos=plazo_anos, fiu_perf_start=inputs["fiu_perf"], fiu_npa_start=inputs["fiu_npa"],
+                      df_current_debt=inputs["deuda"], **drivers)
+        resultado = get_pool().submit(_run, params).result(timeout=PROJECTION_TIMEOUT)
+        return {
+            "fecha_corte": fecha_corte,
+            "pais": pais,
+            "version_parametros": version,
+            "insumos": {
+                "fiu_performing": inputs["fiu_perf"],
+                "fiu_npa": inputs["fiu_npa"],
+                "deuda": inputs["deuda"].to_dict(orient="list"),
+                "tipos_cambio": inputs["tipos_cambio"],
+                "drivers": drivers,
+            },
+            **resultado,
+        }
+
+    res = _cache.get_or_compute(key, compute)
+    return {**res, "desde_cache": _cache.hits > hits}
@@ -0,0 +1,242 @@
+# backend/services/provider_consistency.py
+# Unificación incremental de categorías por proveedor.
+#
+# En vez de recalcular MODE() sobre todo el libro en cada corrida, se mantiene:
+#   - proveedor_clasificacion: conteo de filas por (proveedor, grupo, subgrupo)
+#   - proveedor_moda:          última moda aplicada por proveedor
+#   - proveedor_delta:         log append-only de variaciones de conteo (lo escriben los triggers)
+#   - proveedor_pendiente:     proveedores a revisar además de los del log (p. ej. tras reconstruir)
+# Los triggers por sentencia (tablas de transición) solo AGREGAN filas al log: los escritores
+# concurrentes (workers, /update-batch, ETL) no comparten filas de conteo ni se bloquean entre sí.
+# La unificación consume el log, lo suma a los conteos y revisa los proveedores que aparecen en él.
+from sqlalchemy import text
+
+SCHEMA = "control_gestion"
+TABLA = "libros_diarios_consolidados"
+T_CONTEOS = f"{SCHEMA}.proveedor_clasificacion"
+T_MODA = f"{SCHEMA}.proveedor_moda"
+T_PENDIENTE = f"{SCHEMA}.proveedor_pendiente"
+T_DELTAS = f"{SCHEMA}.proveedor_delta"
+
+# Mismo universo que la moda original: con grupo y con proveedor identificable
+_FILTRO_VALIDO = "grupo IS NOT NULL AND grupo <> '' AND nombre_tercero <> '' AND nombre_tercero <> 'SIN_ID'"
+
+_DELTA_TAIL = f"""
+        agg AS (
+            SELECT nombre_tercero, grupo, subgrupo, sum(delta) AS delta
+            FROM cambios
+            WHERE {_FILTRO_VALIDO}
+            GROUP BY nombre_tercero, grupo, subgrupo
+            HAVING sum(delta) <> 0
+        )
+        INSERT INTO {T_DELTAS} (nombre_tercero, grupo, subgrupo, delta)
+        SELECT nombre_tercero, grupo, subgrupo, delta FROM agg;
+"""
+
+_TRIGGER_FN = f"""
+CREATE OR REPLACE FUNCTION {SCHEMA}.fn_proveedor_clasificacion() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        WITH cambios AS (
+            SELECT nombre_tercero, grupo, COALESCE(subgrupo, '') AS subgrupo, 1 AS delta FROM new_rows
+        ),
+        {_DELTA_TAIL}
+    ELSIF TG_OP = 'DELETE' THEN
+        WITH cambios AS (
+            SELECT nombre_tercero, grupo, COALESCE(subgrupo, '') AS subgrupo, -1 AS delta FROM old_rows
+        ),
+        {_DELTA_TAIL}
+    ELSE
+        WITH modificadas AS (
+            SELECT o.nombre_tercero AS o_prov, o.grupo AS o_grupo, o.subgrupo AS o_sub,
+                   n.nombre_tercero AS n_prov, n.grupo AS n_grupo, n.subgrupo AS n_sub
+            FROM old_rows o JOIN new_rows n USING (id_transaccion)
+            WHERE (o.nombre_tercero, o.grupo, o.subgrupo) IS DISTINCT FROM (n.nombre_tercero, n.grupo, n.subgrupo)
+        ),
+        cambios AS (
+            SELECT o_prov AS nombre_tercero, o_grupo AS grupo, COALESCE(o_sub, '') AS subgrupo, -1 AS delta FROM modificadas
+            UNION ALL
+            SELECT n_prov, n_grupo, COALESCE(n_sub, ''), 1 FROM modificadas
+        ),
+        {_DELTA_TAIL}
+    END IF;
+    RETURN NULL;
+END;
+$fn$
+"""
+
+_TRIGGERS = {
+    "trg_proveedor_clasif_ins": "AFTER INSERT ON {tabla} REFERENCING NEW TABLE AS new_rows",
+    "trg_proveedor_clasif_upd": "AFTER UPDATE ON {tabla} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "trg_proveedor_clasif_del": "AFTER DELETE ON {tabla} REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def ensure_provider_stats(conn):
+    """
+    Crea tablas, índice y triggers (idempotente). Si los triggers no existían
+    (primera vez, o el ETL recreó la tabla) reconstruye los conteos desde cero y
+    marca todos los proveedores como pendientes. Devuelve True si hubo reconstrucción.
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_CONTEOS} (
+            nombre_tercero TEXT NOT NULL,
+            grupo TEXT NOT NULL,
+            subgrupo TEXT NOT NULL DEFAULT '',
+            n BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (nombre_tercero, grupo, subgrupo)
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_MODA} (
+            nombre_tercero TEXT PRIMARY KEY,
+            grupo_comun TEXT,
+            subgrupo_comun TEXT,
+            actualizado_en TIMESTAMP DEFAULT now()
+        )
+    """))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {T_PENDIENTE} (nombre_tercero TEXT PRIMARY KEY)"))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_DELTAS} (
+            id BIGSERIAL PRIMARY KEY,
+            nombre_tercero TEXT NOT NULL,
+            grupo TEXT NOT NULL,
+            subgrupo TEXT NOT NULL DEFAULT '',
+            delta BIGINT NOT NULL,
+            xid BIGINT NOT NULL DEFAULT txid_current()
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_ldc_nombre_tercero ON {SCHEMA}.{TABLA} (nombre_tercero)"))
+    conn.execute(text(_TRIGGER_FN))
+
+    existentes = {r[0] for r in conn.execute(text("""
+        SELECT tgname FROM pg_trigger
+        WHERE tgrelid = CAST(:tabla AS regclass) AND NOT tgisinternal
+    """), {"tabla": f"{SCHEMA}.{TABLA}"}).fetchall()}
+    if set(_TRIGGERS) <= existentes:
+        return False
+
+    for nombre, definicion in _TRIGGERS.items():
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {nombre} ON {SCHEMA}.{TABLA}"))
+        conn.execute(text(f"""
+            CREATE TRIGGER {nombre} {definicion.format(tabla=f'{SCHEMA}.{TABLA}')}
+            FOR EACH STATEMENT EXECUTE FUNCTION {SCHEMA}.fn_proveedor_clasificacion()
+        """))
+
+    rebuild_provider_stats(conn)
+    return True
+
+
+def rebuild_provider_stats(conn):
+    """Reconstrucción completa (una sola vez): conteos desde el libro y todos los proveedores pendientes."""
+    conn.execute(text(f"TRUNCATE {T_CONTEOS}, {T_MODA}, {T_PENDIENTE}, {T_DELTAS}"))
+    conn.execute(text(f"""
+        INSERT INTO {T_CONTEOS} (nombre_tercero, grupo, subgrupo, n)
+        SELECT nombre_tercero, grupo, COALESCE(subgrupo, ''), count(*)
+        FROM {SCHEMA}.{TABLA}
+        WHERE {_FILTRO_VALIDO}
+        GROUP BY 1, 2, 3
+    """))
+    conn.execute(text(f"INSERT INTO {T_PENDIENTE} (nombre_tercero) SELECT DISTINCT nombre_tercero FROM {T_CONTEOS}"))
+
+
+def _fold_deltas(conn, filtro="TRUE"):
+    """
+    Consume el log de deltas (solo las filas visibles al iniciar la sentencia: lo que otros
+    escriban mientras tanto queda para la próxima corrida) y lo suma a los conteos, en orden de
+    clave para que dos unificaciones concurrentes no se bloqueen en orden opuesto.
+    Devuelve los proveedores que aparecían en el log consumido.
+    """
+    rows = conn.execute(text(f"""
+        WITH consumidos AS (
+            DELETE FROM {T_DELTAS} WHERE {filtro}
+            RETURNING nombre_tercero, grupo, subgrupo, delta
+        ),
+        agg AS (
+            SELECT nombre_tercero, grupo, subgrupo, sum(delta) AS delta
+            FROM consumidos
+            GROUP BY nombre_tercero, grupo, subgrupo
+            HAVING sum(delta) <> 0
+        ),
+        ins AS (
+            INSERT INTO {T_CONTEOS} AS pc (nombre_tercero, grupo, subgrupo, n)
+            SELECT nombre_tercero, grupo, subgrupo, delta FROM agg
+            ORDER BY nombre_tercero, grupo, subgrupo
+            ON CONFLICT (nombre_tercero, grupo, subgrupo) DO UPDATE SET n = pc.n + EXCLUDED.n
+        )
+        SELECT DISTINCT nombre_tercero FROM consumidos
+    """)).fetchall()
+    return [r[0] for r in rows]
+
+
+def unify_pending_providers(conn):
+    """
+    Recalcula la moda solo de los proveedores tocados desde la última corrida y
+    alinea sus filas no manuales. Devuelve (proveedores revisados, modas cambiadas, filas actualizadas).
+    """
+    # 1. Tomar el conjunto pendiente: proveedores del log de deltas (ya sumado a los conteos)
+    #    y los marcados explícitamente
+    dirty = set(_fold_deltas(conn))
+    dirty.update(r[0] for r in conn.execute(text(f"DELETE FROM {T_PENDIENTE} RETURNING nombre_tercero")).fetchall())
+    dirty = sorted(dirty)
+    if not dirty:
+        return 0, 0, 0
+
+    # 2. Modas nuevas desde los conteos (grupo y subgrupo por separado, como MODE())
+    nuevas = conn.execute(text(f"""
+        SELECT p.nombre_tercero,
+            (SELECT grupo FROM {T_CONTEOS} c
+             WHERE c.nombre_tercero = p.nombre_tercero AND c.n > 0
+             GROUP BY grupo ORDER BY sum(n) DESC, grupo LIMIT 1) AS grupo_comun,
+            (SELECT subgrupo FROM {T_CONTEOS} c
+             WHERE c.nombre_tercero = p.nombre_tercero AND c.n > 0 AND c.subgrupo <> ''
+             GROUP BY subgrupo ORDER BY sum(n) DESC, subgrupo LIMIT 1) AS subgrupo_comun
+        FROM unnest(CAST(:provs AS TEXT[])) AS p(nombre_tercero)
+    """), {"provs": dirty}).fetchall()
+    nuevas = {r[0]: (r[1], r[2]) for r in nuevas if r[1] is not None}
+
+    previas = conn.execute(text(f"""
+        SELECT nombre_tercero, grupo_comun, subgrupo_comun FROM {T_MODA}
+        WHERE nombre_tercero = ANY(:provs)
+    """), {"provs": dirty}).fetchall()
+    previas = {r[0]: (r[1], r[2]) for r in previas}
+    cambiadas = [p for p, moda in nuevas.items() if previas.get(p) != moda]
+
+    # 3. Alinear filas no manuales de los proveedores tocados
+    #    (si la moda no cambió, solo las filas nuevas pueden diferir de ella)
+    provs = list(nuevas)
+    res = conn.execute(text(f"""
+        UPDATE {SCHEMA}.{TABLA} t
+        SET grupo = m.grupo_comun,
+            subgrupo = m.subgrupo_comun
+        FROM unnest(CAST(:provs AS TEXT[]), CAST(:grupos AS TEXT[]), CAST(:subgrupos AS TEXT[]))
+             AS m(nombre_tercero, grupo_comun, subgrupo_comun)
+        WHERE t.nombre_tercero = m.nombre_tercero
+        AND (t.grupo <> m.grupo_comun OR t.subgrupo <> m.subgrupo_comun)
+        AND (t.clasificacion_manual IS FALSE OR t.clasificacion_manual IS NULL)
+    """), {
+        "provs": provs,
+        "grupos": [nuevas[p][0] for p in provs],
+        "subgrupos": [nuevas[p][1] for p in provs],
+    })
+
+    # 4. Registrar modas vigentes y sumar a los conteos los deltas del propio UPDATE (sin marcar
+    #    pendientes: sus filas ya quedaron en la moda). Los deltas de otros escritores no se tocan.
+    if cambiadas:
+        conn.execute(text(f"""
+            INSERT INTO {T_MODA} (nombre_tercero, grupo_comun, subgrupo_comun)
+            SELECT * FROM unnest(CAST(:provs AS TEXT[]), CAST(:grupos AS TEXT[]), CAST(:subgrupos AS TEXT[]))
+            ON CONFLICT (nombre_tercero) DO UPDATE SET
+                grupo_comun = EXCLUDED.grupo_comun,
+                subgrupo_comun = EXCLUDED.subgrupo_comun,
+                actualizado_en = now()
+        """), {
+            "provs": cambiadas,
+            "grupos": [nuevas[p][0] for p in cambiadas],
+            "subgrupos": [nuevas[p][1] for p in cambiadas],
+        })
+    _fold_deltas(conn, "xid = txid_current()")
+    conn.execute(text(f"DELETE FROM {T_CONTEOS} WHERE n <= 0 AND nombre_tercero = ANY(:provs)"), {"provs": dirty})
+
+    return len(dirty), len(cambiadas), res.rowcount
@@ -0,0 +1,185 @@
+# backend/services/rules.py
+# Capa de reglas previa al modelo (fast path):
+#   - Mapa hash por proveedor (id_proveedor / nombre_tercero) con clasificación manual estable.
+#   - Trie de prefijos de cuenta contable (gana el prefijo más largo): solo reglas curadas.
+#   - Mapa exacto por cuenta contable derivado de correcciones manuales (más soporte y pureza).
+# Se construye desde las filas con clasificacion_manual = TRUE y la tabla de reglas curadas
+# control_gestion.reglas_clasificacion (las curadas tienen prioridad sobre las derivadas).
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+SCHEMA = "control_gestion"
+TABLA = "libros_diarios_consolidados"
+TABLA_REGLAS = "reglas_clasificacion"
+
+MIN_SOPORTE = 3          # Filas manuales mínimas para derivar una regla de proveedor
+# Una cuenta agrupa muchos proveedores/conceptos: la regla derivada exige más soporte manual y que
+# la clasificación del modelo en esa cuenta coincida con la manual en al menos PUREZA_CUENTA
+MIN_SOPORTE_CUENTA = 20
+PUREZA_CUENTA = 0.95
+CONFIANZA_REGLA = 100.0
+PROVEEDORES_INVALIDOS = {"", "SIN_ID", "nan", "None"}
+
+
+def ensure_rules_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.{TABLA_REGLAS} (
+            id SERIAL PRIMARY KEY,
+            tipo TEXT NOT NULL CHECK (tipo IN ('id_proveedor', 'nombre_tercero', 'cuenta')),
+            patron TEXT NOT NULL,
+            grupo TEXT NOT NULL,
+            subgrupo TEXT,
+            activa BOOLEAN DEFAULT TRUE,
+            UNIQUE (tipo, patron)
+        )
+    """))
+
+
+class PrefixTrie:
+    """Trie de caracteres; lookup devuelve el valor del prefijo más largo que coincide."""
+    _FIN = "\0"
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, prefix, value):
+        node = self.root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        if self._FIN not in node:
+            self.size += 1
+        node[self._FIN] = value
+
+    def lookup(self, key):
+        node, best = self.root, None
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                break
+            if self._FIN in node:
+                best = node[self._FIN]
+        return best
+
+
+class RuleEngine:
+    def __init__(self):
+        self.por_id = {}
+        self.por_nombre = {}
+        self.cuentas = PrefixTrie()      # curadas, por prefijo
+        self.por_cuenta = {}             # derivadas, cuenta exacta
+
+    def __len__(self):
+        return len(self.por_id) + len(self.por_nombre) + self.cuentas.size + len(self.por_cuenta)
+
+    def lookup_cuenta(self, cuenta):
+        """Prefijo curado más largo; si no hay, regla derivada de la cuenta exacta."""
+        return self.cuentas.lookup(cuenta) or self.por_cuenta.get(cuenta)
+
+    @classmethod
+    def load(cls, conn, min_soporte=MIN_SOPORTE, min_soporte_cuenta=MIN_SOPORTE_CUENTA,
+             pureza_cuenta=PUREZA_CUENTA):
+        engine = cls()
+        # 1. Reglas derivadas de correcciones manuales (un único par grupo/subgrupo por clave)
+        for col, destino in (("id_proveedor", engine.por_id), ("nombre_tercero", engine.por_nombre)):
+            rows = conn.execute(text(f"""
+                SELECT {col}, min(grupo), min(subgrupo)
+                FROM {SCHEMA}.{TABLA}
+                WHERE clasificacion_manual IS TRUE AND grupo IS NOT NULL AND grupo <> ''
+                AND {col} IS NOT NULL
+                GROUP BY {col}
+                HAVING count(DISTINCT grupo || '|' || COALESCE(subgrupo, '')) = 1 AND count(*) >= :min
+            """), {"min": min_soporte}).fetchall()
+            destino.update({str(r[0]): (r[1], r[2]) for r in rows if str(r[0]) not in PROVEEDORES_INVALIDOS})
+
+        # Cuentas: coincidencia exacta (nunca por prefijo) y pureza frente a lo que el modelo asignó
+        # en la misma cuenta; se excluyen las filas que ya etiquetó una regla de cuenta (se validaría
+        # contra sí misma)
+        rows = conn.execute(text(f"""
+            WITH manual AS (
+                SELECT cuenta_contable AS cuenta, min(grupo) AS g, min(subgrupo) AS s
+                FROM {SCHEMA}.{TABLA}
+                WHERE clasificacion_manual IS TRUE AND grupo IS NOT NULL AND grupo <> ''
+                AND cuenta_contable IS NOT NULL AND cuenta_contable <> ''
+                GROUP BY cuenta_contable
+                HAVING count(DISTINCT grupo || '|' || COALESCE(subgrupo, '')) = 1 AND count(*) >= :min
+            )
+            SELECT m.cuenta, m.g, m.s
+            FROM manual m
+            LEFT JOIN {SCHEMA}.{TABLA} l
+              ON l.cuenta_contable = m.cuenta AND l.clasificacion_manual IS NOT TRUE
+             AND l.grupo IS NOT NULL AND l.grupo <> ''
+             AND COALESCE(l.fuente_clasificacion, '') <> 'regla_cuenta'
+            GROUP BY m.cuenta, m.g, m.s
+            HAVING count(l.grupo) = 0
+                OR count(*) FILTER (WHERE l.grupo = m.g AND COALESCE(l.subgrupo, '') = COALESCE(m.s, ''))
+                   >= :pureza * count(l.grupo)
+        """), {"min": min_soporte_cuenta, "pureza": pureza_cuenta}).fetchall()
+        engine.por_cuenta.update({str(cuenta): (g, s) for cuenta, g, s in rows})
+
+        # 2. Reglas curadas (sobrescriben a las derivadas)
+        ensure_rules_table(conn)
+        curadas = conn.execute(text(f"""
+            SELECT tipo, patron, grupo, subgrupo FROM {SCHEMA}.{TABLA_REGLAS} WHERE activa IS TRUE
+        """)).fetchall()
+        for tipo, patron, g, s in curadas:
+            if tipo == "cuenta":
+                engine.cuentas.insert(patron, (g, s))
+            elif tipo == "id_proveedor":
+                engine.por_id[patron] = (g, s)
+            else:
+                engine.por_nombre[patron] = (g, s)
+        return engine
+
+    def apply(self, df):
+        """
+        Devuelve DataFrame (grupo, subgrupo, confianza, fuente) alineado con `df`;
+        las filas sin regla quedan con fuente = NaN.
+        """
+        out = pd.DataFrame({"grupo": None, "subgrupo": None, "confianza": np.nan, "fuente": None},
+                           index=df.index, dtype=object)
+
+        # Orden de precedencia: id_proveedor > nombre_tercero > cuenta (prefijo curado > exacta derivada)
+        fuentes = []
+        if "id_proveedor" in df:
+            fuentes.append(("regla_proveedor", df["id_proveedor"].fillna("").astype(str).map(self.por_id)))
+        if "nombre_tercero" in df:
+            fuentes.append(("regla_proveedor", df["nombre_tercero"].fillna("").astype(str).map(self.por_nombre)))
+        if (self.cuentas.size or self.por_cuenta) and "cuenta_contable" in df:
+            cuentas = df["cuenta_contable"].fillna("").astype(str)
+            unicas = {c: self.lookup_cuenta(c) for c in cuentas.unique()}
+            fuentes.append(("regla_cuenta", cuentas.map(unicas)))
+
+        libre = pd.Series(True, index=df.index)
+        for fuente, match in fuentes:
+            hit = libre & match.notna()
+            if hit.any():
+                labels = match[hit]
+                out.loc[hit, "grupo"] = [v[0] for v in labels]
+                out.loc[hit, "subgrupo"] = [v[1] for v in labels]
+                out.loc[hit, "confianza"] = CONFIANZA_REGLA
+                out.loc[hit, "fuente"] = fuente
+                libre &= ~hit
+        return out
+
+
+# --- Instancia compartida para la API (se recompila cada `ttl` segundos) ---
+_shared = {"engine": None, "cargado": 0.0}
+_shared_lock = threading.Lock()
+
+
+def get_rule_engine(conn, ttl=600):
+    with _shared_lock:
+        if _shared["engine"] is None or time.time() - _shared["cargado"] > ttl:
+            try:
+                _shared["engine"] = RuleEngine.load(conn)
+            except Exception as e:
+                print(f"⚠️ No se pudieron cargar reglas: {e}")
+                conn.rollback()
+                _shared["engine"] = _shared["engine"] or RuleEngine()
+            _shared["cargado"] = time.time()
+        return _shared["engine"]
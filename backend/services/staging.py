@@ -0,0 +1,94 @@
+# backend/services/staging.py
+# Tabla de staging por ejecución para escrituras masivas de clasificación.
+# - UNLOGGED y con nombre único por corrida: se crea una sola vez (sin DDL por lote)
+#   y varias corridas simultáneas no chocan entre sí.
+# - COPY en formato binario (sin parseo de texto/CSV en el servidor).
+# - UPDATE con join sobre la clave primaria indexada.
+import io
+import struct
+import uuid
+
+from sqlalchemy import text
+
+SCHEMA = "control_gestion"
+TABLA = "libros_diarios_consolidados"
+
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+
+
+def to_pgcopy_binary(ids, *text_cols):
+    """Serializa filas (BIGINT, TEXT, ...) al formato binario de COPY de PostgreSQL."""
+    buf = io.BytesIO()
+    buf.write(_PGCOPY_HEADER)
+    pack_row = struct.Struct("!hiq").pack  # n_campos, largo del BIGINT, valor
+    pack_len = struct.Struct("!i").pack
+    null = pack_len(-1)
+    n_campos = 1 + len(text_cols)
+    for id_, *vals in zip(ids, *text_cols):
+        buf.write(pack_row(n_campos, 8, int(id_)))
+        for val in vals:
+            if val is None or val != val:  # None / NaN -> NULL
+                buf.write(null)
+            else:
+                raw = str(val).encode("utf-8")
+                buf.write(pack_len(len(raw)))
+                buf.write(raw)
+    buf.write(_PGCOPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+
+class StagingTable:
+    def __init__(self, engine, run_id=None):
+        self.engine = engine
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.name = f"stg_clasif_{self.run_id}"
+        self.qualified = f"{SCHEMA}.{self.name}"
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, *exc):
+        self.drop()
+
+    def create(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE UNLOGGED TABLE IF NOT EXISTS {self.qualified} (
+                    id_transaccion BIGINT PRIMARY KEY,
+                    grupo TEXT,
+                    subgrupo TEXT,
+                    fuente_clasificacion TEXT
+                )
+            """))
+
+    def drop(self):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {self.qualified}"))
+        except Exception as e:
+            print(f"⚠️ No se pudo eliminar {self.qualified}: {e}")
+
+    def apply(self, df_up):
+        """COPY binario del lote al staging, UPDATE de la tabla principal y vaciado del staging."""
+        payload = to_pgcopy_binary(df_up["id_transaccion"].values, df_up["grupo"].values,
+                                   df_up["subgrupo"].values, df_up["fuente_clasificacion"].values)
+        with self.engine.begin() as conn:
+            raw_conn = conn.connection
+            with raw_conn.cursor() as cursor:
+                cursor.copy_expert(f"COPY {self.qualified} (id_transaccion, grupo, subgrupo, fuente_clasificacion) FROM STDIN WITH (FORMAT binary)", payload)
+            res = conn.execute(text(f"""
+                UPDATE {SCHEMA}.{TABLA} AS m
+                SET grupo = t.grupo, subgrupo = t.subgrupo, fuente_clasificacion = t.fuente_clasificacion
+                FROM {self.qualified} t
+                WHERE m.id_transaccion = t.id_transaccion
+                -- Mismo filtro que FILTRO_PENDIENTES: una corrección manual guardada entre la
+                -- lectura y la escritura del lote no se pisa con la etiqueta del modelo
+                AND m.clasificacion_manual IS NOT TRUE
+                AND (m.grupo IS NULL OR m.grupo = '')
+            """))
+            # DELETE (no TRUNCATE): no reescribe el catálogo ni toma lock exclusivo
+            conn.execute(text(f"DELETE FROM {self.qualified}"))
+            return res.rowcount
@@ -0,0 +1,83 @@
+# backend/services/text_normalization.py
+# Normalización única del texto de entrada (entrenamiento, API y batch usan la misma):
+#   cuenta  -> solo dígitos ("5105.0" y "5105" son la misma cuenta)
+#   RUT/NIT -> canónico sin puntos, guion ni ceros a la izquierda ("76.123.456-k" -> "76123456k")
+#   glosa   -> sin tildes, minúsculas, fechas -> _fecha_, números -> _num_, sin puntuación,
+#              espacios colapsados
+# Todo con operaciones vectorizadas de pandas sobre los valores ÚNICOS de cada columna
+# (las glosas se repiten mucho), así el costo depende de la variedad, no del volumen.
+import re
+
+import numpy as np
+import pandas as pd
+
+# Cambiar al modificar las reglas: los modelos entrenados con otra versión deben reentrenarse
+NORMALIZATION_VERSION = 1
+
+_MESES = (r"enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre"
+          r"|ene|feb|mar|abr|may|jun|jul|ago|sep|set|oct|nov|dic")
+_FECHA_RE = re.compile(
+    r"\b\d{1,4}[/\-.]\d{1,2}[/\-.]\d{1,4}\b"            # 31/01/2025, 2025-01-31, 31.01.25
+    r"|\b\d{1,2}[/\-]\d{4}\b|\b\d{4}[/\-]\d{1,2}\b"     # 01/2025, 2025-01
+    rf"|\b(?:{_MESES})\b\.?[\s\-/]*(?:de\s+)?\d{{2,4}}\b"  # ene 2025, marzo de 2025, dic-24
+)
+_NUM_RE = re.compile(r"\b\d+(?:[.,]\d+)*\b")
+_PUNT_RE = re.compile(r"[^a-z0-9_ ]+")
+_ESPACIOS_RE = re.compile(r"\s+")
+_ID_RE = re.compile(r"[^0-9a-z]+")
+_NULOS = {"", "nan", "none", "null", "<na>", "nat"}
+
+
+def _on_uniques(s, fn):
+    """Aplica fn (Series -> Series) una vez por valor único y difunde el resultado (nulos -> "")."""
+    s = pd.Series(s)
+    codes, uniques = pd.factorize(s)
+    out = fn(_as_str(uniques)).to_numpy(dtype=object)
+    res = np.where(codes >= 0, out.take(np.maximum(codes, 0)) if len(out) else "", "")
+    return pd.Series(res, index=s.index, dtype=object)
+
+
+def _as_str(values):
+    s = pd.Series(values, dtype=object).fillna("").astype(str).str.strip()
+    return s.where(~s.str.lower().isin(_NULOS), "")
+
+
+def _strip_accents(s):
+    return s.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+
+
+def _canonical_id(u):
+    u = _strip_accents(u).str.lower().str.replace(r"\.0+$", "", regex=True)
+    return u.str.replace(_ID_RE, "", regex=True).str.lstrip("0")
+
+
+def _normalize_gloss(u):
+    u = _strip_accents(u).str.lower()
+    u = u.str.replace(_FECHA_RE, " _fecha_ ", regex=True)
+    u = u.str.replace(_NUM_RE, " _num_ ", regex=True)
+    u = u.str.replace(_PUNT_RE, " ", regex=True)
+    return u.str.replace(_ESPACIOS_RE, " ", regex=True).str.strip()
+
+
+def normalize_account(s):
+    return _on_uniques(s, lambda u: u.str.replace(r"\.0+$", "", regex=True).str.replace(r"\D+", "", regex=True))
+
+
+def normalize_tax_id(s):
+    """RUT / NIT / id de proveedor en forma canónica."""
+    return _on_uniques(s, _canonical_id)
+
+
+def normalize_gloss(s):
+    return _on_uniques(s, _normalize_gloss)
+
+
+def build_text(cuenta, proveedor, glosa):
+    """Texto de entrada del modelo: 'cuenta proveedor glosa' normalizados (campos vacíos se omiten)."""
+    cuenta, proveedor, glosa = normalize_account(cuenta), normalize_tax_id(proveedor), normalize_gloss(glosa)
+    # La unión también se hace sobre combinaciones únicas (las filas repetidas son la mayoría)
+    combos = pd.DataFrame({"c": cuenta.values, "p": proveedor.values, "g": glosa.values})
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(combos))
+    u = uniques.to_frame(index=False)
+    texto = (u.iloc[:, 0] + " " + u.iloc[:, 1] + " " + u.iloc[:, 2]).str.replace(_ESPACIOS_RE, " ", regex=True).str.strip()
+    return pd.Series(texto.to_numpy(dtype=object).take(codes), index=cuenta.index, dtype=object)
@@ -0,0 +1,144 @@
+# backend/services/training.py
+# Carga y preparación del set de entrenamiento (compartido por train_model y benchmark).
+# Fuentes: Excel semilla (histórico etiquetado) + filas manuales del libro consolidado.
+import hashlib
+import os
+import sys
+from urllib.parse import quote_plus
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from backend.services.text_normalization import NORMALIZATION_VERSION, build_text
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FILE_NAME = "Opex Real 2025 (1).xlsx" # Asegúrate que este sea el nombre correcto en tu carpeta data
+DATA_PATH = os.path.join(BASE_DIR, "data", FILE_NAME)
+
+# Columnas del Excel
+COL_GRUPO    = "Grupo"
+COL_SUBGRUPO = "Subgrupo"
+COL_DESC     = "Glosa Documento nuevo"
+COL_CUENTA   = "Código Cuenta"
+COL_PROV     = "Rut Nuevo" # Usamos RUT para mayor precisión
+
+
+# --- Conexión (compartida por los scripts de ml/: clasificación, entrenamiento, búsqueda) ---
+def configure_ssl():
+    """Por compatibilidad de entorno: usa openssl_legacy.cnf del directorio actual si existe."""
+    if not os.environ.get("OPENSSL_CONF"):
+        ssl_path = os.path.join(os.getcwd(), "openssl_legacy.cnf")
+        if os.path.exists(ssl_path):
+            os.environ["OPENSSL_CONF"] = ssl_path
+
+
+def get_env(var):
+    val = os.getenv(var)
+    if not val:
+        print(f"❌ Falta variable: {var}"); sys.exit(1)
+    return val
+
+
+def get_url_pg():
+    PG_HOST, PG_DB = get_env("PG_HOST"), get_env("PG_DB")
+    PG_USER, PG_PASS = get_env("PG_USER"), get_env("PG_PASS")
+    return f"postgresql://{PG_USER}:{quote_plus(PG_PASS)}@{PG_HOST}:5432/{PG_DB}"
+
+
+def get_training_engine(fuente):
+    """
+    Engine para leer etiquetas del libro al entrenar (None si fuente = excel).
+    Con fuente 'ambas' y sin credenciales se degrada a solo Excel. Devuelve (engine, fuente).
+    """
+    if fuente == "excel":
+        return None, fuente
+    faltantes = [v for v in ("PG_HOST", "PG_DB", "PG_USER", "PG_PASS") if not os.getenv(v)]
+    if faltantes and fuente == "ambas":
+        print(f"⚠️ Sin credenciales de Postgres ({', '.join(faltantes)}): se entrena solo con el Excel.")
+        return None, "excel"
+    configure_ssl()
+    return create_engine(get_url_pg()), fuente
+
+
+def load_excel_training_data(path=DATA_PATH, cache_dir=None):
+    """
+    Devuelve DataFrame con columnas: texto, grupo, subgrupo.
+    Con `cache_dir`, el resultado se guarda por (ruta, tamaño, fecha de modificación, versión de
+    normalización) y las siguientes corridas no vuelven a parsear el Excel.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Falta el archivo: {path}")
+
+    cache_path = None
+    if cache_dir:
+        st = os.stat(path)
+        # La versión de normalización es parte de la clave: un pickle con el texto anterior no se reutiliza
+        key = hashlib.md5(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{NORMALIZATION_VERSION}".encode()).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"excel_{key}.pkl")
+        if os.path.exists(cache_path):
+            return pd.read_pickle(cache_path)
+
+    try:
+        df = pd.read_excel(path)
+    except:
+        df = pd.read_excel(path, engine='openpyxl')
+
+    # Limpieza
+    df = df.dropna(subset=[COL_GRUPO])
+    df[COL_SUBGRUPO] = df[COL_SUBGRUPO].fillna('General')
+
+    # --- INGENIERÍA DE CARACTERÍSTICAS ---
+    # Usamos: Cuenta + RUT + Descripción, con la normalización compartida con la API y el batch
+    # Nota: No agregamos 'Empresa' aquí porque queremos que el modelo aprenda
+    # reglas universales (ej: "Uber" es transporte en Chile y en Perú).
+    texto = build_text(df[COL_CUENTA], df[COL_PROV], df[COL_DESC])
+
+    out = pd.DataFrame({
+        "texto": texto.values,
+        "grupo": df[COL_GRUPO].values,
+        "subgrupo": df[COL_SUBGRUPO].values,
+    })
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        out.to_pickle(cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+    return out
+
+
+def load_db_training_data(engine):
+    """
+    Filas etiquetadas a mano en el libro consolidado (texto, grupo, subgrupo) y la marca de agua
+    del log de correcciones a esa fecha: (DataFrame, marca).
+    """
+    # Import local: incremental depende de sqlalchemy, innecesario para entrenar solo con Excel
+    from backend.services.incremental import fetch_new_labels
+
+    with engine.connect() as conn:
+        return fetch_new_labels(conn)
+
+
+def load_training_data(engine=None, fuente="ambas", cache_dir=None):
+    """
+    Set de entrenamiento combinado. fuente: excel | db | ambas.
+    Si un mismo texto aparece en ambas fuentes, prevalece la etiqueta manual del libro
+    (es la corrección más reciente). Devuelve (DataFrame, conteo de filas por fuente).
+    Con filas del libro, df.attrs['marca_correcciones'] es la marca de agua del log de correcciones
+    hasta la que llegan (punto de partida del próximo entrenamiento incremental).
+    """
+    if fuente not in ("excel", "db", "ambas"):
+        raise ValueError(f"Fuente desconocida: {fuente}")
+    excel = load_excel_training_data(cache_dir=cache_dir) if fuente in ("excel", "ambas") else None
+    db, marca = None, None
+    if fuente in ("db", "ambas"):
+        if engine is None:
+            raise ValueError("Se requiere conexión a la base de datos para la fuente 'db'")
+        db, marca = load_db_training_data(engine)
+
+    if excel is not None and db is not None:
+        excel = excel[~excel["texto"].isin(db["texto"])]
+    partes = [p for p in (excel, db) if p is not None]
+    conteo = {n: len(p) for n, p in (("excel", excel), ("db", db)) if p is not None}
+    out = pd.concat(partes, ignore_index=True)
+    if marca is not None:
+        out.attrs["marca_correcciones"] = marca
+    return out, conteo
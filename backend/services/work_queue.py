@@ -0,0 +1,204 @@
+# backend/services/work_queue.py
+# Cola de trabajo en Postgres para clasificar con N workers (en una o varias máquinas).
+# - La corrida se parte en rangos de id_transaccion (tabla cola_clasificacion).
+# - Cada worker toma un rango con FOR UPDATE SKIP LOCKED: nunca dos workers el mismo rango
+#   y sin esperar bloqueos, por eso el throughput escala con el número de workers.
+# - El rango queda "tomado" con un lease que el worker renueva mientras trabaja; si el worker
+#   muere, el lease vence y otro worker lo retoma. Rehacer un rango es seguro: solo se
+#   reclasifican las filas del rango que siguen pendientes.
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+from backend.services.batch_pipeline import (
+    SCHEMA, TABLA, FILTRO_PENDIENTES, QUERY_PENDIENTES, ClassificationPipeline
+)
+from backend.services.classification import MODEL_DIR
+
+T_COLA = f"{SCHEMA}.cola_clasificacion"
+MAX_INTENTOS = 3
+
+
+def ensure_queue_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {T_COLA} (
+            id BIGSERIAL PRIMARY KEY,
+            corrida TEXT NOT NULL,
+            id_desde BIGINT NOT NULL,
+            id_hasta BIGINT NOT NULL,
+            filas_estimadas BIGINT,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            worker TEXT,
+            intentos INTEGER DEFAULT 0,
+            tomado_en TIMESTAMP,
+            expira_en TIMESTAMP,
+            terminado_en TIMESTAMP,
+            filas BIGINT,
+            error TEXT
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_cola_clasificacion_estado ON {T_COLA} (corrida, estado, id)"))
+
+
+def enqueue_ranges(conn, corrida, range_size=200_000):
+    """
+    Parte las filas pendientes en rangos de ~range_size ids. Idempotente por corrida: si ya
+    hay rangos abiertos no se encola nada (varios workers pueden llamarla al arrancar).
+    Devuelve el número de rangos creados.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"{T_COLA}|{corrida}"})
+    abiertos = conn.execute(text(f"""
+        SELECT count(*) FROM {T_COLA} WHERE corrida = :c AND estado IN ('pendiente', 'tomado')
+    """), {"c": corrida}).scalar()
+    if abiertos:
+        return 0
+    res = conn.execute(text(f"""
+        INSERT INTO {T_COLA} (corrida, id_desde, id_hasta, filas_estimadas)
+        SELECT :c, min(id_transaccion), max(id_transaccion), count(*)
+        FROM (
+            SELECT id_transaccion, (row_number() OVER (ORDER BY id_transaccion) - 1) / :n AS bloque
+            FROM {SCHEMA}.{TABLA}
+            WHERE {FILTRO_PENDIENTES}
+        ) t
+        GROUP BY bloque
+    """), {"c": corrida, "n": range_size})
+    return res.rowcount
+
+
+def claim_range(conn, corrida, worker, lease_s):
+    """Toma el siguiente rango libre (o con lease vencido). Devuelve (id, id_desde, id_hasta) o None."""
+    # Rangos cuyo lease venció sin intentos restantes: se cierran para no esperarlos para siempre
+    conn.execute(text(f"""
+        UPDATE {T_COLA} SET estado = 'error', error = COALESCE(error, 'lease vencido tras ' || intentos || ' intentos')
+        WHERE corrida = :c AND estado = 'tomado' AND expira_en < now() AND intentos >= :max
+    """), {"c": corrida, "max": MAX_INTENTOS})
+    return conn.execute(text(f"""
+        UPDATE {T_COLA} SET estado = 'tomado', worker = :w, intentos = intentos + 1,
+               tomado_en = now(), expira_en = now() + make_interval(secs => :lease)
+        WHERE id = (
+            SELECT id FROM {T_COLA}
+            WHERE corrida = :c AND intentos < :max
+              AND (estado = 'pendiente' OR (estado = 'tomado' AND expira_en < now()))
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, id_desde, id_hasta
+    """), {"c": corrida, "w": worker, "lease": lease_s, "max": MAX_INTENTOS}).fetchone()
+
+
+def extend_claim(conn, range_id, worker, lease_s):
+    """Renueva el lease; False si el rango ya no es de este worker (venció y otro lo tomó)."""
+    res = conn.execute(text(f"""
+        UPDATE {T_COLA} SET expira_en = now() + make_interval(secs => :lease)
+        WHERE id = :id AND worker = :w AND estado = 'tomado'
+    """), {"id": range_id, "w": worker, "lease": lease_s})
+    return res.rowcount > 0
+
+
+def finish_range(conn, range_id, worker, filas, error=None):
+    """Cierra el rango como hecho (o lo devuelve a la cola si hubo error)."""
+    conn.execute(text(f"""
+        UPDATE {T_COLA}
+        SET estado = CASE WHEN CAST(:err AS TEXT) IS NULL THEN 'hecho'
+                          WHEN intentos >= :max THEN 'error' ELSE 'pendiente' END,
+            filas = :filas, error = CAST(:err AS TEXT), terminado_en = now(), expira_en = NULL
+        WHERE id = :id AND worker = :w
+    """), {"id": range_id, "w": worker, "filas": filas, "err": error, "max": MAX_INTENTOS})
+
+
+def queue_status(conn, corrida):
+    rows = conn.execute(text(f"""
+        SELECT estado, count(*), COALESCE(sum(filas), 0) FROM {T_COLA} WHERE corrida = :c GROUP BY estado
+    """), {"c": corrida}).fetchall()
+    return {r[0]: {"rangos": r[1], "filas": int(r[2])} for r in rows}
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class _Lease(threading.Thread):
+    """Renueva el lease cada lease_s/3; si se pierde el rango, detiene el pipeline."""
+
+    def __init__(self, engine, range_id, worker, lease_s, stop):
+        super().__init__(daemon=True)
+        self.engine, self.range_id, self.worker, self.lease_s, self.stop = engine, range_id, worker, lease_s, stop
+        self.perdido = False
+        self._fin = threading.Event()
+
+    def run(self):
+        while not self._fin.wait(self.lease_s / 3):
+            try:
+                with self.engine.begin() as conn:
+                    ok = extend_claim(conn, self.range_id, self.worker, self.lease_s)
+            except Exception as e:
+                print(f"\n⚠️ No se pudo renovar el rango {self.range_id}: {e}")
+                continue
+            if not ok:
+                self.perdido = True
+                self.stop.set()
+                return
+
+    def close(self):
+        self._fin.set()
+        self.join()
+
+
+def run_worker(engine, corrida, worker=None, lease_s=300, chunk_size=50000, workers=0, poll_s=10,
+               progress_cb=None):
+    """
+    Procesa rangos hasta vaciar la cola de la corrida. Si quedan rangos tomados por otros,
+    espera (poll_s) por si alguno vence y hay que retomarlo. Devuelve un resumen.
+    """
+    worker = worker or default_worker_id()
+    # Modelo, reglas, caché y pool se preparan una vez por worker, no por rango
+    with ClassificationPipeline(engine, MODEL_DIR, chunk_size=chunk_size, workers=workers) as pipeline:
+        return _work(engine, pipeline, corrida, worker, lease_s, poll_s, progress_cb)
+
+
+def _work(engine, pipeline, corrida, worker, lease_s, poll_s, progress_cb):
+    resumen = {"worker": worker, "rangos": 0, "filas": 0, "errores": 0, "perdidos": 0}
+    while True:
+        with engine.begin() as conn:
+            rango = claim_range(conn, corrida, worker, lease_s)
+            if rango is None:
+                estado = queue_status(conn, corrida)
+        if rango is None:
+            if "tomado" not in estado:
+                return resumen
+            time.sleep(poll_s)
+            continue
+
+        range_id, desde, hasta = rango
+        stop = threading.Event()
+        lease = _Lease(engine, range_id, worker, lease_s, stop)
+        lease.start()
+        error, filas = None, 0
+        try:
+            # Ids enteros devueltos por la propia cola: seguros para interpolar
+            stats = pipeline.run(f"{QUERY_PENDIENTES} AND id_transaccion BETWEEN {int(desde)} AND {int(hasta)}",
+                                 run_id=f"q{range_id}_{uuid.uuid4().hex[:6]}", stop_event=stop)
+            filas = stats["escritas"]
+            if stats["errores"] or stats["errores_lote"]:
+                error = "; ".join(stats["errores"]) or f"{stats['errores_lote']} lotes con error"
+        except Exception as e:
+            error = str(e)
+        finally:
+            lease.close()
+
+        if lease.perdido:
+            # Otro worker retomó el rango (este se demoró más que el lease): él lo cierra
+            resumen["perdidos"] += 1
+            continue
+        with engine.begin() as conn:
+            finish_range(conn, range_id, worker, filas, error)
+        resumen["rangos"] += 1
+        resumen["filas"] += filas
+        resumen["errores"] += bool(error)
+        if progress_cb:
+            progress_cb(range_id, desde, hasta, filas, error)
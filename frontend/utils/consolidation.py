@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from frontend.utils.debt_engine import debt_book_schedule
+from frontend.utils.financial_logic import (
+    BALANCE_ITEMS, LINE_ITEMS, monthly_index, run_scenarios
+)
+from frontend.utils.portfolio_data import BASE_DATA, COUNTRIES, DEFAULT_DRIVERS, REAL_DEBT_DATA, US_COUNTRY
+
+# Consolidación multi-país:
+#   - Cada país es un escenario del mismo lote de run_scenarios (todos a la vez, con sus drivers).
+#   - La deuda EEUU (holding) se asigna a los países con una llave configurable; la asignación es
+#     una matriz países x instrumentos aplicada a los calendarios de todos los instrumentos.
+#   - La holding puede prestar a los países con un spread sobre su costo. El spread es un precio de
+#     transferencia: el consolidado se proyecta con el costo externo (sin spread) y las
+#     eliminaciones son la diferencia con la suma de los países (incluye el efecto del spread en
+#     el FIU, los ingresos y los impuestos de cada país).
+
+# Llaves de asignación de la deuda EEUU: nombre -> peso por país a partir de sus inputs
+ALLOCATION_KEYS = {
+    'fiu_total': lambda e: e['fiu_perf_start'] + e['fiu_npa_start'],
+    'fiu_performing': lambda e: e['fiu_perf_start'],
+    'igual': lambda e: 1.0,
+}
+# Drivers en MUSD/año (no tasas): los montos comunes son del total regional y se prorratean por
+# el peso FIU de cada país dentro del perímetro; las tasas y porcentajes se copian tal cual
+ABSOLUTE_DRIVERS = ['new_debt_amount', 'cogs_amount', 'dep_amort_amount', 'fx_impact', 'non_op_result']
+ELIMINACIONES = 'Eliminaciones'
+CONSOLIDADO = 'Consolidado'
+
+
+def default_debt_book():
+    """Deuda vigente de referencia en MUSD (misma tabla del simulador)."""
+    df = pd.DataFrame(REAL_DEBT_DATA)
+    df['USD Balance Equiv'] = df['USD Balance Equiv'] / 1_000_000
+    return df
+
+
+def entity_inputs(entities=None, drivers=None):
+    """
+    Inputs por país: FIU de BASE_DATA y supuestos por defecto, sobreescritos por `drivers`
+    (comunes) y luego por `entities` ({país: {driver: valor}}). Los montos comunes de
+    ABSOLUTE_DRIVERS se reparten por FIU total; los que `entities` da por país se usan tal cual.
+    """
+    entities = entities or {}
+    comunes = {**DEFAULT_DRIVERS, **(drivers or {})}
+    out = {}
+    for pais in entities or COUNTRIES:
+        base = BASE_DATA.get(pais, {"perf": 0.0, "npa": 0.0})
+        out[pais] = {'fiu_perf_start': base['perf'], 'fiu_npa_start': base['npa'], **entities.get(pais, {})}
+    fiu = np.array([e['fiu_perf_start'] + e['fiu_npa_start'] for e in out.values()], dtype=float)
+    pesos = fiu / fiu.sum() if fiu.sum() > 0 else np.full(len(out), 1 / max(len(out), 1))
+    for peso, (pais, e) in zip(pesos, out.items()):
+        out[pais] = {**{k: v * peso if k in ABSOLUTE_DRIVERS else v for k, v in comunes.items()}, **e}
+    return out
+
+
+def allocation_matrix(df_debt, entidades, key='fiu_total'):
+    """
+    Matriz (países x instrumentos): 1 para la deuda local del país, su peso para la deuda EEUU.
+    `key` es una llave de ALLOCATION_KEYS o un dict {país: peso}; los pesos se normalizan.
+    """
+    paises = list(entidades)
+    if isinstance(key, dict):
+        pesos = np.array([float(key.get(p, 0.0)) for p in paises])
+    elif key in ALLOCATION_KEYS:
+        pesos = np.array([float(ALLOCATION_KEYS[key](entidades[p])) for p in paises])
+    else:
+        raise ValueError(f"Llave de asignación desconocida: {key}. Opciones: {', '.join(ALLOCATION_KEYS)} o un dict")
+    if pesos.sum() <= 0:
+        raise ValueError("Los pesos de asignación de la deuda EEUU suman cero")
+    pesos = pesos / pesos.sum()
+
+    pais_deuda = df_debt['Country'].to_numpy() if 'Country' in df_debt else np.full(len(df_debt), US_COUNTRY)
+    es_usa = pais_deuda == US_COUNTRY
+    local = (pais_deuda[None, :] == np.array(paises)[:, None]).astype(float)
+    return np.where(es_usa[None, :], pesos[:, None], local), es_usa
+
+
+def _annual(cubo, rng):
+    df = pd.DataFrame(cubo, index=rng, columns=LINE_ITEMS)
+    anual = df.resample('YE').sum()
+    for col in BALANCE_ITEMS:
+        anual[col] = df[col].resample('YE').last()
+    return df, anual
+
+
+def consolidate(entities=None, drivers=None, df_debt=None, plazo_anos=5, allocation_key='fiu_total',
+                spread_intercompania=0.0):
+    """
+    Proyección de todos los países en una llamada y su consolidado.
+    Devuelve un dict:
+      'mensual' / 'anual': {país | 'Eliminaciones' | 'Consolidado': DataFrame P&L}
+      'asignacion':        DataFrame instrumentos EEUU x países (MUSD asignados)
+      'deuda_no_asignada': MUSD de deuda local de países fuera del perímetro
+    """
+    entidades = entity_inputs(entities, drivers)
+    paises = list(entidades)
+    df_debt = default_debt_book() if df_debt is None else df_debt.reset_index(drop=True)
+    total_meses = int(plazo_anos * 12)
+
+    # Calendario de TODOS los instrumentos en una pasada y asignación por producto matricial
+    cal = debt_book_schedule(df_debt, horizonte=total_meses)
+    W, es_usa = allocation_matrix(df_debt, entidades, allocation_key)
+    # Margen intercompañía: la holding cobra spread_intercompania pp sobre el saldo asignado
+    saldo_inicio = cal.saldo + cal.capital
+    margen = saldo_inicio * (spread_intercompania / 100 / 12) * es_usa[:, None]
+    int_paises = W @ (cal.interes + margen)
+
+    # Un escenario por país: todos avanzan juntos en el mismo lote. Con spread se agrega en el
+    # mismo lote la corrida a costo externo (consolidado), así el precio de transferencia no
+    # mueve el resultado del grupo
+    n = len(paises)
+    por_pais = {d: np.array([entidades[p][d] for p in paises], dtype=object if d == 'new_debt_type' else float)
+                for d in next(iter(entidades.values()))}
+    if spread_intercompania:
+        por_pais = {d: np.concatenate([v, v]) for d, v in por_pais.items()}
+        int_paises = np.vstack([int_paises, W @ cal.interes])
+    cubo = run_scenarios(plazo_anos, **por_pais, int_actual=int_paises)
+    consolidado = cubo[n:].sum(axis=0) if spread_intercompania else cubo[:n].sum(axis=0)
+    cubo = cubo[:n]
+    elim = consolidado - cubo.sum(axis=0)
+
+    rng = monthly_index(total_meses)
+    mensual, anual = {}, {}
+    for k, pais in enumerate(paises):
+        mensual[pais], anual[pais] = _annual(cubo[k], rng)
+    mensual[ELIMINACIONES], anual[ELIMINACIONES] = _annual(elim, rng)
+    mensual[CONSOLIDADO], anual[CONSOLIDADO] = _annual(consolidado, rng)
+
+    asignacion = pd.DataFrame(W[:, es_usa].T * df_debt.loc[es_usa, 'USD Balance Equiv'].to_numpy()[:, None],
+                              index=df_debt.loc[es_usa, 'Type'].to_numpy(), columns=paises)
+    fuera = ~es_usa & (W.sum(axis=0) == 0)
+    return {
+        'mensual': mensual,
+        'anual': anual,
+        'asignacion': asignacion,
+        'deuda_no_asignada': float(pd.to_numeric(df_debt.loc[fuera, 'USD Balance Equiv'], errors='coerce').sum()),
+    }
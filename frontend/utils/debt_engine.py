@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+# Motor de amortización vectorizado: todos los instrumentos de la cartera de deuda a la vez,
+# como matrices (instrumentos x meses). Sin bucles por mes ni por instrumento.
+#   Amortizado (francés): cuota constante; durante la gracia solo se pagan intereses y la
+#                         cuota se calcula sobre los meses restantes.
+#   Bullet:               solo intereses y todo el capital al vencimiento.
+
+HORIZONTE_MESES = 120  # 10 años
+TIPOS_AMORTIZACION = ("Amortizado", "Bullet")
+
+DebtSchedule = namedtuple("DebtSchedule", [
+    "interes", "capital", "saldo",                      # matrices instrumentos x meses
+    "total_interes", "total_capital", "total_saldo",    # vectores por mes (suma de la cartera)
+])
+
+
+def _as_array(values, n, default):
+    arr = pd.to_numeric(pd.Series(values if np.ndim(values) else [values] * n), errors='coerce')
+    return arr.fillna(default).to_numpy(dtype=float)
+
+
+def amortization_schedule(monto, tasa_anual, plazo_anos, tipo="Amortizado", gracia_meses=0,
+                          horizonte=HORIZONTE_MESES):
+    """
+    Calendario de intereses, capital y saldo (fin de mes) de N instrumentos.
+    Acepta escalares o vectores (un valor por instrumento). Montos o plazos no positivos, o
+    valores no numéricos, producen filas en cero en vez de error.
+    """
+    monto = np.atleast_1d(np.asarray(monto, dtype=float))
+    n_inst = len(monto)
+    tasa = _as_array(tasa_anual, n_inst, 0.0) / 100 / 12
+    plazo = _as_array(plazo_anos, n_inst, 0.0)
+    gracia = _as_array(gracia_meses, n_inst, 0.0)
+    tipos = np.broadcast_to(np.asarray(tipo, dtype=object), (n_inst,))
+
+    validos = np.isfinite(monto) & (monto > 0) & (plazo > 0)
+    monto = np.where(validos, monto, 0.0)
+    n_meses = np.where(validos, np.maximum(np.round(plazo * 12), 1), 1)
+    bullet = tipos == "Bullet"
+    gracia = np.clip(np.round(gracia), 0, n_meses - 1)
+
+    # Saldo al cierre de cada mes t = 1..horizonte (columna 0 = saldo inicial)
+    t = np.arange(horizonte + 1)[None, :]
+    n_amort = (n_meses - gracia)[:, None]
+    k = np.clip(t - gracia[:, None], 0, n_amort)  # cuotas pagadas al cierre del mes t
+    r = tasa[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crec_n = (1 + r) ** n_amort
+        frances = monto[:, None] * (crec_n - (1 + r) ** k) / (crec_n - 1)
+    lineal = monto[:, None] * (1 - k / n_amort)  # tasa 0: amortización lineal
+    frances = np.where(np.abs(r) < 1e-12, lineal, frances)
+    al_vencimiento = np.where(t < n_meses[:, None], monto[:, None], 0.0)
+    saldos = np.where(bullet[:, None], al_vencimiento, frances)
+    saldos = np.clip(saldos, 0.0, None)
+
+    saldo_inicio, saldo = saldos[:, :-1], saldos[:, 1:]
+    interes = saldo_inicio * r
+    capital = saldo_inicio - saldo
+    return DebtSchedule(interes, capital, saldo, interes.sum(axis=0), capital.sum(axis=0), saldo.sum(axis=0))
+
+
+def debt_book_schedule(df_debt, horizonte=HORIZONTE_MESES, plazo_default=3):
+    """
+    Calendario de la tabla de deuda editable (una fila por instrumento). Columnas:
+    'USD Balance Equiv', 'Weighted average annual rate', 'Plazo' (años) y opcionalmente
+    'Amortización' y 'Gracia (meses)'. Las celdas vacías toman los valores por defecto.
+    """
+    if df_debt is None or df_debt.empty:
+        return amortization_schedule(np.zeros(0), 0, 0, horizonte=horizonte)
+
+    def col(*nombres, default):
+        for nombre in nombres:
+            if nombre in df_debt:
+                return df_debt[nombre]
+        return pd.Series(default, index=df_debt.index)
+
+    monto = _as_array(col('USD Balance Equiv', default=0.0), len(df_debt), 0.0)
+    tipo = col('Amortización', default="Amortizado").fillna("Amortizado").to_numpy(dtype=object)
+    return amortization_schedule(
+        monto,
+        col('Weighted average annual rate', default=0.0),
+        _as_array(col('Plazo', 'Plazo Restante (Años)', default=plazo_default), len(df_debt), plazo_default),
+        tipo=tipo,
+        gracia_meses=col('Gracia (meses)', default=0),
+        horizonte=horizonte,
+    )
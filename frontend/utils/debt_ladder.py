@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from frontend.utils.debt_engine import debt_book_schedule
+from frontend.utils.financial_logic import monthly_index
+
+# Escalera de vencimientos y liquidez de la deuda vigente:
+#   - Un solo calendario vectorizado de todos los instrumentos (debt_book_schedule) y agregación por
+#     grupo (país / tipo) con una matriz de pertenencia: grupos x instrumentos @ instrumentos x meses.
+#   - Por defecto el horizonte cubre el vencimiento del instrumento más largo (no se pierde capital).
+#   - La brecha de refinanciamiento compara el capital que vence con el flujo que genera la
+#     proyección (variación del FIU Performing: utilidad + D&A + recuperos - amortización deuda nueva).
+
+LADDER_KEYS = ['Country', 'Type']
+LADDER_ITEMS = ['Capital', 'Intereses', 'Saldo Final']
+SIN_DATO = 'Sin dato'
+
+
+def ladder_horizon(df_debt, plazo_default=3):
+    """Meses hasta el vencimiento del instrumento más largo de la tabla."""
+    if df_debt is None or df_debt.empty:
+        return 12
+    col = 'Plazo' if 'Plazo' in df_debt else 'Plazo Restante (Años)'
+    plazos = pd.to_numeric(df_debt[col], errors='coerce') if col in df_debt else pd.Series(dtype=float)
+    plazos = plazos.fillna(plazo_default)
+    return int(max(np.ceil(plazos.max() * 12), 12)) if len(plazos) else 12
+
+
+def maturity_ladder(df_debt, horizonte=None, por=LADDER_KEYS):
+    """
+    Capital que vence, intereses y saldo de cierre por grupo (columnas `por` de la tabla de deuda).
+    Devuelve (mensual, anual): DataFrames largos con columnas por + ['Periodo'] + LADDER_ITEMS.
+    En el anual el capital y los intereses se suman y el saldo es el del último mes del año.
+    """
+    columnas = list(por) + ['Periodo'] + LADDER_ITEMS
+    if df_debt is None or df_debt.empty:
+        vacio = pd.DataFrame(columns=columnas)
+        return vacio, vacio.copy()
+    df_debt = df_debt.reset_index(drop=True)
+    horizonte = horizonte or ladder_horizon(df_debt)
+
+    cal = debt_book_schedule(df_debt, horizonte=horizonte)
+    claves = pd.DataFrame({c: df_debt[c].fillna(SIN_DATO).astype(str) if c in df_debt else SIN_DATO
+                           for c in por}, index=df_debt.index)
+    codigos, grupos = pd.MultiIndex.from_frame(claves).factorize(sort=True)
+    pertenencia = np.zeros((len(grupos), len(df_debt)))
+    pertenencia[codigos, np.arange(len(df_debt))] = 1.0
+    # (grupos, meses, [capital, intereses, saldo]) en un solo producto
+    cubo = np.einsum('gi,ikm->gmk', pertenencia, np.stack([cal.capital, cal.interes, cal.saldo], axis=1))
+
+    rng = monthly_index(horizonte)
+    anos = rng.year.to_numpy()
+    inicio = np.flatnonzero(np.r_[True, anos[1:] != anos[:-1]])
+    fin = np.r_[inicio[1:], len(anos)] - 1
+    anual = np.add.reduceat(cubo, inicio, axis=1)
+    anual[:, :, 2] = cubo[:, fin, 2]
+
+    def largo(datos, periodos):
+        n_per = len(periodos)
+        df = pd.DataFrame(datos.reshape(-1, len(LADDER_ITEMS)), columns=LADDER_ITEMS)
+        for k, c in enumerate(por):
+            df.insert(k, c, np.repeat(grupos.get_level_values(k).to_numpy(), n_per))
+        df.insert(len(por), 'Periodo', np.tile(periodos, len(grupos)))
+        return df
+
+    return largo(cubo, rng), largo(anual, anos[inicio])
+
+
+def refinancing_gap(df_mensual, df_ladder_mensual, fiu_perf_start):
+    """
+    Brecha de refinanciamiento mes a mes sobre el horizonte de la proyección:
+    vencimientos de capital de la deuda vigente vs. flujo generado (variación del FIU Performing).
+    'Brecha Acumulada' > 0 es el monto que hay que refinanciar (o vender cartera) a esa fecha.
+    """
+    meses = len(df_mensual)
+    vencimientos = np.zeros(meses)
+    if not df_ladder_mensual.empty:
+        por_mes = df_ladder_mensual.groupby('Periodo', sort=True)['Capital'].sum().to_numpy()[:meses]
+        vencimientos[:len(por_mes)] = por_mes
+    flujo = np.diff(df_mensual['FIU Performing'].to_numpy(), prepend=fiu_perf_start)
+    return pd.DataFrame({
+        'Vencimientos': vencimientos,
+        'Flujo Generado': flujo,
+        'Brecha Acumulada': np.cumsum(vencimientos - flujo),
+    }, index=df_mensual.index)
+
+
+def gap_summary(df_gap):
+    """KPIs de la brecha: necesidad máxima (y su fecha) y brecha a 12 meses."""
+    brecha = df_gap['Brecha Acumulada']
+    pico = brecha.idxmax() if len(brecha) else None
+    return {
+        'necesidad_maxima': max(float(brecha.max()), 0.0) if len(brecha) else 0.0,
+        'fecha_maxima': pico if len(brecha) and brecha.max() > 0 else None,
+        'brecha_12m': float(brecha.iloc[min(11, len(brecha) - 1)]) if len(brecha) else 0.0,
+        'vencimientos_horizonte': float(df_gap['Vencimientos'].sum()),
+    }
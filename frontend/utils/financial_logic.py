@@ -1,150 +1,162 @@
 import pandas as pd
 import numpy as np
-import numpy_financial as npf
+from frontend.utils.debt_engine import amortization_schedule, debt_book_schedule
 
 def calculate_debt_schedule(monto, tasa_anual, plazo_anos):
     """Calcula la tabla de amortización (Intereses) para una deuda específica."""
-    if monto <= 0 or plazo_anos <= 0:
-        return np.zeros(120) # Retorna ceros para 10 años por seguridad
-    
-    tasa_mensual = (tasa_anual / 100) / 12
-    n_periodos = int(plazo_anos * 12)
-    
-    try:
-        cuota = npf.pmt(tasa_mensual, n_periodos, -monto)
-    except:
-        cuota = 0
-    
-    intereses = []
-    saldo = monto
-    
-    # Generamos proyección hasta 120 meses (10 años)
-    for _ in range(120): 
-        if saldo <= 0.01:
-            intereses.append(0)
-            continue
-            
-        interes = saldo * tasa_mensual
-        amort = cuota - interes
-        if saldo - amort < 0: amort = saldo
-            
-        intereses.append(interes)
-        saldo -= amort
-        
-    return np.array(intereses)
+    return amortization_schedule(monto, tasa_anual, plazo_anos).total_interes
 
-def run_financial_model(
-    plazo_anos, 
-    fiu_perf_start, fiu_npa_start, 
+# Líneas del P&L en el orden de la tercera dimensión de run_scenarios
+LINE_ITEMS = [
+    'FIU Performing', 'FIU NPA', 'Revenues', 'Provisions', 'COF', 'COGS', 'Gross Income', 'OPEX',
+    'EBITDA', 'Dep & Amort', 'Exchange Rates', 'Non Operating', 'Financial Expenses', 'EBT', 'Taxes',
+    'Earnings'
+]
+ITEM = {name: k for k, name in enumerate(LINE_ITEMS)}
+# Saldos: al agregar por año se toma el último mes en vez de sumar
+BALANCE_ITEMS = ['FIU Performing', 'FIU NPA']
+
+# Drivers que run_scenarios acepta como vector (uno por escenario)
+DRIVERS = [
+    'fiu_perf_start', 'fiu_npa_start', 'new_debt_amount', 'new_debt_rate', 'new_debt_type',
+    'rev_rate', 'cof_rate', 'provision_rate', 'rec_npa_rate', 'opex_pct', 'tax_rate',
+    'cogs_amount', 'dep_amort_amount', 'fx_impact', 'non_op_result'
+]
+
+
+def run_scenarios(
+    plazo_anos,
+    fiu_perf_start, fiu_npa_start,
     new_debt_amount, new_debt_rate, new_debt_type,
     rev_rate, cof_rate, provision_rate, rec_npa_rate, opex_pct, tax_rate,
     cogs_amount, dep_amort_amount, fx_impact, non_op_result,
-    df_current_debt
+    df_current_debt=None, int_actual=None
 ):
+    """
+    Proyecta S escenarios a la vez. Cada driver puede ser escalar o vector de largo S; la
+    recurrencia mensual avanza todos los escenarios juntos con NumPy.
+    La deuda actual es común a todos: se pasa la tabla o directamente su vector de intereses
+    (int_actual) si ya se calculó; int_actual también puede ser una matriz (S, meses) con los
+    intereses propios de cada escenario (p. ej. un país por escenario).
+    Devuelve un array (S, meses, len(LINE_ITEMS)).
+    """
     total_meses = int(plazo_anos * 12)
-    # Rango de fechas mensual
-    rng = pd.date_range(start=pd.Timestamp.now().normalize(), periods=total_meses, freq='ME')
-    
+    drivers = [fiu_perf_start, fiu_npa_start, new_debt_amount, new_debt_rate, rev_rate, cof_rate,
+               provision_rate, rec_npa_rate, opex_pct, tax_rate, cogs_amount, dep_amort_amount,
+               fx_impact, non_op_result]
+    n_esc = np.broadcast_shapes(*(np.shape(d) for d in drivers + [np.asarray(new_debt_type, dtype=object)]), (1,))[0]
+    (fiu_perf, fiu_npa, new_debt_amount, new_debt_rate, rev_rate, cof_rate, provision_rate, rec_npa_rate,
+     opex_pct, tax_rate, cogs_amount, dep_amort_amount, fx_impact, non_op_result) = [
+        np.broadcast_to(np.asarray(d, dtype=float), (n_esc,)).copy() for d in drivers]
+    new_debt_type = np.broadcast_to(np.asarray(new_debt_type, dtype=object), (n_esc,))
+
     # Tasas mensuales
     r_rev = rev_rate / 100 / 12
     r_cof = cof_rate / 100 / 12
     r_prov = provision_rate / 100 / 12
     r_rec = (1 - (1 - rec_npa_rate/100)**(1/12))
-    
-    # --- 1. PROCESAR DEUDA ACTUAL (TABLA EDITABLE) ---
-    total_int_actual = np.zeros(total_meses)
-    
-    if not df_current_debt.empty:
-        for _, row in df_current_debt.iterrows():
-            try:
-                m = float(row.get('USD Balance Equiv', 0))
-                t = float(row.get('Weighted average annual rate', 0))
-                p = float(row.get('Plazo Restante (Años)', 3)) 
-                
-                # Calcular vector de intereses
-                ints = calculate_debt_schedule(m, t, p)
-                
-                # Sumar al vector total (recortando o rellenando)
-                len_fill = min(len(ints), total_meses)
-                total_int_actual[:len_fill] += ints[:len_fill]
-            except: continue
-
-    # --- 2. SIMULACIÓN MENSUAL ---
-    fiu_perf = fiu_perf_start
-    fiu_npa = fiu_npa_start
-    saldo_new_debt = new_debt_amount
-    r_new_debt = (new_debt_rate/100)/12
-    
-    cuota_new = 0
-    if new_debt_amount > 0 and new_debt_type == 'Amortizado':
-        cuota_new = npf.pmt(r_new_debt, total_meses, -new_debt_amount)
+    r_opex = opex_pct / 100
+    r_tax = tax_rate / 100
 
-    results = []
-    
+    # --- 1. DEUDA ACTUAL (TABLA EDITABLE) + DEUDA NUEVA: calendario vectorizado ---
+    if int_actual is None:
+        int_actual = debt_book_schedule(df_current_debt, horizonte=total_meses).total_interes
+    # La deuda nueva vence al final del horizonte (cuota francesa o bullet), una por escenario
+    deuda_nueva = amortization_schedule(new_debt_amount, new_debt_rate, plazo_anos,
+                                        tipo=new_debt_type, horizonte=total_meses)
+    int_total = np.atleast_2d(int_actual)[:, :total_meses] + deuda_nueva.interes
+    amort_new = deuda_nueva.capital
+
+    # Items constantes por mes (MUSD/año -> mes)
+    cogs = cogs_amount / 12
+    dep_amort = dep_amort_amount / 12
+    fx = fx_impact / 12
+    non_op = non_op_result / 12
+
+    # --- 2. SIMULACIÓN MENSUAL (todos los escenarios a la vez) ---
+    # Se llena (meses, líneas, escenarios): cada escritura es contigua
+    out = np.empty((total_meses, len(LINE_ITEMS), n_esc))
     for i in range(total_meses):
         # Drivers Operativos
         revenue = fiu_perf * r_rev
         cof = fiu_perf * r_cof
         prov = (fiu_perf + fiu_npa) * r_prov
-        cogs = cogs_amount / 12 
-        
         gross_income = revenue - prov - cof - cogs
-        opex = revenue * (opex_pct / 100)
+        opex = revenue * r_opex
         ebitda = gross_income - opex
-        
-        # Items bajo EBITDA
-        dep_amort = dep_amort_amount / 12
-        fx = fx_impact / 12
-        non_op = non_op_result / 12
-        
-        # Intereses (Actual + Nueva)
-        int_new = saldo_new_debt * r_new_debt
-        int_total = int_new + (total_int_actual[i] if i < len(total_int_actual) else 0)
-        
-        ebt = ebitda - dep_amort + fx + non_op - int_total
-        tax = max(0, ebt * (tax_rate/100))
+
+        ebt = ebitda - dep_amort + fx + non_op - int_total[:, i]
+        tax = np.maximum(0, ebt * r_tax)
         net_income = ebt - tax
-        
-        # Movimiento de Capital (Deuda Nueva)
-        amort_new = 0
-        if new_debt_amount > 0:
-            if new_debt_type == 'Amortizado': amort_new = cuota_new - int_new
-            elif new_debt_type == 'Bullet' and i == total_meses - 1: amort_new = saldo_new_debt
-        
-        # Evolución FIU (Simplificada)
+
+        # Evolución FIU (Simplificada): reinversión del flujo neto
         recup = fiu_npa * r_rec
-        fiu_npa -= recup
-        # Asumimos reinversión del flujo neto
-        cash_flow = net_income + dep_amort + recup - amort_new
-        fiu_perf += cash_flow
-        saldo_new_debt -= amort_new
-        
-        results.append({
-            'FIU Performing': fiu_perf,
-            'FIU NPA': fiu_npa,
-            'Revenues': revenue,
-            'Provisions': -prov,
-            'COF': -cof,
-            'COGS': -cogs,
-            'Gross Income': gross_income,
-            'OPEX': -opex,
-            'EBITDA': ebitda,
-            'Dep & Amort': -dep_amort,
-            'Exchange Rates': fx,
-            'Non Operating': non_op,
-            'Financial Expenses': -int_total,
-            'EBT': ebt,
-            'Taxes': -tax,
-            'Earnings': net_income
-        })
-
-    df_res = pd.DataFrame(results, index=rng)
+        fiu_npa = fiu_npa - recup
+        fiu_perf = fiu_perf + net_income + dep_amort + recup - amort_new[:, i]
+
+        mes = out[i]
+        mes[ITEM['FIU Performing']] = fiu_perf
+        mes[ITEM['FIU NPA']] = fiu_npa
+        mes[ITEM['Revenues']] = revenue
+        mes[ITEM['Provisions']] = -prov
+        mes[ITEM['COF']] = -cof
+        mes[ITEM['COGS']] = -cogs
+        mes[ITEM['Gross Income']] = gross_income
+        mes[ITEM['OPEX']] = -opex
+        mes[ITEM['EBITDA']] = ebitda
+        mes[ITEM['Dep & Amort']] = -dep_amort
+        mes[ITEM['Exchange Rates']] = fx
+        mes[ITEM['Non Operating']] = non_op
+        mes[ITEM['Financial Expenses']] = -int_total[:, i]
+        mes[ITEM['EBT']] = ebt
+        mes[ITEM['Taxes']] = -tax
+        mes[ITEM['Earnings']] = net_income
+
+    return out.transpose(2, 0, 1)
+
+
+def monthly_index(total_meses):
+    """Fechas de cierre de mes de la proyección (desde hoy)."""
+    return pd.date_range(start=pd.Timestamp.now().normalize(), periods=total_meses, freq='ME')
+
+
+def annualize(cubo, rng):
+    """
+    Agrega el cubo (S, meses, líneas) por año calendario, igual que la vista anual:
+    flujos sumados y saldos al último mes. Devuelve (cubo anual, años).
+    """
+    anos = rng.year.to_numpy()
+    inicio = np.flatnonzero(np.r_[True, anos[1:] != anos[:-1]])
+    fin = np.r_[inicio[1:], len(anos)] - 1
+    anual = np.add.reduceat(cubo, inicio, axis=1)
+    saldos = [ITEM[c] for c in BALANCE_ITEMS]
+    anual[:, :, saldos] = cubo[:, fin][:, :, saldos]
+    return anual, anos[inicio]
+
+
+def run_financial_model(
+    plazo_anos, 
+    fiu_perf_start, fiu_npa_start, 
+    new_debt_amount, new_debt_rate, new_debt_type,
+    rev_rate, cof_rate, provision_rate, rec_npa_rate, opex_pct, tax_rate,
+    cogs_amount, dep_amort_amount, fx_impact, non_op_result,
+    df_current_debt
+):
+    """Un escenario: P&L mensual y anual como DataFrames (envoltorio de run_scenarios)."""
+    cubo = run_scenarios(
+        plazo_anos, fiu_perf_start, fiu_npa_start, new_debt_amount, new_debt_rate, new_debt_type,
+        rev_rate, cof_rate, provision_rate, rec_npa_rate, opex_pct, tax_rate,
+        cogs_amount, dep_amort_amount, fx_impact, non_op_result, df_current_debt=df_current_debt
+    )
+    # Rango de fechas mensual
+    rng = monthly_index(cubo.shape[1])
+    df_res = pd.DataFrame(cubo[0], index=rng, columns=LINE_ITEMS)
     
     # Generar versión Anual
     df_yr = df_res.resample('YE').sum()
     # Corregir Saldos (no se suman, se toma el último)
-    df_yr['FIU Performing'] = df_res['FIU Performing'].resample('YE').last()
-    df_yr['FIU NPA'] = df_res['FIU NPA'].resample('YE').last()
+    for col in BALANCE_ITEMS:
+        df_yr[col] = df_res[col].resample('YE').last()
     
     return df_res, df_yr
 
@@ -0,0 +1,108 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from frontend.utils.debt_engine import debt_book_schedule
+from frontend.utils.financial_logic import ITEM, run_scenarios
+
+# Goal seek: valor de un driver que lleva un KPI de la proyección a un objetivo.
+# Búsqueda por bracket: en cada iteración se evalúan N candidatos repartidos en el intervalo
+# en un solo lote (run_scenarios) y el intervalo se reduce al tramo donde el KPI cruza el
+# objetivo; cada iteración achica el bracket (N - 1) veces.
+
+# KPI -> función sobre el cubo (S, meses, líneas) que devuelve un valor por escenario
+KPIS = {
+    'Utilidad Neta Acumulada': lambda c: c[:, :, ITEM['Earnings']].sum(axis=1),
+    'EBITDA Promedio Anual': lambda c: c[:, :, ITEM['EBITDA']].sum(axis=1) / (c.shape[1] / 12),
+    'FIU Final': lambda c: c[:, -1, ITEM['FIU Performing']] + c[:, -1, ITEM['FIU NPA']],
+    'Margen Neto %': lambda c: _margin(c, 'Earnings'),
+    'Margen EBITDA %': lambda c: _margin(c, 'EBITDA'),
+}
+
+# Intervalo de búsqueda por defecto (unidades del driver: % o MUSD)
+DEFAULT_BOUNDS = {
+    'fiu_perf_start': (0.0, 2000.0),
+    'fiu_npa_start': (0.0, 500.0),
+    'new_debt_amount': (0.0, 1000.0),
+    'new_debt_rate': (0.0, 40.0),
+    'rev_rate': (0.0, 60.0),
+    'cof_rate': (0.0, 40.0),
+    'provision_rate': (0.0, 20.0),
+    'rec_npa_rate': (0.0, 100.0),
+    'opex_pct': (0.0, 100.0),
+    'tax_rate': (0.0, 60.0),
+    'cogs_amount': (0.0, 100.0),
+    'dep_amort_amount': (0.0, 100.0),
+    'fx_impact': (-100.0, 100.0),
+    'non_op_result': (-100.0, 100.0),
+}
+
+GoalSeekResult = namedtuple("GoalSeekResult", [
+    "valor", "kpi", "convergio", "iteraciones", "evaluaciones", "mensaje", "curva",
+])
+
+
+def _margin(cubo, linea):
+    ingresos = cubo[:, :, ITEM['Revenues']].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ingresos != 0, cubo[:, :, ITEM[linea]].sum(axis=1) / ingresos * 100, np.nan)
+
+
+def goal_seek(params, driver, kpi, target, bounds=None, candidates=33, xtol=1e-6, ftol=1e-6, max_iter=20):
+    """
+    Busca el valor de `driver` en `bounds` con KPI(driver) == target.
+    `params` son los argumentos de run_financial_model (el valor base del driver se ignora).
+    Si el KPI cruza el objetivo varias veces en el intervalo se devuelve el cruce de menor valor.
+    Devuelve GoalSeekResult; `curva` es el KPI sobre el intervalo inicial (para graficar).
+    """
+    if kpi not in KPIS:
+        raise ValueError(f"KPI desconocido: {kpi}. Opciones: {', '.join(KPIS)}")
+    if driver not in DEFAULT_BOUNDS:
+        raise ValueError(f"Driver desconocido: {driver}. Opciones: {', '.join(DEFAULT_BOUNDS)}")
+    lo, hi = bounds or DEFAULT_BOUNDS[driver]
+    if not lo < hi:
+        raise ValueError(f"Intervalo inválido: [{lo}, {hi}]")
+
+    params = dict(params)
+    plazo_anos = params.pop('plazo_anos')
+    # La deuda actual no depende del driver buscado: se calcula una vez
+    int_actual = debt_book_schedule(params.pop('df_current_debt', None), horizonte=int(plazo_anos * 12)).total_interes
+    kpi_fn = KPIS[kpi]
+
+    def f(xs):
+        cubo = run_scenarios(plazo_anos, **{**params, driver: xs}, int_actual=int_actual)
+        return kpi_fn(cubo) - target
+
+    curva, evaluaciones = None, 0
+    for iteracion in range(1, max_iter + 1):
+        xs = np.linspace(lo, hi, candidates)
+        fx = f(xs)
+        evaluaciones += len(xs)
+        if curva is None:
+            curva = pd.DataFrame({'valor': xs, 'kpi': fx + target})
+
+        # Candidato exacto, o primer tramo donde cambia el signo
+        exacto = np.flatnonzero(np.abs(fx) <= ftol)
+        if len(exacto):
+            i = exacto[0]
+            return GoalSeekResult(xs[i], fx[i] + target, True, iteracion, evaluaciones, "Objetivo alcanzado", curva)
+        cruces = np.flatnonzero(np.sign(fx[:-1]) * np.sign(fx[1:]) < 0)
+        if not len(cruces):
+            mejor = np.nanargmin(np.abs(fx)) if np.isfinite(fx).any() else 0
+            return GoalSeekResult(xs[mejor], fx[mejor] + target, False, iteracion, evaluaciones,
+                                  f"El KPI no cruza {target:,.2f} con {driver} en [{lo:,.2f}, {hi:,.2f}]; "
+                                  "se devuelve el valor más cercano", curva)
+        i = cruces[0]
+        lo, hi = xs[i], xs[i + 1]
+        if hi - lo <= xtol:
+            break
+
+    # Interpolación lineal dentro del último tramo
+    f_lo, f_hi = fx[i], fx[i + 1]
+    valor = lo - f_lo * (hi - lo) / (f_hi - f_lo)
+    kpi_final = f(np.array([valor]))[0] + target
+    evaluaciones += 1
+    convergio = hi - lo <= xtol or abs(kpi_final - target) <= ftol
+    mensaje = "Objetivo alcanzado" if convergio else f"Límite de {max_iter} iteraciones (intervalo {hi - lo:.2e})"
+    return GoalSeekResult(valor, kpi_final, convergio, iteracion, evaluaciones, mensaje, curva)
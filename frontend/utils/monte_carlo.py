@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from frontend.utils.debt_engine import debt_book_schedule
+from frontend.utils.financial_logic import ITEM, annualize, monthly_index, run_scenarios
+
+# Modo estocástico de la proyección: los drivers se muestrean de distribuciones configurables
+# (correlacionadas vía cópula gaussiana) y todos los caminos pasan juntos por run_scenarios.
+#   normal:     media = valor base, 'sd' en puntos porcentuales
+#   lognormal:  misma media y 'sd', pero siempre positiva (tasas que no pueden ser negativas)
+#   triangular: 'min' / 'max' absolutos, moda = valor base
+
+DEFAULT_DISTRIBUTIONS = {
+    'rev_rate':       {'dist': 'normal', 'sd': 2.0},
+    'cof_rate':       {'dist': 'normal', 'sd': 1.0},
+    'provision_rate': {'dist': 'lognormal', 'sd': 0.5},
+    'rec_npa_rate':   {'dist': 'normal', 'sd': 3.0},
+}
+
+# Pares no listados: independientes
+DEFAULT_CORRELATION = {
+    ('rev_rate', 'cof_rate'): 0.5,
+    ('rev_rate', 'provision_rate'): 0.3,
+    ('provision_rate', 'rec_npa_rate'): -0.4,
+}
+
+# Rango válido de cada driver (en sus unidades): las colas de una normal no deben producir
+# tasas negativas ni un recupero NPA > 100 % (saldos negativos / NaN)
+VALID_RANGES = {
+    'fiu_perf_start': (0, None), 'fiu_npa_start': (0, None), 'new_debt_amount': (0, None),
+    'new_debt_rate': (0, None), 'rev_rate': (0, None), 'cof_rate': (0, None), 'provision_rate': (0, None),
+    'rec_npa_rate': (0, 100), 'opex_pct': (0, None), 'tax_rate': (0, 100),
+}
+
+# Los caminos se simulan por trozos: solo se conservan las métricas, no el cubo completo
+CHUNK_PATHS = 20_000
+MAX_PATHS = 100_000
+
+PERCENTILES = (5, 50, 95)
+# Métricas con bandas: nombre -> función sobre el cubo (S, periodos, líneas)
+BAND_METRICS = {
+    'EBITDA': lambda c: c[:, :, ITEM['EBITDA']],
+    'Utilidad Neta': lambda c: c[:, :, ITEM['Earnings']],
+    'FIU Total': lambda c: c[:, :, ITEM['FIU Performing']] + c[:, :, ITEM['FIU NPA']],
+}
+
+
+def correlation_matrix(nombres, correlacion=None):
+    """Matriz de correlación a partir de pares {(a, b): rho}; ValueError si no es válida."""
+    idx = {n: k for k, n in enumerate(nombres)}
+    corr = np.eye(len(nombres))
+    for (a, b), rho in (correlacion or {}).items():
+        if a in idx and b in idx and a != b:
+            corr[idx[a], idx[b]] = corr[idx[b], idx[a]] = rho
+    if np.any(np.abs(corr) > 1) or np.linalg.eigvalsh(corr).min() < -1e-10:
+        raise ValueError("La matriz de correlación de los drivers no es definida positiva")
+    return corr
+
+
+def _marginal(z, base, spec):
+    dist = spec.get('dist', 'normal')
+    media = spec.get('mean', base)
+    if dist == 'normal':
+        return media + spec.get('sd', 0.0) * z
+    if dist == 'lognormal':
+        if media <= 0:
+            raise ValueError(f"La distribución lognormal requiere media positiva (recibido {media})")
+        sigma2 = np.log1p((spec.get('sd', 0.0) / media) ** 2)
+        return np.exp(np.log(media) - sigma2 / 2 + np.sqrt(sigma2) * z)
+    if dist == 'triangular':
+        a, b, c = spec['min'], spec['max'], spec.get('mode', base)
+        if not a <= c <= b or a == b:
+            raise ValueError(f"Triangular inválida: min={a}, moda={c}, max={b}")
+        u = ndtr(z)
+        corte = (c - a) / (b - a)
+        return np.where(u < corte, a + np.sqrt(u * (b - a) * (c - a)), b - np.sqrt((1 - u) * (b - a) * (b - c)))
+    raise ValueError(f"Distribución desconocida: {dist}. Opciones: normal, lognormal, triangular")
+
+
+def sample_drivers(base, distributions=None, correlation=None, n_paths=10000, seed=42):
+    """Muestras de los drivers estocásticos: {driver: array(n_paths)}."""
+    distributions = DEFAULT_DISTRIBUTIONS if distributions is None else distributions
+    correlation = DEFAULT_CORRELATION if correlation is None else correlation
+    nombres = list(distributions)
+    if not nombres:
+        return {}
+    chol = np.linalg.cholesky(correlation_matrix(nombres, correlation) + 1e-12 * np.eye(len(nombres)))
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((n_paths, len(nombres))) @ chol.T
+    return {n: _clip(n, _marginal(z[:, k], float(base[n]), distributions[n])) for k, n in enumerate(nombres)}
+
+
+def _clip(driver, valores):
+    lo, hi = VALID_RANGES.get(driver, (None, None))
+    return np.clip(valores, lo, hi) if lo is not None or hi is not None else valores
+
+
+def _bands(valores, periodos, percentiles):
+    q = np.percentile(valores, percentiles, axis=0)
+    return pd.DataFrame(q.T, index=periodos, columns=[f"P{p}" for p in percentiles])
+
+
+def run_monte_carlo(params, distributions=None, correlation=None, n_paths=10000, seed=42,
+                    percentiles=PERCENTILES, period_type='Anual'):
+    """
+    Simulación Monte Carlo de run_financial_model. `params` son los mismos argumentos del modelo
+    determinístico (incluida df_current_debt). Devuelve un dict con:
+      'bandas':  {métrica: DataFrame periodos x P5/P50/P95}
+      'resumen': percentiles de utilidad neta acumulada y FIU final, más probabilidad de pérdida
+      'drivers': DataFrame con los drivers muestreados (un camino por fila)
+    """
+    params = dict(params)
+    df_debt = params.pop('df_current_debt', None)
+    plazo_anos = params.pop('plazo_anos')
+    total_meses = int(plazo_anos * 12)
+
+    if n_paths > MAX_PATHS:
+        raise ValueError(f"Máximo {MAX_PATHS:,} caminos (recibido {n_paths:,})")
+    muestras = sample_drivers(params, distributions, correlation, n_paths, seed)
+    # La deuda actual no depende de los drivers: se calcula una sola vez
+    int_actual = debt_book_schedule(df_debt, horizonte=total_meses).total_interes
+    rng = monthly_index(total_meses)
+    periodos = rng.strftime('%b-%y') if period_type == 'Mensual' else None
+
+    # Por trozos de CHUNK_PATHS caminos: el cubo (caminos x meses x líneas) nunca está entero en memoria
+    metricas = {m: [] for m in BAND_METRICS}
+    utilidad_acum, fiu_final = [], []
+    for i in range(0, n_paths, CHUNK_PATHS):
+        trozo = {k: v[i:i + CHUNK_PATHS] for k, v in muestras.items()}
+        cubo = run_scenarios(plazo_anos, **{**params, **trozo}, int_actual=int_actual)
+        if period_type == 'Mensual':
+            cubo_vista = cubo
+        else:
+            cubo_vista, periodos = annualize(cubo, rng)
+        for m, f in BAND_METRICS.items():
+            metricas[m].append(f(cubo_vista).astype(np.float32))
+        utilidad_acum.append(cubo[:, :, ITEM['Earnings']].sum(axis=1))
+        fiu_final.append(BAND_METRICS['FIU Total'](cubo)[:, -1])
+        del cubo, cubo_vista  # liberar antes del siguiente trozo
+    utilidad_acum, fiu_final = np.concatenate(utilidad_acum), np.concatenate(fiu_final)
+
+    resumen = _bands(np.column_stack([utilidad_acum, fiu_final]),
+                     ['Utilidad Neta Acumulada', 'FIU Final'], percentiles)
+    resumen['Media'] = [utilidad_acum.mean(), fiu_final.mean()]
+    return {
+        'bandas': {m: _bands(np.vstack(v), periodos, percentiles) for m, v in metricas.items()},
+        'resumen': resumen,
+        'prob_perdida': float((utilidad_acum < 0).mean()),
+        'drivers': pd.DataFrame(muestras),
+    }
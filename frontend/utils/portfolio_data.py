@@ -0,0 +1,50 @@
+import pandas as pd
+
+# Datos base de la cartera y de la deuda vigente (valores por defecto del simulador cuando no hay
+# parámetros guardados en parametros_financieros) y supuestos operativos por defecto.
+
+# --- 1. DATOS BASE FIU (Cartera) ---
+BASE_DATA = {
+    "Regional": {"perf": 531.41, "npa": 71.30},
+    "Chile":    {"perf": 86.17, "npa": 21.28},
+    "Perú":     {"perf": 30.67, "npa": 21.95},
+    "Colombia": {"perf": 97.25, "npa": 9.63},
+    "Brasil":   {"perf": 9.32, "npa": 18.44}
+}
+
+# --- 2. DATOS DEUDA REAL ---
+REAL_DEBT_DATA = [
+    {"Country": "Chile", "Type": "Banking", "USD Balance Equiv": 2777178, "Weighted average annual rate": 7.45, "Plazo": 3},
+    {"Country": "Chile", "Type": "B-Notes", "USD Balance Equiv": 835000, "Weighted average annual rate": 11.00, "Plazo": 3},
+    {"Country": "Chile", "Type": "Bond", "USD Balance Equiv": 12186466, "Weighted average annual rate": 11.13, "Plazo": 5},
+    {"Country": "Chile", "Type": "FIP LTC I", "USD Balance Equiv": 5140426, "Weighted average annual rate": 10.82, "Plazo": 4},
+    {"Country": "Chile", "Type": "Intermediation", "USD Balance Equiv": 35995050, "Weighted average annual rate": 8.05, "Plazo": 1},
+    {"Country": "Colombia", "Type": "Banking", "USD Balance Equiv": 9827044, "Weighted average annual rate": 11.13, "Plazo": 3},
+    {"Country": "Colombia", "Type": "Intermediation", "USD Balance Equiv": 385569, "Weighted average annual rate": 14.92, "Plazo": 1},
+    {"Country": "EEUU", "Type": "NATF", "USD Balance Equiv": 78100000, "Weighted average annual rate": 10.00, "Plazo": 5},
+    {"Country": "EEUU", "Type": "Senior Note", "USD Balance Equiv": 364304846, "Weighted average annual rate": 4.72, "Plazo": 7},
+    {"Country": "EEUU", "Type": "Sp Mbr C", "USD Balance Equiv": 7500000, "Weighted average annual rate": 10.00, "Plazo": 3},
+    {"Country": "Perú", "Type": "B-Notes", "USD Balance Equiv": 14362509, "Weighted average annual rate": 13.01, "Plazo": 3},
+]
+
+# Instrumentos emitidos a nivel EEUU (holding): se asignan a los países
+US_COUNTRY = "EEUU"
+COUNTRIES = ["Chile", "Perú", "Colombia", "Brasil"]
+
+# --- 3. SUPUESTOS OPERATIVOS POR DEFECTO (% anual y MUSD/año) ---
+DEFAULT_DRIVERS = {
+    "rev_rate": 24.0, "cof_rate": 8.6, "provision_rate": 2.1, "opex_pct": 44.0, "rec_npa_rate": 10.0,
+    "tax_rate": 27.0, "cogs_amount": 0.0, "dep_amort_amount": 1.5, "fx_impact": 0.0, "non_op_result": 0.0,
+    "new_debt_amount": 0.0, "new_debt_rate": 10.0, "new_debt_type": "Amortizado",
+}
+
+
+def debt_terms(pais, tipo, tasa_default=10.0, plazo_default=3):
+    """Tasa y plazo de referencia de un instrumento: el del país, si no el promedio del tipo."""
+    df = pd.DataFrame(REAL_DEBT_DATA)
+    fila = df[(df["Country"] == pais) & (df["Type"] == tipo)]
+    if fila.empty:
+        fila = df[df["Type"] == tipo]
+    if fila.empty:
+        return tasa_default, plazo_default
+    return float(fila["Weighted average annual rate"].mean()), float(fila["Plazo"].mean())
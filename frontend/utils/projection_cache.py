@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from frontend.utils.financial_logic import DRIVERS, format_pnl_display, run_financial_model
+
+# Memoización de la proyección: resultados de run_financial_model y format_pnl_display indexados
+# por la huella de TODOS los inputs (drivers escalares + contenido de la tabla de deuda).
+# La caché es del proceso, así que la comparten todas las sesiones de Streamlit; LRU acotada.
+
+PROJECTION_CACHE_SIZE = 64
+
+
+class LRUCache:
+    """Diccionario acotado con desalojo LRU, seguro entre hilos (una sesión de Streamlit = un hilo)."""
+
+    def __init__(self, maxsize=PROJECTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, fn):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # Se calcula fuera del lock: dos sesiones con la misma clave calculan dos veces (inofensivo)
+        value = fn()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_model_cache = LRUCache()
+_pnl_cache = LRUCache()
+
+
+def _scalar(v):
+    return v if isinstance(v, str) else float(v)
+
+
+def projection_fingerprint(params):
+    """Huella estable de los inputs del modelo: 24 y 24.0 dan la misma clave."""
+    h = hashlib.sha256()
+    escalares = {k: _scalar(params[k]) for k in ['plazo_anos'] + DRIVERS}
+    # Las fechas de la proyección parten de hoy: un resultado de ayer no sirve
+    escalares['fecha'] = str(pd.Timestamp.now().date())
+    h.update(json.dumps(escalares, sort_keys=True).encode())
+    df = params.get('df_current_debt')
+    if df is not None and not df.empty:
+        h.update(json.dumps([str(c) for c in df.columns]).encode())
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def cached_financial_model(params, graph=None):
+    """
+    run_financial_model(**params) memoizado. Devuelve (df_mensual, df_anual) como copias.
+    Con `graph` (ProjectionGraph de la sesión) los fallos de caché se recalculan de forma incremental.
+    """
+    key = projection_fingerprint(params)
+    compute = (lambda: graph.run(params)) if graph is not None else (lambda: run_financial_model(**params))
+    df_m, df_a = _model_cache.get_or_compute(key, compute)
+    return df_m.copy(), df_a.copy()
+
+
+def cached_pnl_display(params, period_type='Anual', graph=None):
+    """P&L vertical (format_pnl_display) memoizado por huella de inputs y tipo de periodo."""
+    key = (projection_fingerprint(params), period_type)
+
+    def compute():
+        df_m, df_a = cached_financial_model(params, graph)
+        return format_pnl_display(df_m if period_type == 'Mensual' else df_a, period_type)
+
+    return _pnl_cache.get_or_compute(key, compute).copy()
+
+
+def cache_stats():
+    return {nombre: {"entradas": len(c), "hits": c.hits, "misses": c.misses}
+            for nombre, c in [("modelo", _model_cache), ("pnl", _pnl_cache)]}
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+from frontend.utils.debt_engine import amortization_schedule, debt_book_schedule
+from frontend.utils.financial_logic import BALANCE_ITEMS, DRIVERS, LINE_ITEMS, monthly_index
+
+# Proyección como grafo de dependencias entre líneas del P&L, con recálculo incremental:
+#   revenue -> gross income -> EBITDA -> EBT -> taxes -> earnings -> FIU (retroalimenta el mes siguiente)
+# Al cambiar un input solo se recalculan los nodos aguas abajo. Para el ciclo del FIU se hace un
+# pase vectorizado con los saldos anteriores: los meses cuyo FIU de cierre no cambia quedan tal
+# cual y la recurrencia mes a mes arranca en el primer mes que sí cambia.
+
+# Nodos "fuente": series completas calculadas de una vez (las más costosas: calendarios de deuda)
+SOURCES = {
+    'int_actual': (['df_current_debt', 'plazo_anos'],
+                   lambda p, T: {'int_actual': debt_book_schedule(p['df_current_debt'], horizonte=T).total_interes}),
+    'deuda_nueva': (['new_debt_amount', 'new_debt_rate', 'new_debt_type', 'plazo_anos'],
+                    lambda p, T: _new_debt(p, T)),
+    'npa': (['fiu_npa_start', 'rec_npa_rate', 'plazo_anos'],
+            lambda p, T: _npa(p, T)),
+}
+# Series que produce cada fuente
+SOURCE_OUTPUTS = {'int_actual': ['int_actual'], 'deuda_nueva': ['int_new', 'amort_new'],
+                  'npa': ['npa_inicio', 'npa_fin']}
+
+# Líneas mensuales: nombre -> (dependencias, f(valores, params, meses)) en orden topológico.
+# Las dependencias pueden ser nodos o drivers.
+NODES = {
+    'cogs':           (['cogs_amount'], lambda v, p, m: _const(p['cogs_amount'] / 12, m)),
+    'dep_amort':      (['dep_amort_amount'], lambda v, p, m: _const(p['dep_amort_amount'] / 12, m)),
+    'fx':             (['fx_impact'], lambda v, p, m: _const(p['fx_impact'] / 12, m)),
+    'non_op':         (['non_op_result'], lambda v, p, m: _const(p['non_op_result'] / 12, m)),
+    'int_total':      (['int_actual', 'int_new'], lambda v, p, m: v['int_actual'][m] + v['int_new'][m]),
+    'recup':          (['npa_inicio', 'rec_npa_rate'], lambda v, p, m: v['npa_inicio'][m] * _r_rec(p)),
+    # --- Ciclo del FIU: dependen del saldo de inicio de mes ---
+    'revenue':        (['fiu_inicio', 'rev_rate'], lambda v, p, m: v['fiu_inicio'][m] * (p['rev_rate'] / 100 / 12)),
+    'cof':            (['fiu_inicio', 'cof_rate'], lambda v, p, m: v['fiu_inicio'][m] * (p['cof_rate'] / 100 / 12)),
+    'prov':           (['fiu_inicio', 'npa_inicio', 'provision_rate'],
+                       lambda v, p, m: (v['fiu_inicio'][m] + v['npa_inicio'][m]) * (p['provision_rate'] / 100 / 12)),
+    'gross_income':   (['revenue', 'prov', 'cof', 'cogs'],
+                       lambda v, p, m: v['revenue'][m] - v['prov'][m] - v['cof'][m] - v['cogs'][m]),
+    'opex':           (['revenue', 'opex_pct'], lambda v, p, m: v['revenue'][m] * (p['opex_pct'] / 100)),
+    'ebitda':         (['gross_income', 'opex'], lambda v, p, m: v['gross_income'][m] - v['opex'][m]),
+    'ebt':            (['ebitda', 'dep_amort', 'fx', 'non_op', 'int_total'],
+                       lambda v, p, m: v['ebitda'][m] - v['dep_amort'][m] + v['fx'][m] + v['non_op'][m] - v['int_total'][m]),
+    'tax':            (['ebt', 'tax_rate'], lambda v, p, m: np.maximum(0, v['ebt'][m] * (p['tax_rate'] / 100))),
+    'earnings':       (['ebt', 'tax'], lambda v, p, m: v['ebt'][m] - v['tax'][m]),
+    'fiu_fin':        (['fiu_inicio', 'earnings', 'dep_amort', 'recup', 'amort_new'],
+                       lambda v, p, m: v['fiu_inicio'][m] + v['earnings'][m] + v['dep_amort'][m] + v['recup'][m] - v['amort_new'][m]),
+}
+
+# Línea del P&L -> (nodo, signo)
+PNL_MAP = {
+    'FIU Performing': ('fiu_fin', 1), 'FIU NPA': ('npa_fin', 1), 'Revenues': ('revenue', 1),
+    'Provisions': ('prov', -1), 'COF': ('cof', -1), 'COGS': ('cogs', -1), 'Gross Income': ('gross_income', 1),
+    'OPEX': ('opex', -1), 'EBITDA': ('ebitda', 1), 'Dep & Amort': ('dep_amort', -1), 'Exchange Rates': ('fx', 1),
+    'Non Operating': ('non_op', 1), 'Financial Expenses': ('int_total', -1), 'EBT': ('ebt', 1),
+    'Taxes': ('tax', -1), 'Earnings': ('earnings', 1),
+}
+INPUTS = ['plazo_anos'] + DRIVERS + ['df_current_debt']
+
+
+def _const(x, m):
+    return np.full(m.stop - m.start, float(x))
+
+
+def _r_rec(p):
+    return 1 - (1 - p['rec_npa_rate'] / 100) ** (1 / 12)
+
+
+def _new_debt(p, T):
+    # La deuda nueva vence al final del horizonte (cuota francesa o bullet)
+    d = amortization_schedule(p['new_debt_amount'], p['new_debt_rate'], p['plazo_anos'],
+                              tipo=p['new_debt_type'], horizonte=T)
+    return {'int_new': d.total_interes, 'amort_new': d.total_capital}
+
+
+def _npa(p, T):
+    fin = p['fiu_npa_start'] * np.cumprod(np.full(T, 1 - _r_rec(p)))
+    return {'npa_inicio': np.r_[p['fiu_npa_start'], fin[:-1]], 'npa_fin': fin}
+
+
+def _downstream(nodes_and_inputs):
+    """Nodos de NODES afectados (transitivamente) por los nodos/inputs dados, en orden topológico."""
+    sucio = set(nodes_and_inputs)
+    for nodo, (deps, _) in NODES.items():
+        if sucio.intersection(deps):
+            sucio.add(nodo)
+    return [n for n in NODES if n in sucio]
+
+
+# Nodos del ciclo: los que dependen del FIU de inicio de mes (incluye fiu_fin)
+CYCLE = _downstream(['fiu_inicio'])
+
+
+def _same(a, b):
+    if isinstance(a, pd.DataFrame) or isinstance(b, pd.DataFrame):
+        return isinstance(a, pd.DataFrame) and isinstance(b, pd.DataFrame) and a.equals(b)
+    return a is b or a == b
+
+
+class ProjectionGraph:
+    """
+    Modelo de run_financial_model con recálculo incremental. Uso:
+        g = ProjectionGraph()
+        df_m, df_a = g.run(params)          # primera vez: todo
+        df_m, df_a = g.run({**params, 'tax_rate': 30})   # solo impuestos y lo que cambie aguas abajo
+    `ultimo_recalculo` describe qué se recalculó en la última ejecución.
+    """
+
+    def __init__(self):
+        self.params = None
+        self.valores = {}
+        self.ultimo_recalculo = {}
+
+    def _changed(self, params):
+        if self.params is None:
+            return set(INPUTS)
+        return {k for k in INPUTS if not _same(params.get(k), self.params.get(k))}
+
+    def update(self, params):
+        """Aplica los inputs nuevos y recalcula solo lo necesario. Devuelve los inputs que cambiaron."""
+        cambios = self._changed(params)
+        self.params = {k: params.get(k) for k in INPUTS}
+        if not cambios:
+            self.ultimo_recalculo = {'inputs': [], 'fuentes': [], 'nodos': [], 'desde_mes': None}
+            return cambios
+        p, v = self.params, self.valores
+        T = int(p['plazo_anos'] * 12)
+        if 'plazo_anos' in cambios:
+            cambios = set(INPUTS)
+
+        # 1. Fuentes (calendarios de deuda, NPA): solo si cambió alguno de sus inputs
+        fuentes = [f for f, (deps, _) in SOURCES.items() if cambios.intersection(deps)]
+        for f in fuentes:
+            v.update(SOURCES[f][1](p, T))
+        sucios = _downstream(cambios | {s for f in fuentes for s in SOURCE_OUTPUTS[f]})
+
+        # 2. Nodos fuera del ciclo: vectorizados sobre todos los meses
+        todos = slice(0, T)
+        for nodo in sucios:
+            if nodo not in CYCLE:
+                v[nodo] = NODES[nodo][1](v, p, todos)
+
+        # 3. Ciclo del FIU
+        desde = None
+        if 'fiu_perf_start' in cambios or 'fiu_inicio' not in v:
+            desde = 0
+            for nodo in CYCLE:
+                v[nodo] = np.empty(T)
+            v['fiu_inicio'] = np.empty(T)
+        elif any(n in CYCLE for n in sucios):
+            # Pase vectorizado con los saldos de inicio anteriores: los meses hasta el primer
+            # FIU de cierre distinto quedan correctos tal cual
+            fiu_fin_anterior = v['fiu_fin']
+            for nodo in CYCLE:
+                if nodo in sucios:
+                    v[nodo] = NODES[nodo][1](v, p, todos)
+            distintos = np.flatnonzero(v['fiu_fin'] != fiu_fin_anterior)
+            if len(distintos) and distintos[0] + 1 < T:
+                desde = int(distintos[0]) + 1
+
+        if desde is not None:
+            for t in range(desde, T):
+                v['fiu_inicio'][t] = p['fiu_perf_start'] if t == 0 else v['fiu_fin'][t - 1]
+                mes = slice(t, t + 1)
+                for nodo in CYCLE:
+                    v[nodo][mes] = NODES[nodo][1](v, p, mes)
+
+        if desde is not None:
+            sucios = _downstream(set(sucios) | {'fiu_inicio'})
+        self.ultimo_recalculo = {'inputs': sorted(cambios), 'fuentes': fuentes, 'nodos': sucios, 'desde_mes': desde}
+        return cambios
+
+    def monthly(self):
+        """Matriz (meses, len(LINE_ITEMS)) en el mismo orden que run_scenarios."""
+        return np.column_stack([self.valores[PNL_MAP[c][0]] * PNL_MAP[c][1] for c in LINE_ITEMS])
+
+    def run(self, params):
+        """Igual que run_financial_model(**params): (df_mensual, df_anual)."""
+        self.update(params)
+        df_res = pd.DataFrame(self.monthly(), index=monthly_index(int(self.params['plazo_anos'] * 12)),
+                              columns=LINE_ITEMS)
+        df_yr = df_res.resample('YE').sum()
+        for col in BALANCE_ITEMS:
+            df_yr[col] = df_res[col].resample('YE').last()
+        return df_res, df_yr
@@ -0,0 +1,129 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from frontend.utils.debt_engine import debt_book_schedule
+from frontend.utils.financial_logic import DRIVERS, ITEM, run_scenarios
+
+# Sensibilidad de la proyección: barrido uno-a-la-vez (tornado) y grilla 2-D (heat map) sobre los
+# drivers de run_financial_model. Todos los escenarios se evalúan en lote con run_scenarios; las
+# grillas grandes se reparten en trozos entre procesos.
+
+# Variación por defecto de cada driver: ('abs', x) = +/- x en sus unidades (pp o MUSD);
+# ('pct', x) = +/- x % del valor base
+DEFAULT_SPANS = {
+    'fiu_perf_start':   ('pct', 10),
+    'fiu_npa_start':    ('pct', 10),
+    'new_debt_amount':  ('abs', 10),
+    'new_debt_rate':    ('abs', 2),
+    'rev_rate':         ('abs', 2),
+    'cof_rate':         ('abs', 1),
+    'provision_rate':   ('abs', 0.5),
+    'rec_npa_rate':     ('abs', 3),
+    'opex_pct':         ('abs', 5),
+    'tax_rate':         ('abs', 3),
+    'cogs_amount':      ('abs', 0.5),
+    'dep_amort_amount': ('abs', 0.5),
+    'fx_impact':        ('abs', 1),
+    'non_op_result':    ('abs', 1),
+}
+NUMERIC_DRIVERS = [d for d in DRIVERS if d != 'new_debt_type']
+# Drivers que no pueden ser negativos (el barrido se recorta en 0)
+NON_NEGATIVE = {'fiu_perf_start', 'fiu_npa_start', 'new_debt_amount', 'new_debt_rate', 'tax_rate'}
+OUTPUTS = ['Utilidad Neta Acumulada', 'FIU Final']
+# Arrancar procesos 'spawn' cuesta segundos; en lote se evalúan ~150k escenarios/s por núcleo
+PARALLEL_MIN_SCENARIOS = 500_000
+
+
+def driver_range(driver, base, span=None, steps=2, scale=1.0):
+    """Valores del barrido para un driver: `steps` puntos entre base - delta y base + delta."""
+    tipo, x = span or DEFAULT_SPANS[driver]
+    delta = abs(base) * x / 100 if tipo == 'pct' else x
+    valores = np.linspace(base - delta * scale, base + delta * scale, steps)
+    return np.maximum(valores, 0) if driver in NON_NEGATIVE else valores
+
+
+def _outputs(cubo):
+    utilidad = cubo[:, :, ITEM['Earnings']].sum(axis=1)
+    fiu = cubo[:, -1, ITEM['FIU Performing']] + cubo[:, -1, ITEM['FIU NPA']]
+    return np.column_stack([utilidad, fiu])
+
+
+def _evaluate_chunk(task):
+    plazo_anos, params, overrides, int_actual = task
+    return _outputs(run_scenarios(plazo_anos, **{**params, **overrides}, int_actual=int_actual))
+
+
+def evaluate(params, overrides, workers=0, chunk_size=20_000):
+    """
+    Evalúa un lote de escenarios: `params` son los argumentos de run_financial_model y
+    `overrides` {driver: array(S)} los valores que cambian. Devuelve array (S, 2) con
+    utilidad neta acumulada y FIU final. Con workers > 0 y lotes grandes usa un pool de procesos.
+    """
+    params = dict(params)
+    plazo_anos = params.pop('plazo_anos')
+    int_actual = debt_book_schedule(params.pop('df_current_debt', None), horizonte=int(plazo_anos * 12)).total_interes
+    n_esc = len(next(iter(overrides.values()))) if overrides else 1
+    trozos = [(plazo_anos, params, {k: v[i:i + chunk_size] for k, v in overrides.items()}, int_actual)
+              for i in range(0, n_esc, chunk_size)]
+    if workers and n_esc >= PARALLEL_MIN_SCENARIOS:
+        # 'spawn' por consistencia con el backend (no hereda el estado de Streamlit)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return np.vstack(list(pool.map(_evaluate_chunk, trozos)))
+    return np.vstack([_evaluate_chunk(t) for t in trozos])
+
+
+def one_at_a_time(params, drivers=None, spans=None, steps=5, scale=1.0, workers=0):
+    """
+    Barrido uno-a-la-vez: cada driver recorre su rango con el resto en el valor base.
+    Todos los barridos van en un solo lote. Devuelve DataFrame (driver, valor, salidas...).
+    """
+    drivers = drivers or NUMERIC_DRIVERS
+    spans = {**DEFAULT_SPANS, **(spans or {})}
+    filas, overrides = [], {d: [] for d in drivers}
+    for d in drivers:
+        for v in driver_range(d, float(params[d]), spans[d], steps, scale):
+            filas.append((d, v))
+            for otro in drivers:
+                overrides[otro].append(v if otro == d else float(params[otro]))
+    res = evaluate(params, {d: np.asarray(v) for d, v in overrides.items()}, workers)
+    out = pd.DataFrame(filas, columns=['driver', 'valor'])
+    out[OUTPUTS] = res
+    return out
+
+
+def tornado(params, output='Utilidad Neta Acumulada', drivers=None, spans=None, scale=1.0):
+    """
+    Datos del tornado para una salida: por driver, el resultado en el extremo bajo y alto del
+    rango y la amplitud, ordenados de mayor a menor impacto.
+    """
+    barrido = one_at_a_time(params, drivers, spans, steps=2, scale=scale)
+    base = evaluate(params, {})[0, OUTPUTS.index(output)]
+    bajo = barrido.groupby('driver', sort=False).nth(0).set_index('driver')
+    alto = barrido.groupby('driver', sort=False).nth(1).set_index('driver')
+    out = pd.DataFrame({
+        'valor_bajo': bajo['valor'], 'valor_alto': alto['valor'],
+        'resultado_bajo': bajo[output], 'resultado_alto': alto[output],
+    })
+    out['impacto_bajo'] = out['resultado_bajo'] - base
+    out['impacto_alto'] = out['resultado_alto'] - base
+    out['amplitud'] = (out['resultado_alto'] - out['resultado_bajo']).abs()
+    out.attrs['base'] = base
+    return out.sort_values('amplitud', ascending=False)
+
+
+def grid(params, x_driver, x_values, y_driver, y_values, workers=0):
+    """
+    Grilla 2-D (heat map): evalúa todas las combinaciones de dos drivers.
+    Devuelve {salida: DataFrame y_values x x_values}.
+    """
+    x_values, y_values = np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float)
+    xx, yy = np.meshgrid(x_values, y_values)
+    res = evaluate(params, {x_driver: xx.ravel(), y_driver: yy.ravel()}, workers)
+    return {
+        salida: pd.DataFrame(res[:, k].reshape(yy.shape), index=pd.Index(y_values, name=y_driver),
+                             columns=pd.Index(x_values, name=x_driver))
+        for k, salida in enumerate(OUTPUTS)
+    }
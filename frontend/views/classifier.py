@@ -5,6 +5,7 @@ import plotly.express as px
 import time
 
 API_URL = "http://127.0.0.1:8000/api/v1/opex"
+JOBS_URL = "http://127.0.0.1:8000/api/v1/jobs"
 
 # --- FUNCIÓN AUXILIAR: TRAER CATEGORÍAS ---
 def get_categories():
@@ -15,6 +16,50 @@ def get_categories():
     except: pass
     return {"grupos": [], "subgrupos": []}
 
+# --- TRABAJOS EN SEGUNDO PLANO (libro completo sin bloquear la app) ---
+def render_jobs_panel():
+    st.markdown('<div class="ns-card"><h5>🏭 Clasificación masiva (libro completo)</h5>', unsafe_allow_html=True)
+    b1, b2, b3 = st.columns(3)
+    with b1:
+        if st.button("🚀 Clasificar todos los pendientes", use_container_width=True):
+            res = requests.post(JOBS_URL, json={"tipo": "clasificacion"})
+            if res.status_code == 200: st.success(f"Trabajo {res.json()['id']} lanzado")
+            else: st.warning(res.json().get("detail", "Error API"))
+    with b2:
+        if st.button("🧠 Reentrenar con correcciones", use_container_width=True):
+            res = requests.post(JOBS_URL, json={"tipo": "reentrenamiento", "parametros": {"modo": "incremental"}})
+            if res.status_code == 200: st.success(f"Trabajo {res.json()['id']} lanzado")
+            else: st.warning(res.json().get("detail", "Error API"))
+    with b3:
+        st.button("🔄 Actualizar avance", use_container_width=True)
+
+    try:
+        res = requests.get(JOBS_URL, params={"limit": 5})
+        jobs = res.json() if res.status_code == 200 else []
+    except:
+        jobs = []
+        st.error("Error API")
+
+    for job in jobs[:1]:
+        estado = job["estado"]
+        st.markdown(f"**Trabajo {job['id']}** · {job['tipo']} · estado: `{estado}`")
+        if job.get("avance") is not None:
+            st.progress(min(float(job["avance"]), 1.0))
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Filas", f"{job['procesadas'] or 0:,} / {job['total'] or 0:,}")
+        m2.metric("Filas/seg", f"{job['filas_por_seg'] or 0:,.0f}")
+        m3.metric("ETA", f"{job['eta_seg']:.0f} s" if job.get("eta_seg") is not None else "-")
+        if job.get("error"): st.error(job["error"])
+        if estado in ("pendiente", "en_curso") and st.button("⛔ Cancelar trabajo"):
+            requests.post(f"{JOBS_URL}/{job['id']}/cancel")
+            st.rerun()
+
+    if len(jobs) > 1:
+        with st.expander("Historial de trabajos"):
+            st.dataframe(pd.DataFrame(jobs)[["id", "tipo", "estado", "procesadas", "total", "segundos", "creado_en"]],
+                         use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
 def render_classifier():
     if 'df_pending' not in st.session_state: st.session_state.df_pending = None
     if 'df_predicted' not in st.session_state: st.session_state.df_predicted = None
@@ -47,6 +92,8 @@ def render_classifier():
                 except: st.error("Error API")
         st.markdown('</div>', unsafe_allow_html=True)
 
+        render_jobs_panel()
+
         if st.session_state.df_pending is not None and st.session_state.df_predicted is None:
             st.dataframe(st.session_state.df_pending[['empresa','descripcion_gasto','valor']], use_container_width=True)
             if st.button("⚡ Ejecutar IA", type="primary"):
@@ -62,11 +109,12 @@ def render_classifier():
             
             # Aquí también usamos Selectbox si quieres corregir antes de guardar
             edited_df = st.data_editor(
-                st.session_state.df_predicted[['empresa','descripcion_gasto','valor','grupo_predicho','subgrupo_predicho','confianza','id_transaccion']],
+                st.session_state.df_predicted[['empresa','descripcion_gasto','valor','grupo_predicho','subgrupo_predicho','confianza','fuente','id_transaccion']],
                 column_config={
                     "grupo_predicho": st.column_config.SelectboxColumn("Grupo", options=lista_grupos, required=True),
                     "subgrupo_predicho": st.column_config.SelectboxColumn("Subgrupo", options=lista_subgrupos, required=True),
                     "confianza": st.column_config.ProgressColumn("Confianza", format="%.1f%%"),
+                    "fuente": st.column_config.TextColumn("Origen", disabled=True),
                     "id_transaccion": st.column_config.NumberColumn("ID", disabled=True)
                 },
                 use_container_width=True
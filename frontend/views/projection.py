@@ -1,31 +1,219 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-from frontend.utils.financial_logic import run_financial_model, format_pnl_display
-
-# --- 1. DATOS BASE FIU (Cartera) ---
-BASE_DATA = {
-    "Regional": {"perf": 531.41, "npa": 71.30},
-    "Chile":    {"perf": 86.17, "npa": 21.28},
-    "Perú":     {"perf": 30.67, "npa": 21.95},
-    "Colombia": {"perf": 97.25, "npa": 9.63},
-    "Brasil":   {"perf": 9.32, "npa": 18.44}
+import plotly.graph_objects as go
+from frontend.utils.projection_cache import cached_financial_model, cached_pnl_display
+from frontend.utils.projection_graph import ProjectionGraph
+from frontend.utils.monte_carlo import DEFAULT_CORRELATION, DEFAULT_DISTRIBUTIONS, MAX_PATHS, run_monte_carlo
+from frontend.utils.sensitivity import OUTPUTS, driver_range, grid, tornado
+from frontend.utils.goal_seek import DEFAULT_BOUNDS, KPIS, goal_seek
+from frontend.utils.portfolio_data import BASE_DATA, COUNTRIES, DEFAULT_DRIVERS, REAL_DEBT_DATA
+from frontend.utils.consolidation import ALLOCATION_KEYS, CONSOLIDADO, ELIMINACIONES, consolidate
+from frontend.utils.financial_logic import format_pnl_display
+from frontend.utils.debt_ladder import gap_summary, maturity_ladder, refinancing_gap
+
+# Etiquetas de los drivers de run_financial_model para los análisis de sensibilidad
+DRIVER_LABELS = {
+    "fiu_perf_start": "FIU Performing", "fiu_npa_start": "FIU NPA",
+    "new_debt_amount": "Monto Deuda Nueva", "new_debt_rate": "Tasa Deuda Nueva",
+    "rev_rate": "Revenue Rate", "cof_rate": "COF Rate", "provision_rate": "Provisiones",
+    "rec_npa_rate": "Recupero NPA", "opex_pct": "OPEX % s/Ingresos", "tax_rate": "Tax Rate",
+    "cogs_amount": "COGS", "dep_amort_amount": "Deprec. & Amort.", "fx_impact": "FX Impact",
+    "non_op_result": "Non-Op Result",
 }
 
-# --- 2. DATOS DEUDA REAL ---
-REAL_DEBT_DATA = [
-    {"Country": "Chile", "Type": "Banking", "USD Balance Equiv": 2777178, "Weighted average annual rate": 7.45, "Plazo": 3},
-    {"Country": "Chile", "Type": "B-Notes", "USD Balance Equiv": 835000, "Weighted average annual rate": 11.00, "Plazo": 3},
-    {"Country": "Chile", "Type": "Bond", "USD Balance Equiv": 12186466, "Weighted average annual rate": 11.13, "Plazo": 5},
-    {"Country": "Chile", "Type": "FIP LTC I", "USD Balance Equiv": 5140426, "Weighted average annual rate": 10.82, "Plazo": 4},
-    {"Country": "Chile", "Type": "Intermediation", "USD Balance Equiv": 35995050, "Weighted average annual rate": 8.05, "Plazo": 1},
-    {"Country": "Colombia", "Type": "Banking", "USD Balance Equiv": 9827044, "Weighted average annual rate": 11.13, "Plazo": 3},
-    {"Country": "Colombia", "Type": "Intermediation", "USD Balance Equiv": 385569, "Weighted average annual rate": 14.92, "Plazo": 1},
-    {"Country": "EEUU", "Type": "NATF", "USD Balance Equiv": 78100000, "Weighted average annual rate": 10.00, "Plazo": 5},
-    {"Country": "EEUU", "Type": "Senior Note", "USD Balance Equiv": 364304846, "Weighted average annual rate": 4.72, "Plazo": 7},
-    {"Country": "EEUU", "Type": "Sp Mbr C", "USD Balance Equiv": 7500000, "Weighted average annual rate": 10.00, "Plazo": 3},
-    {"Country": "Perú", "Type": "B-Notes", "USD Balance Equiv": 14362509, "Weighted average annual rate": 13.01, "Plazo": 3},
-]
+
+def kpi_card(label, value, col):
+    col.markdown(f"""
+    <div style="background:white;padding:15px;border-radius:5px;border-left:4px solid #122442;box-shadow:0 1px 3px rgba(0,0,0,0.1);text-align:center;">
+        <div style="color:#666;font-size:12px;">{label}</div>
+        <div style="color:#122442;font-size:20px;font-weight:bold;">{value}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_monte_carlo(params, mc_config, view_mode):
+    """Resultados del modo estocástico: KPIs con rango P5-P95 y bandas por métrica."""
+    with st.spinner(f"Simulando {mc_config['n_paths']:,} caminos..."):
+        try:
+            res = run_monte_carlo(params, **mc_config, period_type=view_mode)
+        except ValueError as e:
+            st.error(f"❌ Configuración Monte Carlo inválida: {e}")
+            return
+
+    resumen = res['resumen']
+    col_k1, col_k2, col_k3 = st.columns(3)
+    ni, fiu = resumen.loc['Utilidad Neta Acumulada'], resumen.loc['FIU Final']
+    kpi_card("Utilidad Neta Acum. P50 (P5 / P95)", f"${ni['P50']:,.1f} M <span style='font-size:12px;color:#666'>({ni['P5']:,.1f} / {ni['P95']:,.1f})</span>", col_k1)
+    kpi_card("Prob. Pérdida Acumulada", f"{res['prob_perdida']:.1%}", col_k2)
+    kpi_card("FIU Final P50 (P5 / P95)", f"${fiu['P50']:,.1f} M <span style='font-size:12px;color:#666'>({fiu['P5']:,.1f} / {fiu['P95']:,.1f})</span>", col_k3)
+    st.write("")
+
+    for metrica, bandas in res['bandas'].items():
+        x = [str(p) for p in bandas.index]
+        fig = go.Figure([
+            go.Scatter(x=x, y=bandas['P95'], line=dict(width=0), showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=x, y=bandas['P5'], fill='tonexty', fillcolor='rgba(25,172,134,0.25)',
+                       line=dict(width=0), name='P5 - P95'),
+            go.Scatter(x=x, y=bandas['P50'], line=dict(color='#122442', width=2), name='P50'),
+        ])
+        fig.update_layout(title=f"<b>{metrica} ({view_mode})</b>", yaxis_tickformat="$,.1f", height=280,
+                          margin=dict(t=40, b=0, l=0, r=0))
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(resumen.style.format("{:,.2f}"), use_container_width=True)
+
+
+def render_sensitivity(params, sens_config):
+    """Tornado (uno-a-la-vez) y heat map 2-D para la salida elegida."""
+    salida, escala = sens_config["salida"], sens_config["escala"]
+    x_drv, y_drv, n = sens_config["x"], sens_config["y"], sens_config["puntos"]
+    if x_drv == y_drv:
+        st.warning("⚠️ Elige drivers distintos para los ejes del heat map.")
+        return
+    with st.spinner("Evaluando escenarios..."):
+        tor = tornado(params, output=salida, scale=escala)
+        mapas = grid(params, x_drv, driver_range(x_drv, float(params[x_drv]), steps=n, scale=escala),
+                     y_drv, driver_range(y_drv, float(params[y_drv]), steps=n, scale=escala),
+                     workers=sens_config["workers"])
+
+    base = tor.attrs["base"]
+    etiquetas = [DRIVER_LABELS[d] for d in tor.index][::-1]
+    fig = go.Figure([
+        go.Bar(y=etiquetas, x=tor["impacto_bajo"][::-1], base=base, orientation='h', name='Driver bajo',
+               marker_color='#FE4A49'),
+        go.Bar(y=etiquetas, x=tor["impacto_alto"][::-1], base=base, orientation='h', name='Driver alto',
+               marker_color='#19AC86'),
+    ])
+    fig.update_layout(title=f"<b>Tornado: {salida}</b> (base ${base:,.1f} M)", barmode='overlay',
+                      xaxis_tickformat="$,.1f", height=480, margin=dict(t=40, b=0, l=0, r=0))
+    st.plotly_chart(fig, use_container_width=True)
+
+    mapa = mapas[salida]
+    fig_h = go.Figure(go.Heatmap(z=mapa.values, x=np.round(mapa.columns, 2), y=np.round(mapa.index, 2),
+                                 colorscale=[[0, '#FE4A49'], [0.5, '#FFFFFF'], [1, '#19AC86']],
+                                 colorbar=dict(tickformat="$,.0f")))
+    fig_h.update_layout(title=f"<b>{salida}</b>", xaxis_title=DRIVER_LABELS[x_drv], yaxis_title=DRIVER_LABELS[y_drv],
+                        height=420, margin=dict(t=40, b=0, l=0, r=0))
+    st.plotly_chart(fig_h, use_container_width=True)
+
+    tabla = tor[["valor_bajo", "valor_alto", "resultado_bajo", "resultado_alto", "amplitud"]].copy()
+    tabla.index = [DRIVER_LABELS[d] for d in tabla.index]
+    st.dataframe(tabla.style.format("{:,.2f}"), use_container_width=True)
+
+
+def render_goal_seek(params, gs_config):
+    """Valor del driver que alcanza el KPI objetivo, con la curva KPI vs driver."""
+    try:
+        res = goal_seek(params, gs_config["driver"], gs_config["kpi"], gs_config["objetivo"],
+                        bounds=(gs_config["min"], gs_config["max"]))
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    etiqueta = DRIVER_LABELS[gs_config["driver"]]
+    col_k1, col_k2, col_k3 = st.columns(3)
+    kpi_card(f"{etiqueta} requerido", f"{res.valor:,.3f}", col_k1)
+    kpi_card(f"{gs_config['kpi']} resultante", f"{res.kpi:,.2f}", col_k2)
+    kpi_card("Evaluaciones / Iteraciones", f"{res.evaluaciones} / {res.iteraciones}", col_k3)
+    st.write("")
+    if res.convergio:
+        st.success(f"✅ {res.mensaje}")
+    else:
+        st.warning(f"⚠️ {res.mensaje}")
+
+    fig = go.Figure([go.Scatter(x=res.curva["valor"], y=res.curva["kpi"], line=dict(color='#122442'), name=gs_config["kpi"])])
+    fig.add_hline(y=gs_config["objetivo"], line_dash="dash", line_color='#FE4A49')
+    if res.convergio:
+        fig.add_vline(x=res.valor, line_dash="dot", line_color='#19AC86')
+    fig.update_layout(title=f"<b>{gs_config['kpi']} vs {etiqueta}</b>", xaxis_title=etiqueta, height=380,
+                      margin=dict(t=40, b=0, l=0, r=0), showlegend=False)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_consolidation(params, cons_config, view_mode, pais_selected):
+    """Todos los países en una llamada, deuda EEUU asignada y consolidado con eliminaciones."""
+    drivers = {k: v for k, v in params.items()
+               if k not in ("plazo_anos", "df_current_debt", "fiu_perf_start", "fiu_npa_start")
+               and not k.startswith("new_debt")}
+    # La cartera inicial y la deuda nueva editadas aplican al país seleccionado
+    entities = {p: {} for p in COUNTRIES}
+    if pais_selected in entities:
+        entities[pais_selected] = {k: params[k] for k in ("fiu_perf_start", "fiu_npa_start", "new_debt_amount",
+                                                         "new_debt_rate", "new_debt_type")}
+    # La tabla editable solo trae el libro completo en la vista Regional
+    df_debt = params["df_current_debt"] if pais_selected == "Regional" else None
+    try:
+        res = consolidate(entities, drivers, df_debt, params["plazo_anos"], cons_config["llave"],
+                          cons_config["spread"])
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    periodo = res["mensual"] if view_mode == "Mensual" else res["anual"]
+    resumen = pd.DataFrame({
+        entidad: {
+            "Utilidad Neta Acum.": df["Earnings"].sum(),
+            "EBITDA Promedio Anual": res["anual"][entidad]["EBITDA"].sum() / params["plazo_anos"],
+            "Financial Expenses Acum.": df["Financial Expenses"].sum(),
+            "FIU Final": df["FIU Performing"].iloc[-1] + df["FIU NPA"].iloc[-1],
+        }
+        for entidad, df in res["mensual"].items()
+    }).T
+    col_k1, col_k2, col_k3 = st.columns(3)
+    cons = resumen.loc[CONSOLIDADO]
+    kpi_card("Utilidad Neta Consolidada (5Y)", f"${cons['Utilidad Neta Acum.']:,.1f} M", col_k1)
+    kpi_card("Eliminaciones (Utilidad)", f"${resumen.loc[ELIMINACIONES, 'Utilidad Neta Acum.']:,.1f} M", col_k2)
+    kpi_card("FIU Final Consolidado", f"${cons['FIU Final']:,.1f} M", col_k3)
+    st.write("")
+
+    st.markdown("##### Resultados por Entidad")
+    st.dataframe(resumen.style.format("{:,.2f}"), use_container_width=True)
+    st.markdown("##### Deuda EEUU Asignada (MUSD)")
+    st.dataframe(res["asignacion"].style.format("{:,.2f}"), use_container_width=True)
+
+    st.markdown(f"##### Estado de Resultados ({view_mode})")
+    for tab, entidad in zip(st.tabs(list(periodo)), periodo):
+        with tab:
+            st.dataframe(format_pnl_display(periodo[entidad], view_mode).style.format("{:,.2f}", na_rep=""),
+                         use_container_width=True, height=600)
+
+
+def render_debt_ladder(ladder_m, ladder_a, df_gap, gap, view_mode):
+    """Escalera de vencimientos de la deuda vigente y brecha de refinanciamiento."""
+    with st.expander("🏦 Escalera de Vencimientos y Liquidez", expanded=False):
+        if ladder_a.empty:
+            st.info("No hay deuda vigente en la tabla.")
+            return
+        ladder = ladder_m.assign(Periodo=ladder_m["Periodo"].dt.strftime("%Y-%m")) if view_mode == "Mensual" else ladder_a
+        por_tipo = ladder.groupby(["Periodo", "Type"])["Capital"].sum().unstack(fill_value=0.0)
+
+        fig = go.Figure()
+        for tipo in por_tipo.columns:
+            fig.add_trace(go.Bar(x=por_tipo.index.astype(str), y=por_tipo[tipo], name=tipo))
+        fig.update_layout(barmode="stack", title="Vencimientos de Capital por Tipo (MUSD)", height=380,
+                          margin=dict(t=40, b=10), legend=dict(orientation="h"))
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.caption(
+            f"Vencen ${gap['vencimientos_horizonte']:,.1f} M dentro del horizonte proyectado; "
+            f"brecha acumulada a 12 meses ${gap['brecha_12m']:,.1f} M "
+            "(vencimientos menos flujo generado: variación del FIU Performing)."
+        )
+        fig_gap = go.Figure()
+        fig_gap.add_trace(go.Scatter(x=df_gap.index, y=df_gap["Brecha Acumulada"], name="Brecha Acumulada",
+                                     line=dict(color="#122442")))
+        fig_gap.add_trace(go.Bar(x=df_gap.index, y=df_gap["Vencimientos"], name="Vencimientos",
+                                 marker_color="#19AC86"))
+        fig_gap.update_layout(title="Brecha de Refinanciamiento (MUSD)", height=320, margin=dict(t=40, b=10),
+                              legend=dict(orientation="h"))
+        st.plotly_chart(fig_gap, use_container_width=True)
+
+        tabla = ladder.pivot_table(index=["Country", "Type"], columns="Periodo",
+                                   values=["Capital", "Intereses", "Saldo Final"], aggfunc="sum")
+        st.dataframe(tabla.style.format("{:,.2f}"), use_container_width=True)
+
 
 def render_projection():
     st.markdown('<div class="ns-card"><h4>📉 Simulador Financiero & P&L</h4>Proyección estratégica y estructura de capital.</div>', unsafe_allow_html=True)
@@ -48,6 +236,7 @@ def render_projection():
 
     with col_view:
         view_mode = st.radio("Visualización P&L:", ["Anual", "Mensual"], horizontal=True)
+        sim_mode = st.radio("Modo:", ["Determinístico", "Monte Carlo", "Sensibilidad", "Goal Seek", "Consolidado"], horizontal=True)
 
     c_left, c_right = st.columns([1, 2.5])
 
@@ -94,67 +283,129 @@ def render_projection():
         st.caption(f"Deuda Total Asignada: ${total_d:,.2f} MUSD")
 
         st.markdown("##### 3. Nueva Deuda")
-        new_debt_amt = st.number_input("Monto (MUSD)", value=0.0, min_value=0.0, step=1.0)
-        new_debt_rate = st.number_input("Tasa %", value=10.0, min_value=0.0, step=0.1)
+        new_debt_amt = st.number_input("Monto (MUSD)", value=DEFAULT_DRIVERS["new_debt_amount"], min_value=0.0, step=1.0)
+        new_debt_rate = st.number_input("Tasa %", value=DEFAULT_DRIVERS["new_debt_rate"], min_value=0.0, step=0.1)
         new_debt_type = st.selectbox("Amortización", ["Amortizado", "Bullet"])
         
         # D. Supuestos Operativos (LIBERADOS)
         with st.expander("⚙️ Drivers Operativos", expanded=False):
-            rev_rate = st.number_input("Revenue Rate %", value=24.0, min_value=-100.0, max_value=1000.0, step=0.1)
-            cof_rate = st.number_input("COF Rate %", value=8.6, min_value=-100.0, max_value=1000.0, step=0.1)
-            prov_rate = st.number_input("Provisiones %", value=2.1, min_value=-100.0, max_value=1000.0, step=0.1)
-            opex_pct = st.number_input("OPEX % s/Ingresos", value=44.0, min_value=-100.0, max_value=1000.0, step=0.1)
-            rec_npa = st.number_input("Recupero NPA %", value=10.0, min_value=-100.0, max_value=1000.0, step=0.1)
-            tax_rate = st.number_input("Tax Rate %", value=27.0, min_value=0.0, max_value=100.0, step=0.1)
+            rev_rate = st.number_input("Revenue Rate %", value=DEFAULT_DRIVERS["rev_rate"], min_value=-100.0, max_value=1000.0, step=0.1)
+            cof_rate = st.number_input("COF Rate %", value=DEFAULT_DRIVERS["cof_rate"], min_value=-100.0, max_value=1000.0, step=0.1)
+            prov_rate = st.number_input("Provisiones %", value=DEFAULT_DRIVERS["provision_rate"], min_value=-100.0, max_value=1000.0, step=0.1)
+            opex_pct = st.number_input("OPEX % s/Ingresos", value=DEFAULT_DRIVERS["opex_pct"], min_value=-100.0, max_value=1000.0, step=0.1)
+            rec_npa = st.number_input("Recupero NPA %", value=DEFAULT_DRIVERS["rec_npa_rate"], min_value=-100.0, max_value=1000.0, step=0.1)
+            tax_rate = st.number_input("Tax Rate %", value=DEFAULT_DRIVERS["tax_rate"], min_value=0.0, max_value=100.0, step=0.1)
             
         with st.expander("📉 P&L Items (MUSD/Año)", expanded=False):
-            cogs = st.number_input("COGS", value=0.0, step=0.1)
-            dep = st.number_input("Deprec. & Amort.", value=1.5, step=0.1)
-            fx = st.number_input("FX Impact", value=0.0, step=0.1)
-            non_op = st.number_input("Non-Op Result", value=0.0, step=0.1)
+            cogs = st.number_input("COGS", value=DEFAULT_DRIVERS["cogs_amount"], step=0.1)
+            dep = st.number_input("Deprec. & Amort.", value=DEFAULT_DRIVERS["dep_amort_amount"], step=0.1)
+            fx = st.number_input("FX Impact", value=DEFAULT_DRIVERS["fx_impact"], step=0.1)
+            non_op = st.number_input("Non-Op Result", value=DEFAULT_DRIVERS["non_op_result"], step=0.1)
+
+        mc_config = None
+        if sim_mode == "Monte Carlo":
+            with st.expander("🎲 Monte Carlo (Desv. estándar, pp)", expanded=True):
+                n_paths = st.number_input("Caminos", value=10000, min_value=100, max_value=MAX_PATHS, step=1000)
+                seed = st.number_input("Semilla", value=42, min_value=0, step=1)
+                distributions = {}
+                for driver, label in [("rev_rate", "Revenue Rate"), ("cof_rate", "COF Rate"),
+                                      ("provision_rate", "Provisiones"), ("rec_npa_rate", "Recupero NPA")]:
+                    spec = DEFAULT_DISTRIBUTIONS[driver]
+                    sd = st.number_input(f"σ {label} ({spec['dist']})", value=spec['sd'], min_value=0.0, step=0.1)
+                    distributions[driver] = {**spec, 'sd': sd}
+                rho = st.slider("Correlación Revenue / COF", -1.0, 1.0, DEFAULT_CORRELATION[('rev_rate', 'cof_rate')], 0.05)
+            mc_config = {"n_paths": int(n_paths), "seed": int(seed), "distributions": distributions,
+                         "correlation": {**DEFAULT_CORRELATION, ('rev_rate', 'cof_rate'): rho}}
+
+        sens_config = None
+        if sim_mode == "Sensibilidad":
+            with st.expander("🌪️ Sensibilidad", expanded=True):
+                drivers = list(DRIVER_LABELS)
+                salida = st.selectbox("Resultado", OUTPUTS)
+                escala = st.slider("Amplitud del rango (x rango por defecto)", 0.5, 3.0, 1.0, 0.25)
+                x_drv = st.selectbox("Heat map: eje X", drivers, index=drivers.index("rev_rate"), format_func=DRIVER_LABELS.get)
+                y_drv = st.selectbox("Heat map: eje Y", drivers, index=drivers.index("cof_rate"), format_func=DRIVER_LABELS.get)
+                puntos = st.number_input("Puntos por eje", value=21, min_value=3, max_value=1001, step=2)
+            sens_config = {"salida": salida, "escala": escala, "x": x_drv, "y": y_drv, "puntos": int(puntos),
+                           "workers": os.cpu_count() or 1}
+
+        gs_config = None
+        if sim_mode == "Goal Seek":
+            with st.expander("🎯 Goal Seek", expanded=True):
+                drivers = list(DRIVER_LABELS)
+                gs_kpi = st.selectbox("KPI objetivo", list(KPIS))
+                gs_target = st.number_input("Valor objetivo", value=0.0, step=1.0)
+                gs_driver = st.selectbox("Driver a ajustar", drivers, index=drivers.index("opex_pct"), format_func=DRIVER_LABELS.get)
+                lo, hi = DEFAULT_BOUNDS[gs_driver]
+                c_min, c_max = st.columns(2)
+                gs_min = c_min.number_input("Mínimo", value=lo, step=1.0, key=f"gs_min_{gs_driver}")
+                gs_max = c_max.number_input("Máximo", value=hi, step=1.0, key=f"gs_max_{gs_driver}")
+            gs_config = {"kpi": gs_kpi, "objetivo": gs_target, "driver": gs_driver, "min": gs_min, "max": gs_max}
+
+        cons_config = None
+        if sim_mode == "Consolidado":
+            with st.expander("🌎 Consolidación", expanded=True):
+                llave = st.selectbox("Asignación deuda EEUU", list(ALLOCATION_KEYS),
+                                     format_func={"fiu_total": "Por FIU Total", "fiu_performing": "Por FIU Performing",
+                                                  "igual": "Partes iguales"}.get)
+                spread = st.number_input("Spread intercompañía (pp)", value=0.0, min_value=0.0, step=0.25)
+            cons_config = {"llave": llave, "spread": spread}
 
         st.write("")
         run_sim = st.button("🚀 Calcular P&L", type="primary", use_container_width=True)
 
     # --- C. RESULTADOS (DERECHA) ---
     with c_right:
-        if run_sim:
-            # 1. Ejecutar Modelo
-            df_m, df_a = run_financial_model(
-                plazo_anos=5,
-                fiu_perf_start=fiu_perf, fiu_npa_start=fiu_npa,
-                new_debt_amount=new_debt_amt, new_debt_rate=new_debt_rate, new_debt_type=new_debt_type,
-                rev_rate=rev_rate, cof_rate=cof_rate, provision_rate=prov_rate,
-                rec_npa_rate=rec_npa, opex_pct=opex_pct, tax_rate=tax_rate,
-                cogs_amount=cogs, dep_amort_amount=dep, fx_impact=fx, non_op_result=non_op,
-                df_current_debt=current_debt
-            )
+        params = dict(
+            plazo_anos=5,
+            fiu_perf_start=fiu_perf, fiu_npa_start=fiu_npa,
+            new_debt_amount=new_debt_amt, new_debt_rate=new_debt_rate, new_debt_type=new_debt_type,
+            rev_rate=rev_rate, cof_rate=cof_rate, provision_rate=prov_rate,
+            rec_npa_rate=rec_npa, opex_pct=opex_pct, tax_rate=tax_rate,
+            cogs_amount=cogs, dep_amort_amount=dep, fx_impact=fx, non_op_result=non_op,
+            df_current_debt=current_debt
+        )
+        if run_sim and mc_config:
+            render_monte_carlo(params, mc_config, view_mode)
+        elif run_sim and sens_config:
+            render_sensitivity(params, sens_config)
+        elif run_sim and gs_config:
+            render_goal_seek(params, gs_config)
+        elif run_sim and cons_config:
+            render_consolidation(params, cons_config, view_mode, pais_selected)
+        elif run_sim or (sim_mode == "Determinístico" and "proyeccion_params" in st.session_state):
+            # Cambiar solo la vista (Anual/Mensual) reutiliza el último cálculo
+            if run_sim:
+                st.session_state["proyeccion_params"] = params
+            params = st.session_state["proyeccion_params"]
+
+            # 1. Ejecutar Modelo (memoizado por huella de inputs; si no está, recálculo
+            #    incremental sobre el grafo de la sesión: solo lo que cambió desde el último)
+            graph = st.session_state.setdefault("proyeccion_grafo", ProjectionGraph())
+            df_m, df_a = cached_financial_model(params, graph)
             
             # 2. Formatear Verticalmente
-            df_final = df_m if view_mode == 'Mensual' else df_a
-            pnl_view = format_pnl_display(df_final, view_mode)
+            pnl_view = cached_pnl_display(params, view_mode, graph)
             
-            # 3. Mostrar KPIs Rápidos
-            col_k1, col_k2, col_k3 = st.columns(3)
+            # 3. Mostrar KPIs Rápidos (incluye la brecha de refinanciamiento de la deuda vigente)
+            col_k1, col_k2, col_k3, col_k4 = st.columns(4)
+            ladder_m, ladder_a = maturity_ladder(params["df_current_debt"])
+            df_gap = refinancing_gap(df_m, ladder_m, params["fiu_perf_start"])
+            gap = gap_summary(df_gap)
             
             # --- FIX: Nombre de columna corregido a 'Earnings' ---
             total_ni = df_a['Earnings'].sum() 
             avg_ebitda = df_a['EBITDA'].mean()
             fiu_final = df_a['FIU Performing'].iloc[-1] + df_a['FIU NPA'].iloc[-1]
-            
-            def kpi_card(label, value, col):
-                col.markdown(f"""
-                <div style="background:white;padding:15px;border-radius:5px;border-left:4px solid #122442;box-shadow:0 1px 3px rgba(0,0,0,0.1);text-align:center;">
-                    <div style="color:#666;font-size:12px;">{label}</div>
-                    <div style="color:#122442;font-size:20px;font-weight:bold;">{value}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
+
             kpi_card("Utilidad Neta Acum. (5Y)", f"${total_ni:,.1f} M", col_k1)
             kpi_card("EBITDA Promedio Anual", f"${avg_ebitda:,.1f} M", col_k2)
             kpi_card("FIU Final (Año 5)", f"${fiu_final:,.1f} M", col_k3)
+            fecha_gap = f" <span style='font-size:12px;color:#666'>({gap['fecha_maxima']:%b-%Y})</span>" if gap['fecha_maxima'] is not None else ""
+            kpi_card("Brecha Refinanciamiento Máx.", f"${gap['necesidad_maxima']:,.1f} M{fecha_gap}", col_k4)
             
             st.write("")
+            render_debt_ladder(ladder_m, ladder_a, df_gap, gap, view_mode)
             
             # 4. Tabla P&L Estilizada
             st.markdown(f"##### Estado de Resultados Proyectado ({view_mode})")
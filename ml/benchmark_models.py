@@ -0,0 +1,84 @@
+import pandas as pd
+import argparse
+import os
+import sys
+import tempfile
+import time
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, f1_score
+
+# Raíz del proyecto en el path para reutilizar la lógica del backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.training import load_excel_training_data
+from backend.services.model_backends import BACKENDS, build_pipeline
+
+# ==============================================================================
+# BENCHMARK DE BACKENDS: precisión vs latencia sobre el MISMO split
+# ==============================================================================
+
+def benchmark_backend(backend, X_train, X_test, y_train, y_test, repeats=3):
+    pipe = build_pipeline(backend)
+
+    t0 = time.perf_counter()
+    pipe.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+
+    # Tamaño en disco y tiempo de carga del artefacto serializado
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "modelo.pkl")
+        joblib.dump(pipe, path)
+        size_mb = os.path.getsize(path) / 1024 ** 2
+        t0 = time.perf_counter()
+        pipe = joblib.load(path)
+        load_s = time.perf_counter() - t0
+
+    # Throughput de predicción (mejor de N repeticiones)
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        y_pred = pipe.predict(X_test)
+        best = min(best, time.perf_counter() - t0)
+
+    return {
+        "backend": backend,
+        "accuracy": accuracy_score(y_test, y_pred),
+        "macro_f1": f1_score(y_test, y_pred, average="macro"),
+        "fit_s": fit_s,
+        "size_mb": size_mb,
+        "load_s": load_s,
+        "rows_per_s": len(X_test) / max(best, 1e-9),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara backends del clasificador de gastos")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--nivel", choices=["grupo", "subgrupo"], nargs="+", default=["grupo", "subgrupo"])
+    parser.add_argument("--out", help="Ruta CSV para guardar los resultados")
+    args = parser.parse_args()
+
+    print("🏁 BENCHMARK DE MODELOS")
+    df = load_excel_training_data()
+    print(f"📊 Registros: {len(df)}")
+
+    resultados = []
+    for nivel in args.nivel:
+        # Mismo split para todos los backends (igual que train_model.py)
+        X_train, X_test, y_train, y_test = train_test_split(df['texto'], df[nivel], test_size=0.2, random_state=42)
+        for backend in args.backends:
+            print(f"   ⏳ {nivel.upper()} / {backend}...")
+            res = benchmark_backend(backend, X_train, X_test, y_train, y_test)
+            res["nivel"] = nivel
+            resultados.append(res)
+
+    df_res = pd.DataFrame(resultados)[["nivel", "backend", "accuracy", "macro_f1", "fit_s", "size_mb", "load_s", "rows_per_s"]]
+    print("\n" + df_res.to_string(index=False, float_format=lambda v: f"{v:,.4f}"))
+
+    if args.out:
+        df_res.to_csv(args.out, index=False)
+        print(f"\n💾 Resultados guardados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
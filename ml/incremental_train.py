@@ -0,0 +1,50 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine
+
+# Raíz del proyecto en el path para reutilizar la lógica del backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.incremental import IncrementalNotSupported, run_incremental_update
+from backend.services.classification import MODEL_DIR
+from backend.services.training import configure_ssl, get_url_pg
+
+# ==============================================================================
+# ENTRENAMIENTO INCREMENTAL DESDE CORRECCIONES MANUALES
+# ==============================================================================
+# Toma solo las etiquetas manuales nuevas desde la última versión del modelo y las
+# aplica con partial_fit (requiere un backend SGD: sgd_tfidf o sgd_hashing). Con otros backends
+# (ej. random_forest) se hace un reentrenamiento completo con train_model.py.
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza el modelo con las correcciones manuales nuevas")
+    parser.add_argument("--epochs", type=int, default=5, help="Pasadas de partial_fit sobre las filas nuevas")
+    args = parser.parse_args()
+
+    configure_ssl()
+    print("🚀 INICIANDO ENTRENAMIENTO INCREMENTAL...")
+    engine = create_engine(get_url_pg())
+
+    try:
+        res = run_incremental_update(engine, MODEL_DIR, epochs=args.epochs)
+    except IncrementalNotSupported as e:
+        print(f"⚠️ {e}")
+        print("🔁 Reentrenando desde cero (train_model.py --fuente ambas)...")
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_model.py")
+        sys.exit(subprocess.call([sys.executable, script, "--fuente", "ambas"]))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"   📥 Correcciones nuevas: {res['filas_nuevas']} | aprendidas: {res['filas_aprendidas']}")
+    omitidas = res['filas_nuevas'] - res['filas_aprendidas']
+    if omitidas:
+        print(f"   ⚠️ {omitidas} filas con grupo/subgrupo desconocido por el modelo: requieren reentrenamiento completo.")
+    print(f"   🏷️ Versión: {res['version_base']} -> {res['version_nueva']}")
+    print(f"🎉 FINALIZADO en {res['segundos']:.1f} seg.")
+
+
+if __name__ == "__main__":
+    main()
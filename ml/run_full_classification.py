@@ -1,189 +1,189 @@
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import create_engine, text
-from urllib.parse import quote_plus
+import argparse
 import sys
 import os
-import joblib
 import time
-import io
 
-# ==============================================================================
-# 0. CONFIGURACIÓN SSL (Por compatibilidad de entorno)
-# ==============================================================================
-if not os.environ.get("OPENSSL_CONF"):
-    ssl_path = os.path.join(os.getcwd(), "openssl_legacy.cnf")
-    if os.path.exists(ssl_path):
-        os.environ["OPENSSL_CONF"] = ssl_path
-
-print("🚀 INICIANDO CLASIFICACIÓN Y UNIFICACIÓN (CON PROTECCIÓN MANUAL)...")
-
-# ==============================================================================
-# 1. CONEXIÓN Y CONFIGURACIÓN
-# ==============================================================================
-def get_env(var):
-    val = os.getenv(var)
-    if not val:
-        print(f"❌ Falta variable: {var}"); sys.exit(1)
-    return val
-
-PG_HOST, PG_DB = get_env("PG_HOST"), get_env("PG_DB")
-PG_USER, PG_PASS = get_env("PG_USER"), get_env("PG_PASS")
-
-# Usamos autocommit para operaciones DDL (Alter table)
-url_pg = f"postgresql://{PG_USER}:{quote_plus(PG_PASS)}@{PG_HOST}:5432/{PG_DB}"
-engine = create_engine(url_pg, isolation_level="AUTOCOMMIT")
+# Raíz del proyecto en el path para reutilizar la lógica del backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.classification import load_models
+from backend.services.prediction_cache import ensure_cache_table
+from backend.services.training import configure_ssl, get_url_pg
+from backend.services.rules import ensure_rules_table
+from backend.services.incremental import ensure_corrections_log
+from backend.services.batch_pipeline import (
+    SCHEMA, TABLA, FILTRO_PENDIENTES, QUERY_PENDIENTES, ClassificationPipeline, count_pending
+)
+from backend.services.provider_consistency import ensure_provider_stats, unify_pending_providers
+from backend.services.work_queue import ensure_queue_table, enqueue_ranges, queue_status, run_worker, default_worker_id
 
 # Rutas de Modelos
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_DIR = os.path.join(BASE_DIR, "backend", "ml_models")
 
-SCHEMA = "control_gestion"
-TABLA = "libros_diarios_consolidados"
 CHUNK_SIZE = 50000
 
 # ==============================================================================
-# 2. CARGAR MODELOS
+# 1. CARGAR MODELOS (conexión: backend/services/training.py)
 # ==============================================================================
-print(f"🧠 Cargando modelos desde {MODEL_DIR}...")
-try:
-    model_grupo = joblib.load(os.path.join(MODEL_DIR, "modelo_grupo.pkl"))
-    model_subgrupo = joblib.load(os.path.join(MODEL_DIR, "modelo_subgrupo.pkl"))
-    print("✅ Modelos cargados.")
-except Exception as e:
-    print(f"❌ Error cargando modelos: {e}")
-    sys.exit(1)
+def check_models():
+    print(f"🧠 Cargando modelos desde {MODEL_DIR}...")
+    try:
+        _, model_version = load_models(MODEL_DIR, mmap_mode="r")
+        print(f"✅ Modelos cargados (versión {model_version}).")
+    except Exception as e:
+        print(f"❌ Error cargando modelos: {e}")
+        sys.exit(1)
 
 # ==============================================================================
-# 3. BLINDAJE DE ESTRUCTURA (AUTO-REPARACIÓN)
+# 2. BLINDAJE DE ESTRUCTURA (AUTO-REPARACIÓN)
 # ==============================================================================
-print("🛠️ Verificando estructura de la base de datos...")
-try:
-    with engine.connect() as conn:
-        conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS id_transaccion SERIAL PRIMARY KEY'))
-        conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS grupo TEXT'))
-        conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS subgrupo TEXT'))
-        # Nueva columna para proteger cambios manuales
-        conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS clasificacion_manual BOOLEAN DEFAULT FALSE'))
-    print("✅ Estructura validada.")
-except Exception as e:
-    print(f"⚠️ Nota estructura: {e}")
-
-# Cambiamos engine a modo estándar para transacciones
-engine = create_engine(url_pg)
+def ensure_structure(url_pg):
+    print("🛠️ Verificando estructura de la base de datos...")
+    # Usamos autocommit para operaciones DDL (Alter table)
+    engine_ddl = create_engine(url_pg, isolation_level="AUTOCOMMIT")
+    try:
+        with engine_ddl.connect() as conn:
+            conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS id_transaccion SERIAL PRIMARY KEY'))
+            conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS grupo TEXT'))
+            conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS subgrupo TEXT'))
+            # Nueva columna para proteger cambios manuales
+            conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS clasificacion_manual BOOLEAN DEFAULT FALSE'))
+            # Origen de la etiqueta automática: regla_proveedor / regla_cuenta / modelo
+            conn.execute(text(f'ALTER TABLE "{SCHEMA}"."{TABLA}" ADD COLUMN IF NOT EXISTS fuente_clasificacion TEXT'))
+            ensure_rules_table(conn)
+            # Log de correcciones manuales para el entrenamiento incremental
+            ensure_corrections_log(conn)
+            # Caché persistente de predicciones (texto normalizado + versión de modelo)
+            ensure_cache_table(conn)
+            # Cola de rangos para el modo multi-worker
+            ensure_queue_table(conn)
+            # Conteos por proveedor para la unificación incremental (se reconstruyen si no existían)
+            if ensure_provider_stats(conn):
+                print("   ♻️ Conteos por proveedor reconstruidos desde cero.")
+        print("✅ Estructura validada.")
+    except Exception as e:
+        print(f"⚠️ Nota estructura: {e}")
+    finally:
+        engine_ddl.dispose()
 
 # ==============================================================================
-# 4. CLASIFICACIÓN DE PENDIENTES
+# 3. CLASIFICACIÓN DE PENDIENTES (PIPELINE LECTURA -> PREDICCIÓN -> ESCRITURA)
 # ==============================================================================
-print("🔍 Buscando registros pendientes...")
-with engine.connect() as conn:
-    # Solo contamos los que NO tienen grupo Y NO son manuales
-    sql_count = text(f"""
-        SELECT count(*) FROM {SCHEMA}.{TABLA} 
-        WHERE (grupo IS NULL OR grupo = '') 
-        AND (clasificacion_manual IS FALSE OR clasificacion_manual IS NULL)
-    """)
-    count = conn.execute(sql_count).scalar()
-    
-if count > 0:
-    print(f"📊 Clasificando {count} registros...")
-    
-    query = f"""
-        SELECT id_transaccion, cuenta_contable, id_proveedor, descripcion_gasto 
-        FROM {SCHEMA}.{TABLA}
-        WHERE (grupo IS NULL OR grupo = '')
-        AND (clasificacion_manual IS FALSE OR clasificacion_manual IS NULL)
-    """
-    
-    total_procesado = 0
-    start_time = time.time()
-    
-    for chunk in pd.read_sql(query, engine, chunksize=CHUNK_SIZE):
-        # A. Preprocesamiento
-        chunk['descripcion_gasto'] = chunk['descripcion_gasto'].fillna('')
-        chunk['id_proveedor'] = chunk['id_proveedor'].fillna('')
-        chunk['cuenta_contable'] = chunk['cuenta_contable'].fillna('')
-        
-        X_input = (
-            chunk['cuenta_contable'].astype(str) + " " +
-            chunk['id_proveedor'].astype(str) + " " +
-            chunk['descripcion_gasto'].astype(str)
-        ).str.lower()
-        
-        # B. Predicción
-        chunk['grupo'] = model_grupo.predict(X_input)
-        chunk['subgrupo'] = model_subgrupo.predict(X_input)
-        
-        # C. Update Masivo
-        df_up = chunk[['id_transaccion', 'grupo', 'subgrupo']]
-        temp_table = "temp_clasif_update"
-        
-        try:
-            with engine.begin() as conn:
-                # Tabla temporal
-                df_up.head(0).to_sql(temp_table, conn, schema=SCHEMA, if_exists='replace', index=False)
-                
-                # Copy rápido
-                raw_conn = conn.connection
-                with raw_conn.cursor() as cursor:
-                    output = io.StringIO()
-                    df_up.to_csv(output, sep='\t', header=False, index=False)
-                    output.seek(0)
-                    cursor.copy_expert(f"COPY {SCHEMA}.{temp_table} FROM STDIN", output)
-                
-                # Update final
-                conn.execute(text(f"""
-                    UPDATE {SCHEMA}.{TABLA} AS m 
-                    SET grupo = t.grupo, subgrupo = t.subgrupo 
-                    FROM {SCHEMA}.{temp_table} t 
-                    WHERE m.id_transaccion = t.id_transaccion
-                """))
-                conn.execute(text(f"DROP TABLE IF EXISTS {SCHEMA}.{temp_table}"))
-                
-            total_procesado += len(chunk)
-            sys.stdout.write(f"\r   ⏳ Procesado: {total_procesado} / {count}...")
-            sys.stdout.flush()
-
-        except Exception as e:
-            print(f"\n❌ Error en lote: {e}")
-    
-    print(f"\n✅ Clasificación terminada en {time.time() - start_time:.1f} seg.")
-
-else:
-    print("🎉 Nada pendiente de clasificar.")
+def classify_pending(engine, workers=0, chunk_size=CHUNK_SIZE, queue_size=2):
+    print("🔍 Buscando registros pendientes...")
+    with engine.connect() as conn:
+        count = count_pending(conn)
+
+    if count == 0:
+        print("🎉 Nada pendiente de clasificar.")
+        return None
+
+    modo = f"{workers} procesos" if workers > 0 else "en proceso"
+    print(f"📊 Clasificando {count} registros (predicción {modo}, colas de {queue_size} lotes)...")
+
+    def progress(stats):
+        sys.stdout.write(f"\r   ⏳ Procesado: {stats['escritas']} / {count}...")
+        sys.stdout.flush()
+
+    pipeline = ClassificationPipeline(engine, MODEL_DIR, chunk_size=chunk_size, workers=workers,
+                                      queue_size=queue_size, progress_cb=progress)
+    stats = pipeline.run(QUERY_PENDIENTES)
+
+    for err in stats["errores"]:
+        print(f"\n❌ Error en {err}")
+
+    elapsed = stats["segundos"]
+    total_procesado, total_unicos = stats["leidas"], stats["unicos"]
+    print(f"\n✅ Clasificación terminada en {elapsed:.1f} seg.")
+    print(f"   📏 Reglas: {stats['reglas']} filas resueltas sin modelo ({stats['n_reglas_compiladas']} reglas compiladas)")
+    if total_procesado > 0:
+        print(f"   🔁 Deduplicación: {total_unicos} textos únicos de {total_procesado} filas "
+              f"(ratio {1 - total_unicos / total_procesado:.1%} evitado)")
+        print(f"   ⚡ Throughput: {stats['escritas'] / max(elapsed, 1e-9):,.0f} filas/seg total | "
+              f"{total_unicos / max(stats['t_prediccion'], 1e-9):,.0f} únicos/seg en predicción")
+        print(f"   ⏱️ Tiempo acumulado por etapa: predicción {stats['t_prediccion']:.1f}s | escritura {stats['t_escritura']:.1f}s")
+    cache = stats["cache"]
+    print(f"   🗃️ Aciertos caché: memoria={cache['memoria']}, postgres={cache['postgres']} | enviados al modelo: {cache['modelo']}")
+    return stats
 
 # ==============================================================================
-# 5. UNIFICACIÓN DE CONSISTENCIA (POST-PROCESO)
+# 4b. MODO WORKER: N procesos (una o varias máquinas) sobre la cola de rangos
 # ==============================================================================
-print("\n🧹 Unificando categorías por Proveedor (Corrección de Coherencia)...")
-print("   (Esto asegura que un mismo proveedor siempre tenga el mismo Grupo, salvo excepciones manuales)")
-
-try:
+def classify_as_worker(engine, corrida, range_size, lease_s, workers=0, chunk_size=CHUNK_SIZE):
+    worker = default_worker_id()
     with engine.begin() as conn:
-        # Lógica: Calcula la Moda (Categoría más frecuente) por proveedor y actualiza sus registros
-        # PERO: Respeta si clasificacion_manual = TRUE
-        sql_unify = text(f"""
-            WITH Moda AS (
-                SELECT 
-                    nombre_tercero,
-                    MODE() WITHIN GROUP (ORDER BY grupo) as grupo_comun,
-                    MODE() WITHIN GROUP (ORDER BY subgrupo) as subgrupo_comun
-                FROM {SCHEMA}.{TABLA}
-                WHERE grupo IS NOT NULL AND nombre_tercero <> '' AND nombre_tercero <> 'SIN_ID'
-                GROUP BY nombre_tercero
-            )
-            UPDATE {SCHEMA}.{TABLA} t
-            SET grupo = m.grupo_comun,
-                subgrupo = m.subgrupo_comun
-            FROM Moda m
-            WHERE t.nombre_tercero = m.nombre_tercero
-            AND (t.grupo <> m.grupo_comun OR t.subgrupo <> m.subgrupo_comun)
-            AND (t.clasificacion_manual IS FALSE OR t.clasificacion_manual IS NULL);
-        """)
-        res = conn.execute(sql_unify)
-        print(f"   ✅ Se unificaron {res.rowcount} registros inconsistentes.")
-
-except Exception as e:
-    print(f"   ⚠️ Error unificación: {e}")
-
-print("\n🎉 PROCESO FINALIZADO.")
\ No newline at end of file
+        n = enqueue_ranges(conn, corrida, range_size)
+    if n:
+        print(f"📦 Corrida '{corrida}': {n} rangos encolados (~{range_size} filas c/u).")
+    print(f"👷 Worker {worker} tomando rangos de '{corrida}' (lease {lease_s}s)...")
+
+    def progress(range_id, desde, hasta, filas, error):
+        marca = f"❌ {error}" if error else "✅"
+        print(f"   {marca} Rango {range_id} [{desde}-{hasta}]: {filas} filas")
+
+    t0 = time.time()
+    res = run_worker(engine, corrida, worker, lease_s=lease_s, chunk_size=chunk_size, workers=workers,
+                     progress_cb=progress)
+    elapsed = time.time() - t0
+    print(f"\n✅ Worker terminado en {elapsed:.1f} seg: {res['rangos']} rangos, {res['filas']} filas "
+          f"({res['filas'] / max(elapsed, 1e-9):,.0f} filas/seg), {res['errores']} con error, {res['perdidos']} perdidos por lease.")
+    with engine.connect() as conn:
+        print(f"   📋 Estado de la cola: {queue_status(conn, corrida)}")
+    return res
+
+# ==============================================================================
+# 4. UNIFICACIÓN DE CONSISTENCIA (POST-PROCESO INCREMENTAL)
+# ==============================================================================
+def unify_providers(engine):
+    print("\n🧹 Unificando categorías por Proveedor (Corrección de Coherencia)...")
+    print("   (Esto asegura que un mismo proveedor siempre tenga el mismo Grupo, salvo excepciones manuales)")
+
+    try:
+        with engine.begin() as conn:
+            # Lógica: la Moda (Categoría más frecuente) sale de los conteos mantenidos por proveedor
+            # y solo se revisan los proveedores tocados desde la última corrida.
+            # PERO: Respeta si clasificacion_manual = TRUE
+            n_prov, n_cambio, n_filas = unify_pending_providers(conn)
+            print(f"   🔎 Proveedores revisados: {n_prov} (moda cambiada: {n_cambio})")
+            print(f"   ✅ Se unificaron {n_filas} registros inconsistentes.")
+
+    except Exception as e:
+        print(f"   ⚠️ Error unificación: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificación masiva de gastos + unificación por proveedor")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos para la predicción (0 = en el proceso principal)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Filas por lote")
+    parser.add_argument("--queue-size", type=int, default=2, help="Lotes máximos en cola entre etapas")
+    parser.add_argument("--worker", action="store_true",
+                        help="Modo multi-worker: tomar rangos de la cola en Postgres (lanzar N veces, en una o varias máquinas)")
+    parser.add_argument("--corrida", default="pendientes", help="Nombre de la corrida compartida por los workers")
+    parser.add_argument("--rango", type=int, default=200_000, help="Filas por rango de la cola")
+    parser.add_argument("--lease", type=int, default=300, help="Segundos antes de que un rango sin renovar se reasigne")
+    args = parser.parse_args()
+
+    configure_ssl()
+    print("🚀 INICIANDO CLASIFICACIÓN Y UNIFICACIÓN (CON PROTECCIÓN MANUAL)...")
+
+    url_pg = get_url_pg()
+    check_models()
+    ensure_structure(url_pg)
+
+    # Engine en modo estándar para transacciones
+    engine = create_engine(url_pg)
+    if args.worker:
+        classify_as_worker(engine, args.corrida, args.rango, args.lease, workers=args.workers, chunk_size=args.chunk_size)
+    else:
+        classify_pending(engine, workers=args.workers, chunk_size=args.chunk_size, queue_size=args.queue_size)
+    # Con varios workers, cada uno unifica al terminar: es incremental y solo toca proveedores pendientes
+    unify_providers(engine)
+
+    print("\n🎉 PROCESO FINALIZADO.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import pandas as pd
+import argparse
+import json
+import os
+import sys
+import time
+
+# Raíz del proyecto en el path para reutilizar la lógica del backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.training import get_training_engine, load_training_data
+from backend.services.model_backends import BACKENDS
+from backend.services.feature_cache import FEATURE_CACHE_DIR
+from backend.services.hyperparam_search import run_search, select_config
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, "backend", "ml_models")
+
+# ==============================================================================
+# BÚSQUEDA DE HIPERPARÁMETROS: k-fold estratificado en paralelo
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros del clasificador de gastos")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--nivel", choices=["grupo", "subgrupo"], default="grupo")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--tolerancia", type=float, default=0.01,
+                        help="Pérdida máxima de macro-F1 aceptada frente al mejor para elegir un modelo más rápido")
+    parser.add_argument("--fuente", choices=["excel", "db", "ambas"], default="ambas")
+    parser.add_argument("--out", default=os.path.join(MODELS_DIR, "busqueda_hiperparametros.csv"),
+                        help="CSV con los resultados por configuración")
+    args = parser.parse_args()
+
+    print(f"🔎 BÚSQUEDA DE HIPERPARÁMETROS ({args.folds} folds, {args.workers} procesos, nivel {args.nivel})")
+    engine, args.fuente = get_training_engine(args.fuente)
+    df, conteo = load_training_data(engine, args.fuente, cache_dir=FEATURE_CACHE_DIR)
+    print(f"📊 Registros: {len(df)} ({', '.join(f'{k}: {v}' for k, v in conteo.items())})")
+
+    t0 = time.time()
+    resumen, _ = run_search(df["texto"], df[args.nivel], args.backends, folds=args.folds,
+                            workers=args.workers, progress_cb=lambda msg: print(f"   ⏳ {msg}"))
+    print(f"⏱️ Búsqueda completada en {time.time() - t0:.1f}s")
+
+    resumen = resumen.sort_values("macro_f1", ascending=False)
+    vista = resumen.assign(params=resumen["params"].map(json.dumps))
+    print("\n" + vista.drop(columns="config_id").to_string(index=False, float_format=lambda v: f"{v:,.4f}"))
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    vista.to_csv(args.out, index=False)
+    print(f"\n💾 Resultados guardados en {args.out}")
+
+    elegido = select_config(resumen, tolerance=args.tolerancia)
+    config = {
+        "backend": elegido["backend"],
+        "params": elegido["params"],
+        "nivel": args.nivel,
+        "metricas": {k: float(elegido[k]) for k in ("accuracy", "macro_f1", "fit_s", "predict_ms_1k")},
+    }
+    config_path = os.path.join(MODELS_DIR, "mejor_config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"🏆 Elegido (más rápido a ≤{args.tolerancia:.2%} del mejor macro-F1): {config['backend']} {config['params']}")
+    print(f"   Entrenar con: python ml/train_model.py --config {config_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,155 @@
 import pandas as pd
 import numpy as np
+import argparse
+import json
 import os
-import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
+import sys
+import time
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
+from sklearn.pipeline import Pipeline
+
+# Raíz del proyecto en el path para reutilizar la lógica del backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.training import get_training_engine, load_training_data
+from backend.services.model_backends import BACKENDS, DEFAULT_BACKEND, build_classifier, build_vectorizer
+from backend.services.feature_cache import FEATURE_CACHE_DIR, FeatureCache, data_hash
+from backend.services.hierarchical import HierarchicalClassifier
+from backend.services.classification import PairedModel
+from backend.services.model_registry import register_model, registry_dir
+from backend.services.incremental import STATE_FILE, save_state
+from backend.services.text_normalization import NORMALIZATION_VERSION
 
 # ==============================================================================
 # 1. CONFIGURACIÓN
 # ==============================================================================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-FILE_NAME = "Opex Real 2025 (1).xlsx" # Asegúrate que este sea el nombre correcto en tu carpeta data
-DATA_PATH = os.path.join(BASE_DIR, "data", FILE_NAME)
 MODELS_DIR = os.path.join(BASE_DIR, "backend", "ml_models")
 
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-# Columnas del Excel
-COL_GRUPO    = "Grupo"
-COL_SUBGRUPO = "Subgrupo"
-COL_DESC     = "Glosa Documento nuevo"
-COL_CUENTA   = "Código Cuenta"
-COL_PROV     = "Rut Nuevo" # Usamos RUT para mayor precisión
-
-print(f"🚀 INICIANDO ENTRENAMIENTO MEJORADO...")
+parser = argparse.ArgumentParser(description="Entrena los modelos de Grupo y Subgrupo")
+parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND,
+                    help="Modelo a entrenar (ver ml/benchmark_models.py para comparar)")
+parser.add_argument("--formato", choices=["jerarquico", "independiente"], default="jerarquico",
+                    help="jerarquico: un artefacto con vectorizador compartido | independiente: dos pipelines")
+parser.add_argument("--fuente", choices=["excel", "db", "ambas"], default="ambas",
+                    help="Origen de etiquetas: Excel semilla, correcciones manuales del libro consolidado o ambas")
+parser.add_argument("--sin-cache", action="store_true",
+                    help=f"No reutilizar features vectorizadas de {FEATURE_CACHE_DIR}")
+parser.add_argument("--config", help="JSON con backend e hiperparámetros (ej. mejor_config.json de ml/search_hyperparams.py)")
+args = parser.parse_args()
+
+params = {}
+if args.config:
+    with open(args.config) as f:
+        config = json.load(f)
+    args.backend, params = config["backend"], config.get("params", {})
+    print(f"⚙️ Configuración desde {args.config}: {params}")
+
+print(f"🚀 INICIANDO ENTRENAMIENTO MEJORADO (backend: {args.backend}, formato: {args.formato}, fuente: {args.fuente})...")
 
 # ==============================================================================
 # 2. CARGA DE DATOS
 # ==============================================================================
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError(f"❌ Falta el archivo: {DATA_PATH}")
-
-try:
-    df = pd.read_excel(DATA_PATH)
-except:
-    df = pd.read_excel(DATA_PATH, engine='openpyxl')
-
-# Limpieza
-df = df.dropna(subset=[COL_GRUPO])
-df[COL_DESC] = df[COL_DESC].fillna('')
-df[COL_PROV] = df[COL_PROV].astype(str).fillna('')
-df[COL_SUBGRUPO] = df[COL_SUBGRUPO].fillna('General')
-
-# --- INGENIERÍA DE CARACTERÍSTICAS (MEJORADA) ---
-# Usamos: Cuenta + RUT + Descripción
-# Nota: No agregamos 'Empresa' aquí porque queremos que el modelo aprenda
-# reglas universales (ej: "Uber" es transporte en Chile y en Perú).
-df['TEXTO_COMBINADO'] = (
-    df[COL_CUENTA].astype(str) + " " +
-    df[COL_PROV].astype(str) + " " +
-    df[COL_DESC].astype(str)
-).str.lower()
-
-X = df['TEXTO_COMBINADO']
-
-print(f"📊 Registros para entrenar: {len(df)}")
+engine, args.fuente = get_training_engine(args.fuente)
 
-# ==============================================================================
-# 3. ENTRENAMIENTO (PARAMETROS OPTIMIZADOS)
-# ==============================================================================
+cache = None if args.sin_cache else FeatureCache()
+df, conteo = load_training_data(engine, args.fuente, cache_dir=None if cache is None else cache.cache_dir)
+marca = df.attrs.get("marca_correcciones")
+X = df['texto']
+
+print(f"📊 Registros para entrenar: {len(df)} ({', '.join(f'{k}: {v}' for k, v in conteo.items())})")
 
-# Aumentamos n_estimators a 150 y max_features a 6000 para mayor precisión
 
-# --- MODELO GRUPO ---
-print("\n🤖 Entrenando GRUPO (Configuración Robusta)...")
-y_grupo = df[COL_GRUPO]
-X_train, X_test, y_train, y_test = train_test_split(X, y_grupo, test_size=0.2, random_state=42)
+def vectorize(X_train, X_test):
+    """Devuelve (Xtr, Xte, vectorizador) usando la caché de features si está activa."""
+    if cache is None:
+        vec = build_vectorizer(args.backend, params)
+        return vec.fit_transform(X_train), vec.transform(X_test), vec
+    Xtr, vec, fit_key = cache.fit_transform(X_train, vectorizer=build_vectorizer(args.backend, params))
+    return Xtr, cache.transform(vec, fit_key, X_test), vec
 
-pipeline_grupo = Pipeline([
-    ('tfidf', TfidfVectorizer(max_features=6000, stop_words='english', ngram_range=(1,2))),
-    ('clf', RandomForestClassifier(n_estimators=150, n_jobs=-1, random_state=42))
-])
-pipeline_grupo.fit(X_train, y_train)
-print(f"   ✅ Precisión GRUPO: {pipeline_grupo.score(X_test, y_test):.2%}")
+# ==============================================================================
+# 3. ENTRENAMIENTO
+# ==============================================================================
 
-# --- MODELO SUBGRUPO ---
-print("\n🤖 Entrenando SUBGRUPO (Configuración Robusta)...")
-y_subgrupo = df[COL_SUBGRUPO]
-X_train_s, X_test_s, y_train_s, y_test_s = train_test_split(X, y_subgrupo, test_size=0.2, random_state=42)
+def train_hierarchical():
+    # Un solo split para ambos niveles: así se mide también la coherencia del par
+    X_train, X_test, yg_train, yg_test, ys_train, ys_test = train_test_split(
+        X, df['grupo'], df['subgrupo'], test_size=0.2, random_state=42)
+
+    print("\n🤖 Entrenando JERÁRQUICO (vectorizador compartido + subgrupo por grupo)...")
+    Xtr, Xte, vec = vectorize(X_train, X_test)
+    model = HierarchicalClassifier(args.backend, params).fit(X_train, yg_train, ys_train, features=(Xtr, vec))
+
+    pred = model.predict_frame(X_test)
+    metricas = {
+        "accuracy_grupo": accuracy_score(yg_test, pred['grupo']),
+        "accuracy_subgrupo": accuracy_score(ys_test, pred['subgrupo']),
+        "accuracy_par": float(((yg_test.values == pred['grupo'].values) & (ys_test.values == pred['subgrupo'].values)).mean()),
+    }
+    print(f"   ✅ Precisión GRUPO: {metricas['accuracy_grupo']:.2%}")
+    print(f"   ✅ Precisión SUBGRUPO: {metricas['accuracy_subgrupo']:.2%}")
+    print(f"   ✅ Par (grupo, subgrupo) exacto: {metricas['accuracy_par']:.2%}")
+    return model, metricas
+
+
+def train_independent():
+    # --- MODELO GRUPO ---
+    print("\n🤖 Entrenando GRUPO...")
+    X_train, X_test, y_train, y_test = train_test_split(X, df['grupo'], test_size=0.2, random_state=42)
+
+    # Ambos niveles usan el mismo split (random_state=42): la matriz se vectoriza una vez
+    Xtr, Xte, vec = vectorize(X_train, X_test)
+    clf_grupo = build_classifier(args.backend, params).fit(Xtr, y_train)
+    pipeline_grupo = Pipeline([('vec', vec), ('clf', clf_grupo)])
+    metricas = {"accuracy_grupo": clf_grupo.score(Xte, y_test)}
+    print(f"   ✅ Precisión GRUPO: {metricas['accuracy_grupo']:.2%}")
+
+    # --- MODELO SUBGRUPO ---
+    print("\n🤖 Entrenando SUBGRUPO...")
+    X_train_s, X_test_s, y_train_s, y_test_s = train_test_split(X, df['subgrupo'], test_size=0.2, random_state=42)
+
+    clf_subgrupo = build_classifier(args.backend, params).fit(Xtr, y_train_s)
+    pipeline_subgrupo = Pipeline([('vec', vec), ('clf', clf_subgrupo)])
+    metricas["accuracy_subgrupo"] = clf_subgrupo.score(Xte, y_test_s)
+    print(f"   ✅ Precisión SUBGRUPO: {metricas['accuracy_subgrupo']:.2%}")
+    return PairedModel(pipeline_grupo, pipeline_subgrupo), metricas
 
-pipeline_subgrupo = Pipeline([
-    ('tfidf', TfidfVectorizer(max_features=6000, stop_words='english', ngram_range=(1,2))),
-    ('clf', RandomForestClassifier(n_estimators=150, n_jobs=-1, random_state=42))
-])
-pipeline_subgrupo.fit(X_train_s, y_train_s)
-print(f"   ✅ Precisión SUBGRUPO: {pipeline_subgrupo.score(X_test_s, y_test_s):.2%}")
 
 # ==============================================================================
-# 4. GUARDADO
+# 4. EJECUCIÓN Y GUARDADO
 # ==============================================================================
-print("\n💾 Guardando modelos...")
-joblib.dump(pipeline_grupo, os.path.join(MODELS_DIR, 'modelo_grupo.pkl'))
-joblib.dump(pipeline_subgrupo, os.path.join(MODELS_DIR, 'modelo_subgrupo.pkl'))
-print("🎉 FINALIZADO.")
\ No newline at end of file
+if args.formato == "jerarquico":
+    model, metricas = train_hierarchical()
+else:
+    model, metricas = train_independent()
+
+# Cada entrenamiento queda como versión en el registro (la API la toma sin reiniciar)
+print("\n💾 Registrando modelo...")
+version = register_model(model, {
+    "origen": "train_model",
+    "backend": args.backend,
+    "params": params,
+    "fuente": conteo,
+    "n_registros": len(df),
+    "normalizacion": NORMALIZATION_VERSION,
+    # Correcciones manuales ya incluidas: el incremental de esta versión parte desde aquí
+    "marca_correcciones": marca,
+    "hash_datos": data_hash(df['texto'] + "|" + df['grupo'].astype(str) + "|" + df['subgrupo'].astype(str)),
+    "metricas": {k: float(v) for k, v in metricas.items()},
+}, MODELS_DIR)
+print(f"   ✅ Versión {version} activa en {registry_dir(MODELS_DIR)}")
+
+# Con etiquetas del libro, el próximo incremental parte de la marca ya incluida en el entrenamiento;
+# solo con Excel vuelve a aplicar todas las correcciones manuales
+state_path = os.path.join(MODELS_DIR, STATE_FILE)
+if marca is not None:
+    save_state({"ultimo_id_correccion": marca, "version": version,
+                "actualizado_en": time.strftime("%Y-%m-%d %H:%M:%S")}, MODELS_DIR)
+elif os.path.exists(state_path):
+    os.remove(state_path)
+if cache is not None:
+    print(f"🗃️ Caché de features: {cache.hits} reutilizadas, {cache.misses} calculadas")
+print("🎉 FINALIZADO.")